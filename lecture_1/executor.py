@@ -0,0 +1,145 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+
+def _run_timed[_TRes](func: Callable[..., _TRes], *args: Any) -> tuple[float, _TRes]:
+    # monotonic clock is shared by processes of one machine
+    return time.monotonic(), func(*args)
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    """Workers must not be forked from running server: forked child gets
+    copies of its threads' locks in whatever state they were.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+
+    return multiprocessing.get_context("spawn")
+
+
+@dataclass(slots=True)
+class QueueStats:
+    """Queue time of offloaded call is time from `run` until worker process
+    starts it: wait for endpoint limit, for free worker and for arguments to
+    be sent.
+    """
+
+    inline: int = 0
+    offloaded: int = 0
+    in_flight: int = 0
+    queue_time_total: float = 0.0
+    queue_time_max: float = 0.0
+
+    def observe_queue_time(self, seconds: float) -> None:
+        self.queue_time_total += seconds
+        self.queue_time_max = max(self.queue_time_max, seconds)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "inline": self.inline,
+            "offloaded": self.offloaded,
+            "in_flight": self.in_flight,
+            "queue_time_avg": (
+                self.queue_time_total / self.offloaded if self.offloaded else 0.0
+            ),
+            "queue_time_max": self.queue_time_max,
+        }
+
+
+@dataclass(slots=True)
+class CpuAwareExecutor:
+    """Runs cheap calls inline on the event loop and sends expensive ones
+    (by caller-provided cost estimate) to a process pool.
+
+    Every endpoint gets its own concurrency limit, so a burst of huge
+    factorials cannot occupy all workers and starve fibonacci requests.
+    """
+
+    inline_cost: int = 2_000
+    max_workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    endpoint_limits: dict[str, int] = field(default_factory=dict)
+
+    _pool: Executor | None = field(init=False, default=None)
+    # asyncio primitives are bound to loop, and executor may outlive it
+    _semaphores: weakref.WeakKeyDictionary[
+        asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]
+    ] = field(init=False, default_factory=weakref.WeakKeyDictionary)
+    _stats: dict[str, QueueStats] = field(init=False, default_factory=dict)
+
+    def start(self) -> None:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=_pool_context()
+            )
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {endpoint: stats.as_dict() for endpoint, stats in self._stats.items()}
+
+    async def run[_TRes](
+        self,
+        endpoint: str,
+        cost: int,
+        func: Callable[..., _TRes],
+        *args: Any,
+    ) -> _TRes:
+        stats = self._stats.setdefault(endpoint, QueueStats())
+
+        if cost <= self.inline_cost or self._pool is None:
+            stats.inline += 1
+            return func(*args)
+
+        loop = asyncio.get_running_loop()
+        semaphores = self._semaphores.setdefault(loop, {})
+
+        if endpoint not in semaphores:
+            semaphores[endpoint] = asyncio.Semaphore(
+                self.endpoint_limits.get(endpoint, self.max_workers)
+            )
+
+        enqueued_at = time.monotonic()
+
+        async with semaphores[endpoint]:
+            stats.offloaded += 1
+            stats.in_flight += 1
+
+            try:
+                started_at, result = await loop.run_in_executor(
+                    self._pool, _run_timed, func, *args
+                )
+            finally:
+                stats.in_flight -= 1
+
+        stats.observe_queue_time(started_at - enqueued_at)
+        return result
+
+
+def from_env() -> CpuAwareExecutor:
+    """Configures executor with `MATH_INLINE_COST`, `MATH_MAX_WORKERS` and
+    `MATH_LIMIT_<ENDPOINT>` environment variables.
+    """
+    executor = CpuAwareExecutor()
+
+    if "MATH_INLINE_COST" in os.environ:
+        executor.inline_cost = int(os.environ["MATH_INLINE_COST"])
+
+    if "MATH_MAX_WORKERS" in os.environ:
+        executor.max_workers = int(os.environ["MATH_MAX_WORKERS"])
+
+    for key, value in os.environ.items():
+        if key.startswith("MATH_LIMIT_"):
+            executor.endpoint_limits[key.removeprefix("MATH_LIMIT_").lower()] = int(
+                value
+            )
+
+    return executor
@@ -1,39 +1,148 @@
 import math
+import sys
+from contextlib import asynccontextmanager
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Any, Callable, Iterable
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.responses import JSONResponse
 
-app = FastAPI()
+from lecture_1 import executor as executor_module
 
+# factorial and fibonacci are CPU-bound, so handlers are async and hand the
+# work to executor which decides whether it is cheap enough to run inline
+executor = executor_module.from_env()
 
-@app.get("/factorial")
-def get_factorial(n: Annotated[int, Query()]) -> JSONResponse:
+# results are rendered as decimal digits, which Python limits to 4300 by
+# default - limit is raised just enough for largest factorial served
+MAX_N = 20_000
+_MAX_DIGITS = int(math.lgamma(MAX_N + 1) / math.log(10)) + 1
+
+if 0 < sys.get_int_max_str_digits() < _MAX_DIGITS:
+    sys.set_int_max_str_digits(_MAX_DIGITS)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    executor.start()
+    yield
+    executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def fibonacci(n: int) -> int:
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+
+    return b
+
+
+def batch_factorial(values: Iterable[int]) -> dict[int, int]:
+    # walk requested n in ascending order so each product continues the previous
+    result = {}
+    i, acc = 0, 1
+
+    for n in sorted(set(values)):
+        acc *= math.prod(range(i + 1, n + 1))
+        i = n
+        result[n] = acc
+
+    return result
+
+
+def batch_fibonacci(values: Iterable[int]) -> dict[int, int]:
+    # same idea for (a, b) pairs - the loop is never restarted from 0
+    result = {}
+    i, a, b = 0, 0, 1
+
+    for n in sorted(set(values)):
+        for _ in range(n - i):
+            a, b = b, a + b
+        i = n
+        result[n] = b
+
+    return result
+
+
+def _render_result(func: Callable[..., int], *args: Any) -> bytes:
+    # big ints are turned into digits where they are computed, so offloaded
+    # calls do not convert them on event loop
+    return b'{"result":%d}' % func(*args)
+
+
+def _render_batch(
+    func: Callable[[list[int]], dict[int, int]], data: list[int]
+) -> bytes:
+    results = func(data)
+    return b'{"result":[%s]}' % b",".join(b"%d" % results[n] for n in data)
+
+
+def _validate_n(n: int) -> None:
     if n < 0:
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
             detail="Invalid value for n, must be non-negative",
         )
 
-    result = math.factorial(n)
-
-    return JSONResponse({"result": result})
+    if n > MAX_N:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=f"Invalid value for n, must be at most {MAX_N}",
+        )
 
 
-@app.get("/fibonacci/{n}")
-def get_fibonacci(n: int) -> JSONResponse:
-    if n < 0:
+def _validate_batch(data: list[int]) -> None:
+    if len(data) == 0:
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
-            detail="Invalid value for n, must be non-negative",
+            detail="Invalid value for body, must be non-empty array of ints",
         )
 
-    a, b = 0, 1
-    for _ in range(n):
-        a, b = b, a + b
+    for n in data:
+        _validate_n(n)
+
+
+@app.get("/factorial")
+async def get_factorial(n: Annotated[int, Query()]) -> Response:
+    _validate_n(n)
+
+    body = await executor.run("factorial", n, _render_result, math.factorial, n)
+
+    return Response(body, media_type="application/json")
 
-    return JSONResponse({"result": b})
+
+@app.get("/fibonacci/{n}")
+async def get_fibonacci(n: int) -> Response:
+    _validate_n(n)
+
+    body = await executor.run("fibonacci", n, _render_result, fibonacci, n)
+
+    return Response(body, media_type="application/json")
+
+
+@app.post("/factorial/batch")
+async def post_factorial_batch(data: list[int]) -> Response:
+    _validate_batch(data)
+
+    body = await executor.run(
+        "factorial_batch", max(data), _render_batch, batch_factorial, data
+    )
+
+    return Response(body, media_type="application/json")
+
+
+@app.post("/fibonacci/batch")
+async def post_fibonacci_batch(data: list[int]) -> Response:
+    _validate_batch(data)
+
+    body = await executor.run(
+        "fibonacci_batch", max(data), _render_batch, batch_fibonacci, data
+    )
+
+    return Response(body, media_type="application/json")
 
 
 @app.get("/mean")
@@ -47,3 +156,8 @@ def get_mean(data: list[float]) -> JSONResponse:
     result = sum(data) / len(data)
 
     return JSONResponse({"result": result})
+
+
+@app.get("/executor-stats")
+async def get_executor_stats() -> JSONResponse:
+    return JSONResponse(executor.stats())
@@ -0,0 +1,412 @@
+"""Minimal ASGI routing core grown out of `lecture_1.application`.
+
+Everything that FastAPI does per request (dependency graph, pydantic
+validation, response object construction) is done here once, at route
+registration time: handler signatures are inspected into a list of
+extractors, routes are compiled into a segment radix tree and responses can
+be prebuilt so that serving them is just two `send` calls.
+
+```python
+app = App()
+HELLO = Response.text("Hello, world!")
+
+
+@app.get("/")
+async def hello() -> Response:
+    return HELLO
+
+
+# sync handlers run in default thread pool
+@app.get("/fibonacci/{n:int}")
+def fibonacci(n: int, precise: bool = False) -> dict:
+    ...
+```
+"""
+
+import asyncio
+import inspect
+import json
+from contextlib import AbstractAsyncContextManager
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable
+from urllib.parse import parse_qsl
+
+type Scope = dict[str, Any]
+type Receive = Callable[[], Awaitable[dict[str, Any]]]
+type Send = Callable[[dict[str, Any]], Awaitable[None]]
+type Lifespan = Callable[["App"], AbstractAsyncContextManager[None]]
+
+
+class Response:
+    """Response with ASGI messages encoded up front.
+
+    Instances are immutable and may be created once at import time and
+    returned from handlers on every request.
+    """
+
+    __slots__ = ("status", "body", "start_message", "body_message")
+
+    def __init__(
+        self,
+        body: bytes = b"",
+        status: int = HTTPStatus.OK,
+        content_type: bytes = b"text/plain; charset=utf-8",
+        headers: list[tuple[bytes, bytes]] | None = None,
+    ) -> None:
+        self.status = int(status)
+        self.body = body
+        self.start_message = {
+            "type": "http.response.start",
+            "status": self.status,
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode()),
+                *(headers or []),
+            ],
+        }
+        self.body_message = {"type": "http.response.body", "body": body}
+
+    @staticmethod
+    def text(content: str, status: int = HTTPStatus.OK) -> "Response":
+        return Response(content.encode(), status)
+
+    @staticmethod
+    def json(content: Any, status: int = HTTPStatus.OK) -> "Response":
+        return Response(
+            json.dumps(content, separators=(",", ":")).encode(),
+            status,
+            content_type=b"application/json",
+        )
+
+    async def __call__(self, send: Send) -> None:
+        await send(self.start_message)
+        await send(self.body_message)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, detail: str | None = None) -> None:
+        self.status = int(status)
+        self.detail = detail or HTTPStatus(status).phrase
+        super().__init__(self.detail)
+
+
+_NOT_FOUND = Response.json({"detail": "Not Found"}, HTTPStatus.NOT_FOUND)
+_METHOD_NOT_ALLOWED = Response.json(
+    {"detail": "Method Not Allowed"}, HTTPStatus.METHOD_NOT_ALLOWED
+)
+
+
+class Request:
+    __slots__ = ("scope", "_receive", "_body")
+
+    def __init__(self, scope: Scope, receive: Receive) -> None:
+        self.scope = scope
+        self._receive = receive
+        self._body: bytes | None = None
+
+    async def body(self) -> bytes:
+        if self._body is None:
+            chunks = []
+            more_body = True
+
+            while more_body:
+                message = await self._receive()
+                chunks.append(message.get("body", b""))
+                more_body = message.get("more_body", False)
+
+            self._body = b"".join(chunks)
+
+        return self._body
+
+    async def json(self) -> Any:
+        try:
+            return json.loads(await self.body())
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, "invalid json body") from e
+
+
+def _to_bool(value: str) -> bool:
+    match value.lower():
+        case "1" | "true" | "yes" | "on":
+            return True
+        case "0" | "false" | "no" | "off":
+            return False
+
+    raise ValueError(value)
+
+
+_CONVERTERS: dict[str, Callable[[str], Any]] = {
+    "str": str,
+    "int": int,
+    "float": float,
+}
+_QUERY_CONVERTERS: dict[Any, Callable[[str], Any]] = {
+    str: str,
+    int: int,
+    float: float,
+    bool: _to_bool,
+}
+
+
+@dataclass(slots=True)
+class _QueryParam:
+    name: str
+    convert: Callable[[str], Any]
+    default: Any
+    required: bool
+
+
+@dataclass(slots=True)
+class Route:
+    method: str
+    path: str
+    handler: Callable[..., Any]
+
+    is_async: bool = field(init=False)
+    path_params: dict[str, Callable[[str], Any]] = field(init=False)
+    query_params: list[_QueryParam] = field(init=False)
+    request_param: str | None = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.is_async = inspect.iscoroutinefunction(self.handler)
+        self.path_params = {}
+        self.query_params = []
+        self.request_param = None
+
+        for segment in _split(self.path):
+            if segment.startswith("{"):
+                name, _, kind = segment[1:-1].partition(":")
+                self.path_params[name] = _CONVERTERS[kind or "str"]
+
+        for name, param in inspect.signature(self.handler).parameters.items():
+            if name in self.path_params:
+                continue
+
+            if param.annotation is Request:
+                self.request_param = name
+                continue
+
+            if param.annotation not in _QUERY_CONVERTERS:
+                raise TypeError(
+                    f"unsupported annotation for {name} in {self.method} {self.path}"
+                )
+
+            self.query_params.append(
+                _QueryParam(
+                    name,
+                    _QUERY_CONVERTERS[param.annotation],
+                    param.default,
+                    param.default is inspect.Parameter.empty,
+                )
+            )
+
+    def extract(
+        self, scope: Scope, receive: Receive, raw_path_params: dict[str, str]
+    ) -> dict[str, Any]:
+        kwargs = {}
+
+        try:
+            for name, raw in raw_path_params.items():
+                kwargs[name] = self.path_params[name](raw)
+        except ValueError as e:
+            raise HTTPError(
+                HTTPStatus.UNPROCESSABLE_ENTITY, f"invalid path parameter {name}"
+            ) from e
+
+        if self.query_params:
+            query = dict(parse_qsl(scope["query_string"].decode("latin-1")))
+
+            for param in self.query_params:
+                if param.name not in query:
+                    if param.required:
+                        raise HTTPError(
+                            HTTPStatus.UNPROCESSABLE_ENTITY,
+                            f"missing query parameter {param.name}",
+                        )
+                    kwargs[param.name] = param.default
+                    continue
+
+                try:
+                    kwargs[param.name] = param.convert(query[param.name])
+                except ValueError as e:
+                    raise HTTPError(
+                        HTTPStatus.UNPROCESSABLE_ENTITY,
+                        f"invalid query parameter {param.name}",
+                    ) from e
+
+        if self.request_param is not None:
+            kwargs[self.request_param] = Request(scope, receive)
+
+        return kwargs
+
+
+def _split(path: str) -> list[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+@dataclass(slots=True)
+class _Node:
+    static: dict[str, "_Node"] = field(default_factory=dict)
+    param_name: str | None = None
+    param: "_Node | None" = None
+    routes: dict[str, Route] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class Router:
+    """Segment radix tree with a dict fast path for fully static routes.
+
+    Static children are tried before a parameter child on the same level, so
+    `/users/me` and `/users/{id}` can coexist, and parameter child is used
+    when static one leads to no route - `/users/me/posts` matches
+    `/users/{id}/posts` even if `/users/me/profile` exists.
+    """
+
+    _root: _Node = field(default_factory=_Node)
+    _static: dict[str, dict[str, Route]] = field(default_factory=dict)
+
+    def add(self, route: Route) -> None:
+        node = self._root
+
+        for segment in _split(route.path):
+            if segment.startswith("{"):
+                name = segment[1:-1].partition(":")[0]
+
+                if node.param is None:
+                    node.param_name, node.param = name, _Node()
+                elif node.param_name != name:
+                    raise ValueError(f"conflicting parameter name {name}")
+
+                node = node.param
+            else:
+                node = node.static.setdefault(segment, _Node())
+
+        if route.method in node.routes:
+            raise ValueError(f"duplicate route {route.method} {route.path}")
+
+        node.routes[route.method] = route
+
+        if not route.path_params:
+            self._static["/" + "/".join(_split(route.path))] = node.routes
+
+    def match(self, path: str) -> tuple[dict[str, Route], dict[str, str]] | None:
+        routes = self._static.get(path)
+        if routes is not None:
+            return routes, {}
+
+        params: dict[str, str] = {}
+        node = _match(self._root, _split(path), 0, params)
+
+        return None if node is None else (node.routes, params)
+
+
+def _match(
+    node: _Node, segments: list[str], i: int, params: dict[str, str]
+) -> _Node | None:
+    """Depth-first: static child first, parameter child if static branch
+    has no route for the rest of path.
+    """
+    if i == len(segments):
+        return node if node.routes else None
+
+    segment = segments[i]
+    child = node.static.get(segment)
+
+    if child is not None:
+        found = _match(child, segments, i + 1, params)
+
+        if found is not None:
+            return found
+
+    if node.param is None:
+        return None
+
+    params[node.param_name] = segment
+    found = _match(node.param, segments, i + 1, params)
+
+    if found is None:
+        del params[node.param_name]
+
+    return found
+
+
+@dataclass(slots=True)
+class App:
+    lifespan: Lifespan | None = None
+    router: Router = field(default_factory=Router)
+    state: dict[str, Any] = field(default_factory=dict)
+
+    def route(self, method: str, path: str) -> Callable[[Callable], Callable]:
+        def decorator(handler: Callable) -> Callable:
+            self.router.add(Route(method.upper(), path, handler))
+            return handler
+
+        return decorator
+
+    def get(self, path: str) -> Callable[[Callable], Callable]:
+        return self.route("GET", path)
+
+    def post(self, path: str) -> Callable[[Callable], Callable]:
+        return self.route("POST", path)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        match scope["type"]:
+            case "http":
+                await self._handle_http(scope, receive, send)
+            case "lifespan":
+                await self._handle_lifespan(receive, send)
+
+    async def _handle_http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        matched = self.router.match(scope["path"])
+
+        if matched is None:
+            return await _NOT_FOUND(send)
+
+        routes, raw_params = matched
+        route = routes.get(scope["method"])
+
+        if route is None:
+            return await _METHOD_NOT_ALLOWED(send)
+
+        try:
+            kwargs = route.extract(scope, receive, raw_params)
+
+            if route.is_async:
+                result = await route.handler(**kwargs)
+            else:
+                # sync handlers may block or compute, keep event loop free
+                result = await asyncio.to_thread(route.handler, **kwargs)
+        except HTTPError as e:
+            result = Response.json({"detail": e.detail}, e.status)
+
+        match result:
+            case Response():
+                await result(send)
+            case str():
+                await Response.text(result)(send)
+            case _:
+                await Response.json(result)(send)
+
+    async def _handle_lifespan(self, receive: Receive, send: Send) -> None:
+        manager = None
+
+        while True:
+            message = await receive()
+
+            if message["type"] == "lifespan.startup":
+                try:
+                    if self.lifespan is not None:
+                        manager = self.lifespan(self)
+                        await manager.__aenter__()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if manager is not None:
+                    await manager.__aexit__(None, None, None)
+
+                await send({"type": "lifespan.shutdown.complete"})
+                return
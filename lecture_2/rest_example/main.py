@@ -1,7 +1,9 @@
 from fastapi import FastAPI
 
 from lecture_2.rest_example.api.pokemon import router
+from lecture_4.metrics import setup_metrics
 
 app = FastAPI(title="Pokemon REST API Example")
 
 app.include_router(router)
+setup_metrics(app)
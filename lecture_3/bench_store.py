@@ -0,0 +1,75 @@
+"""CPU per request spent on model construction and response encoding for
+`/create-user` and `/get-user`, before and after `UserRecord`.
+
+"before" replays what the old path did: `model_dump` + `UserResource(...)`
+in store and validation + serialization of `response_model` in FastAPI.
+
+    cd lecture_3 && python bench_store.py
+"""
+
+import json
+import time
+from typing import Callable
+
+from pydantic import TypeAdapter
+
+from demo_service.contracts import UserRequest, UserResource
+from demo_service.store import UserRecord
+
+ITERATIONS = 100_000
+
+_response_adapter = TypeAdapter(UserResource)
+
+body = UserRequest.model_validate(
+    {
+        "username": "john.doe",
+        "first_name": "John",
+        "last_name": "Doe",
+        "birthdate": "1990-01-01T00:00:00",
+    }
+)
+stored_resource = UserResource(uid=0, **body.model_dump())
+stored_record = UserRecord.from_request(0, body)
+
+
+def _render_response_model(resource: UserResource) -> bytes:
+    validated = _response_adapter.validate_python(resource, from_attributes=True)
+    return json.dumps(_response_adapter.dump_python(validated, mode="json")).encode()
+
+
+def create_before() -> bytes:
+    resource = UserResource(uid=0, **body.model_dump())
+    return _render_response_model(resource)
+
+
+def create_after() -> bytes:
+    return UserRecord.from_request(0, body).to_json()
+
+
+def get_before() -> bytes:
+    return _render_response_model(stored_resource)
+
+
+def get_after() -> bytes:
+    return stored_record.to_json()
+
+
+def measure(func: Callable[[], bytes]) -> float:
+    started_at = time.process_time()
+
+    for _ in range(ITERATIONS):
+        func()
+
+    return (time.process_time() - started_at) / ITERATIONS * 1e6
+
+
+if __name__ == "__main__":
+    for name, before, after in [
+        ("/create-user", create_before, create_after),
+        ("/get-user", get_before, get_after),
+    ]:
+        before_us, after_us = measure(before), measure(after)
+        print(
+            f"{name:<14} before {before_us:6.2f} us  after {after_us:6.2f} us"
+            f"  x{before_us / after_us:.1f}"
+        )
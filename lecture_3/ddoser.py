@@ -1,44 +1,268 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+"""Load generator for demo service.
 
-import requests
+Requests go through one `httpx.AsyncClient` with keep-alive pool, payloads
+are generated with Faker before the clock starts. Two workload models:
+
+- closed: `--concurrency` virtual users, each sends next request right after
+  previous response (measures throughput at fixed concurrency);
+- open: requests arrive at `--rate` per second regardless of how fast service
+  answers. Latency is measured from scheduled arrival time, so queueing on
+  our side (coordinated omission) is counted against the service.
+
+    python ddoser.py --model open --rate 2000 --duration 60 --report report.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
 from faker import Faker
 
-faker = Faker()
+PERCENTILES = (50.0, 75.0, 90.0, 95.0, 99.0, 99.9, 99.99)
+
+
+@dataclass(slots=True)
+class LatencyHistogram:
+    """HDR-style log-linear histogram over microseconds.
+
+    Each power of two range is split into `2 ** (significant_bits - 1)`
+    linear buckets, so relative error stays below `2 ** -(significant_bits - 1)`
+    with memory bounded by a few thousand counters.
+    """
+
+    significant_bits: int = 8
+
+    count: int = 0
+    total_us: int = 0
+    min_us: int | None = None
+    max_us: int = 0
+    _counts: dict[int, int] = field(init=False, default_factory=dict)
+
+    def _key(self, us: int) -> int:
+        magnitude = max(0, us.bit_length() - self.significant_bits)
+        return (magnitude << self.significant_bits) + (us >> magnitude)
+
+    def _value(self, key: int) -> int:
+        magnitude = key >> self.significant_bits
+        sub_bucket = key & ((1 << self.significant_bits) - 1)
+        # midpoint of bucket
+        return (sub_bucket << magnitude) + ((1 << magnitude) >> 1)
 
+    def record(self, seconds: float) -> None:
+        us = max(0, int(seconds * 1_000_000))
+        key = self._key(us)
 
-def create_users():
-    for _ in range(500):
-        user = faker.profile()
-        response = requests.post(
-            "http://localhost:8080/create-user",
-            json={
-                "username": user["username"],
-                "first_name": user["name"],
-                "last_name": "",
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self.count += 1
+        self.total_us += us
+        self.max_us = max(self.max_us, us)
+        self.min_us = us if self.min_us is None else min(self.min_us, us)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for key, count in other._counts.items():
+            self._counts[key] = self._counts.get(key, 0) + count
+
+        self.count += other.count
+        self.total_us += other.total_us
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = (
+                other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+            )
+
+    def percentile(self, percent: float) -> int:
+        if not self.count:
+            return 0
+
+        threshold = self.count * percent / 100
+        seen = 0
+
+        for key in sorted(self._counts):
+            seen += self._counts[key]
+            if seen >= threshold:
+                return min(self._value(key), self.max_us)
+
+        return self.max_us
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "min_ms": (self.min_us or 0) / 1000,
+            "mean_ms": self.total_us / self.count / 1000 if self.count else 0.0,
+            "max_ms": self.max_us / 1000,
+            "percentiles_ms": {
+                f"p{percent:g}": self.percentile(percent) / 1000
+                for percent in PERCENTILES
             },
-        )
+        }
+
+
+@dataclass(slots=True)
+class ScenarioStats:
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    statuses: dict[str, int] = field(default_factory=dict)
+
+    def observe(self, status: str, seconds: float) -> None:
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.latency.record(seconds)
 
-        print(response)
 
+@dataclass(slots=True)
+class Request:
+    scenario: str
+    method: str
+    url: str
+    params: dict[str, Any] | None = None
+    json: Any = None
 
-def get_users():
-    for _ in range(500):
-        
-        response = requests.post(
-            "http://localhost:8080/get-user",
-            params={"id": faker.random_number(digits=2)},
+
+def generate_requests(count: int, create_ratio: float, max_id: int) -> list[Request]:
+    faker = Faker()
+    requests = []
+
+    for _ in range(count):
+        if random.random() < create_ratio:
+            profile = faker.simple_profile()
+            requests.append(
+                Request(
+                    "create-user",
+                    "POST",
+                    "/create-user",
+                    json={
+                        "username": profile["username"],
+                        "first_name": profile["name"],
+                        "last_name": "",
+                    },
+                )
+            )
+        else:
+            requests.append(
+                Request(
+                    "get-user",
+                    "POST",
+                    "/get-user",
+                    params={"id": random.randint(0, max_id)},
+                )
+            )
+
+    return requests
+
+
+@dataclass(slots=True)
+class LoadGenerator:
+    client: httpx.AsyncClient
+    requests: list[Request]
+    stats: dict[str, ScenarioStats] = field(default_factory=dict)
+
+    async def _send(self, request: Request, started_at: float) -> None:
+        try:
+            response = await self.client.request(
+                request.method, request.url, params=request.params, json=request.json
+            )
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+
+        self.stats.setdefault(request.scenario, ScenarioStats()).observe(
+            status, time.perf_counter() - started_at
         )
-        print(response)
 
+    async def run_closed(self, concurrency: int, deadline: float) -> None:
+        cursor = iter(range(len(self.requests)))
+
+        async def user() -> None:
+            for i in cursor:
+                if time.perf_counter() >= deadline:
+                    return
+                await self._send(self.requests[i], time.perf_counter())
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+
+    async def run_open(self, rate: float, deadline: float) -> None:
+        tasks = set()
+        started_at = time.perf_counter()
+
+        for i, request in enumerate(self.requests):
+            scheduled_at = started_at + i / rate
+            if scheduled_at >= deadline:
+                break
+
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            task = asyncio.create_task(self._send(request, scheduled_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        await asyncio.gather(*tasks)
+
+
+async def main(args: argparse.Namespace) -> dict[str, Any]:
+    total = args.requests or int(
+        (args.rate if args.model == "open" else 2_000) * args.duration
+    )
+    requests = generate_requests(total, args.create_ratio, args.max_id)
+
+    limits = httpx.Limits(
+        max_connections=args.connections,
+        max_keepalive_connections=args.connections,
+    )
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=args.timeout
+    ) as client:
+        generator = LoadGenerator(client, requests)
+
+        started_at = time.perf_counter()
+        deadline = started_at + args.duration
+
+        if args.model == "open":
+            await generator.run_open(args.rate, deadline)
+        else:
+            await generator.run_closed(args.concurrency, deadline)
+
+        elapsed = time.perf_counter() - started_at
+
+    overall = LatencyHistogram()
+    for stats in generator.stats.values():
+        overall.merge(stats.latency)
+
+    return {
+        "model": args.model,
+        "duration_s": elapsed,
+        "requests": overall.count,
+        "throughput_rps": overall.count / elapsed if elapsed else 0.0,
+        "latency": overall.summary(),
+        "scenarios": {
+            name: {"statuses": stats.statuses, "latency": stats.latency.summary()}
+            for name, stats in generator.stats.items()
+        },
+    }
 
-with ThreadPoolExecutor() as executor:
-    futures = {}
 
-    for i in range(15):
-        futures[executor.submit(create_users)] = f"create-user-{i}"
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--model", choices=["open", "closed"], default="closed")
+    parser.add_argument("--rate", type=float, default=500.0, help="open model rps")
+    parser.add_argument("--concurrency", type=int, default=30, help="closed model")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--requests", type=int, help="payloads to pre-generate")
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--create-ratio", type=float, default=0.5)
+    parser.add_argument("--max-id", type=int, default=99)
+    parser.add_argument("--report", help="path of json report")
+    args = parser.parse_args()
 
-    for _ in range(15):
-        futures[executor.submit(get_users)] = f"get-users-{i}"
+    report = asyncio.run(main(args))
+    print(json.dumps(report, indent=2))
 
-    for future in as_completed(futures):
-        print(f"completed {futures[future]}")
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump(report, report_file, indent=2)
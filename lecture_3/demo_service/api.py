@@ -1,30 +1,103 @@
+import hmac
+import os
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Any, Callable
 
-from fastapi import FastAPI, HTTPException, Query
-from prometheus_fastapi_instrumentator import Instrumentator
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic_core import to_json
 
 from demo_service import store
-from demo_service.contracts import UserRequest, UserResource
+from demo_service.contracts import UserLookupError, UserRequest, UserResource
+from lecture_4 import profiling
+from lecture_4.metrics import setup_metrics
 
 app = FastAPI(title="Demo User API")
-Instrumentator().instrument(app).expose(app)
+setup_metrics(app)
 
+# batch is handled in one store call and one response, so its size bounds
+# time and memory of request
+MAX_BATCH_SIZE = 1000
 
+
+def requires_profiler_token(x_profiler_token: Annotated[str, Header()]) -> None:
+    if not hmac.compare_digest(x_profiler_token, os.environ["PROFILER_TOKEN"]):
+        raise HTTPException(HTTPStatus.FORBIDDEN)
+
+
+# service has no users with roles, so profiler is enabled only when
+# `PROFILER_TOKEN` is set and is passed in `X-Profiler-Token` header
+if os.environ.get("PROFILER_TOKEN"):
+    app.include_router(
+        profiling.create_router(dependencies=[Depends(requires_profiler_token)])
+    )
+
+
+async def _call_store[_TResult](func: Callable[..., _TResult], *args: Any) -> _TResult:
+    # SQLite store waits for disk and other writers, memory one never blocks
+    # for long and its calls are cheaper than hop to threadpool
+    if store.is_blocking():
+        return await run_in_threadpool(func, *args)
+
+    return func(*args)
+
+
+# handlers return already encoded `Response`, so FastAPI skips response model
+# validation - `response_model` is kept only for OpenAPI schema
 @app.post(
     "/create-user",
     response_model=UserResource,
     status_code=HTTPStatus.CREATED,
 )
-async def create_user(body: UserRequest) -> UserResource:
-    return store.insert(body)
+async def create_user(body: UserRequest) -> Response:
+    record = await _call_store(store.insert, body)
+
+    return Response(
+        record.to_json(),
+        status_code=HTTPStatus.CREATED,
+        media_type="application/json",
+    )
+
+
+@app.post(
+    "/create-users",
+    response_model=list[UserResource],
+    status_code=HTTPStatus.CREATED,
+)
+async def create_users(
+    body: Annotated[list[UserRequest], Body(max_length=MAX_BATCH_SIZE)],
+) -> Response:
+    records = await _call_store(store.insert_many, body)
 
+    return Response(
+        to_json(records),
+        status_code=HTTPStatus.CREATED,
+        media_type="application/json",
+    )
 
-@app.post("/get-user")
-async def get_user(id: Annotated[int, Query()]) -> UserResource:
-    resource = store.select(id)
 
-    if not resource:
+@app.post("/get-user", response_model=UserResource)
+async def get_user(id: Annotated[int, Query()]) -> Response:
+    record = await _call_store(store.select, id)
+
+    if not record:
         raise HTTPException(HTTPStatus.NOT_FOUND)
 
-    return resource
+    return Response(record.to_json(), media_type="application/json")
+
+
+@app.post("/get-users", response_model=list[UserResource | UserLookupError])
+async def get_users(
+    ids: Annotated[list[int], Body(max_length=MAX_BATCH_SIZE)],
+) -> Response:
+    records = await _call_store(store.select_many, ids)
+
+    return Response(
+        to_json(
+            [
+                record or UserLookupError(uid=id, detail="Not Found")
+                for id, record in zip(ids, records)
+            ]
+        ),
+        media_type="application/json",
+    )
@@ -16,3 +16,8 @@ class UserRequest(BaseModel):
     first_name: str
     last_name: str
     birthdate: datetime | None = None
+
+
+class UserLookupError(BaseModel):
+    uid: int
+    detail: str
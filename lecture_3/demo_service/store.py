@@ -1,27 +1,278 @@
-from typing import Iterable
+import itertools
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import ClassVar, Protocol
 
-from demo_service.contracts import UserRequest, UserResource
+from pydantic_core import to_json
 
+from demo_service.contracts import UserRequest
 
-def _generate_int_id() -> Iterable[int]:
-    i = 0
-    while True:
-        yield i
-        i += 1
 
+@dataclass(slots=True)
+class UserRecord:
+    """Stored user - same fields as `UserResource`, but plain slots dataclass,
+    so it is built without running validation again.
+    """
 
-_users = dict[int, UserResource]()
-_id_generator = _generate_int_id()
+    uid: int
+    username: str
+    first_name: str
+    last_name: str
+    birthdate: datetime | None = None
 
+    @staticmethod
+    def from_request(uid: int, user: UserRequest) -> "UserRecord":
+        return UserRecord(
+            uid, user.username, user.first_name, user.last_name, user.birthdate
+        )
 
-def insert(user: UserRequest) -> UserResource:
-    id = next(_id_generator)
-    resource = UserResource(uid=id, **user.model_dump())
+    def to_json(self) -> bytes:
+        return to_json(self)
 
-    _users[id] = resource
 
-    return resource
+class UserStore(Protocol):
+    # calls may wait for disk or other processes, keep them off event loop
+    blocking: ClassVar[bool]
 
+    def insert(self, user: UserRequest) -> UserRecord: ...
+    def insert_many(self, users: list[UserRequest]) -> list[UserRecord]: ...
+    def select(self, id: int) -> UserRecord | None: ...
+    def select_many(self, ids: list[int]) -> list[UserRecord | None]: ...
 
-def select(id: int) -> UserResource | None:
-    return _users.get(id, None)
+
+class ShardedMemoryStore:
+    """In-process store safe for concurrent writers.
+
+    Ids come from a single locked counter, users are spread across shards
+    each guarded by its own lock, so writers only contend within a shard.
+    """
+
+    blocking = False
+
+    def __init__(self, shards: int = 16) -> None:
+        self._id_lock = threading.Lock()
+        self._id_generator = itertools.count()
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._shards = [dict[int, UserRecord]() for _ in range(shards)]
+
+    def _next_id(self) -> int:
+        with self._id_lock:
+            return next(self._id_generator)
+
+    def _next_ids(self, count: int) -> range:
+        with self._id_lock:
+            first = next(self._id_generator)
+            self._id_generator = itertools.count(first + count)
+
+        return range(first, first + count)
+
+    def insert(self, user: UserRequest) -> UserRecord:
+        id = self._next_id()
+        record = UserRecord.from_request(id, user)
+
+        shard = id % len(self._shards)
+        with self._locks[shard]:
+            self._shards[shard][id] = record
+
+        return record
+
+    def insert_many(self, users: list[UserRequest]) -> list[UserRecord]:
+        records = [
+            UserRecord.from_request(id, user)
+            for id, user in zip(self._next_ids(len(users)), users)
+        ]
+
+        # group by shard so every lock is taken once per batch
+        by_shard = [dict[int, UserRecord]() for _ in self._shards]
+        for record in records:
+            by_shard[record.uid % len(self._shards)][record.uid] = record
+
+        for lock, shard, batch in zip(self._locks, self._shards, by_shard):
+            if batch:
+                with lock:
+                    shard.update(batch)
+
+        return records
+
+    def select(self, id: int) -> UserRecord | None:
+        shard = id % len(self._shards)
+        with self._locks[shard]:
+            return self._shards[shard].get(id, None)
+
+    def select_many(self, ids: list[int]) -> list[UserRecord | None]:
+        return [self.select(id) for id in ids]
+
+
+class SqliteStore:
+    """Store in local SQLite file in WAL mode, shared by all worker processes.
+
+    Every thread gets its own connection. Ids are taken from counter in
+    `uid_sequence` table in the same transaction as insert - SQLite
+    serializes writers, so blocks of ids are never shared by processes and
+    never reused.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._local = threading.local()
+        connection = self._connection()
+
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS users (
+                    uid INTEGER PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    first_name TEXT NOT NULL,
+                    last_name TEXT NOT NULL,
+                    birthdate TEXT
+                )
+                """
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS uid_sequence (next INTEGER NOT NULL)"
+            )
+            # files created before sequence continue after their last id
+            connection.execute(
+                "INSERT INTO uid_sequence"
+                " SELECT (SELECT COALESCE(MAX(uid) + 1, 0) FROM users)"
+                " WHERE NOT EXISTS (SELECT 1 FROM uid_sequence)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=30.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+
+        return connection
+
+    @staticmethod
+    def _reserve_ids(connection: sqlite3.Connection, count: int) -> int:
+        """First of `count` new ids, counter stays taken until commit."""
+        (first,) = connection.execute(
+            "UPDATE uid_sequence SET next = next + ? RETURNING next - ?",
+            (count, count),
+        ).fetchone()
+        return first
+
+    def insert(self, user: UserRequest) -> UserRecord:
+        return self.insert_many([user])[0]
+
+    def insert_many(self, users: list[UserRequest]) -> list[UserRecord]:
+        if not users:
+            return []
+
+        connection = self._connection()
+
+        with connection:
+            first = self._reserve_ids(connection, len(users))
+            records = [
+                UserRecord.from_request(id, user)
+                for id, user in enumerate(users, start=first)
+            ]
+            connection.executemany(
+                "INSERT INTO users (uid, username, first_name, last_name, birthdate)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        record.uid,
+                        record.username,
+                        record.first_name,
+                        record.last_name,
+                        record.birthdate.isoformat() if record.birthdate else None,
+                    )
+                    for record in records
+                ],
+            )
+
+        return records
+
+    def select(self, id: int) -> UserRecord | None:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT uid, username, first_name, last_name, birthdate"
+                " FROM users WHERE uid = ?",
+                (id,),
+            )
+            .fetchone()
+        )
+
+        if row is None:
+            return None
+
+        return self._to_record(row)
+
+    def select_many(self, ids: list[int]) -> list[UserRecord | None]:
+        found = {}
+        connection = self._connection()
+
+        # stay below SQLITE_MAX_VARIABLE_NUMBER of older sqlite builds
+        for offset in range(0, len(ids), 900):
+            chunk = ids[offset : offset + 900]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = connection.execute(
+                "SELECT uid, username, first_name, last_name, birthdate"
+                f" FROM users WHERE uid IN ({placeholders})",
+                chunk,
+            )
+            for row in rows:
+                found[row[0]] = self._to_record(row)
+
+        return [found.get(id) for id in ids]
+
+    @staticmethod
+    def _to_record(row: tuple) -> UserRecord:
+        uid, username, first_name, last_name, birthdate = row
+        return UserRecord(
+            uid,
+            username,
+            first_name,
+            last_name,
+            datetime.fromisoformat(birthdate) if birthdate else None,
+        )
+
+
+def create_store() -> UserStore:
+    """Picks backend by `USER_STORE_SQLITE_PATH` env variable: set it to share
+    users between `uvicorn --workers N` processes.
+    """
+    path = os.environ.get("USER_STORE_SQLITE_PATH")
+
+    if path:
+        return SqliteStore(path)
+
+    return ShardedMemoryStore()
+
+
+_store = create_store()
+
+
+def is_blocking() -> bool:
+    return _store.blocking
+
+
+def insert(user: UserRequest) -> UserRecord:
+    return _store.insert(user)
+
+
+def insert_many(users: list[UserRequest]) -> list[UserRecord]:
+    return _store.insert_many(users)
+
+
+def select(id: int) -> UserRecord | None:
+    return _store.select(id)
+
+
+def select_many(ids: list[int]) -> list[UserRecord | None]:
+    return _store.select_many(ids)
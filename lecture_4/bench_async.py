@@ -0,0 +1,85 @@
+"""Time and peak memory of `map_async` variants.
+
+Every call yields to event loop once, so numbers show cost of scheduling, not
+of work. Memory is tracemalloc peak, which also slows everything down - use
+`--no-memory` for clean times.
+
+    python -m lecture_4.bench_async --items 1000000
+"""
+
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from lecture_4.example_async import imap_async, map_async
+
+
+async def work(value: int) -> int:
+    await asyncio.sleep(0)
+    return value
+
+
+async def gather_all(items: int, concurrency: int) -> None:
+    await map_async(work, range(items))
+
+
+async def bounded(items: int, concurrency: int) -> None:
+    await map_async(work, range(items), max_concurrency=concurrency)
+
+
+async def stream_ordered(items: int, concurrency: int) -> None:
+    async for _ in imap_async(work, range(items), max_concurrency=concurrency):
+        pass
+
+
+async def stream_unordered(items: int, concurrency: int) -> None:
+    async for _ in imap_async(
+        work, range(items), max_concurrency=concurrency, ordered=False
+    ):
+        pass
+
+
+async def stream_async_iterable(items: int, concurrency: int) -> None:
+    async def values():
+        for value in range(items):
+            yield value
+
+    async for _ in imap_async(work, values(), max_concurrency=concurrency):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--no-memory", action="store_true")
+    args = parser.parse_args()
+
+    for variant in [
+        gather_all,
+        bounded,
+        stream_ordered,
+        stream_unordered,
+        stream_async_iterable,
+    ]:
+        gc.collect()
+        if not args.no_memory:
+            tracemalloc.start()
+
+        started_at = time.perf_counter()
+        asyncio.run(variant(args.items, args.concurrency))
+        elapsed = time.perf_counter() - started_at
+
+        line = (
+            f"{variant.__name__:>22}: {elapsed:6.2f}s,"
+            f" {args.items / elapsed:9.0f} items/s"
+        )
+
+        if not args.no_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            line += f", peak {peak / 2**20:7.1f} MiB"
+
+        print(line)
@@ -0,0 +1,107 @@
+"""In-process RPS comparison of ASGI apps serving `GET /`.
+
+Requests are fed straight into the ASGI callable, so numbers show framework
+cost only - no sockets, no HTTP parsing. For end to end numbers run the app
+with uvicorn and point `test_load_demo_service.js` at it.
+
+    python -m lecture_4.bench_load --requests 50000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from prometheus_fastapi_instrumentator import Instrumentator
+
+from lecture_4 import example_load, example_load_micro
+from lecture_4.metrics import FastMetrics
+
+
+def _plain_fastapi() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/")
+    async def get_default():
+        return PlainTextResponse(content="Hello, world!")
+
+    return app
+
+
+def _instrumented_fastapi() -> FastAPI:
+    app = _plain_fastapi()
+    Instrumentator().instrument(app).expose(app)
+    return app
+
+
+def _fast_metrics_fastapi() -> FastAPI:
+    app = _plain_fastapi()
+    FastMetrics(multiprocess_dir=None).instrument(app).expose(app)
+    return app
+
+
+# first app is baseline, others are reported relative to it
+APPS = {
+    "fastapi": _plain_fastapi(),
+    "fastapi+instrumentator": _instrumented_fastapi(),
+    "fastapi+fast-metrics": _fast_metrics_fastapi(),
+    "example_load": example_load.app,
+    "micro": example_load_micro.app,
+}
+
+
+async def _receive() -> dict[str, Any]:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(_: dict[str, Any]) -> None:
+    pass
+
+
+def _scope() -> dict[str, Any]:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/",
+        "raw_path": b"/",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("127.0.0.1", 8000),
+        "state": {},
+    }
+
+
+async def measure(app: Any, requests: int) -> float:
+    for _ in range(min(requests, 1000)):  # warm up
+        await app(_scope(), _receive, _send)
+
+    started_at = time.perf_counter()
+
+    for _ in range(requests):
+        await app(_scope(), _receive, _send)
+
+    return requests / (time.perf_counter() - started_at)
+
+
+async def main(requests: int) -> None:
+    baseline = None
+
+    for name, app in APPS.items():
+        rps = await measure(app, requests)
+        baseline = baseline or rps
+        print(f"{name:<24} {rps:>12,.0f} req/s  x{rps / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests))
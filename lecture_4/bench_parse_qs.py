@@ -0,0 +1,70 @@
+"""Query string parsing: `query_string` against `urllib.parse.parse_qs` and
+the example from `example_parse_qs`.
+
+Every parser gets `str`, `query_string` also gets `bytes` as ASGI servers
+pass it. Example parser fails on some inputs, then it is shown as `-`.
+
+    python -m lecture_4.bench_parse_qs --repeat 20
+"""
+
+import argparse
+import time
+from functools import partial
+from typing import Any, Callable
+from urllib.parse import parse_qs as urllib_parse_qs
+
+from lecture_4 import example_parse_qs, query_string
+
+QUERIES = {
+    "short": "name=John&age=30&city=New%20York",
+    "long": "&".join(f"field{i}=value+{i}%20%C3%A9" for i in range(5000)),
+    "repeated": "&".join(f"tag={i}" for i in range(5000)),
+    "long value": "q=" + "%41%42%43+" * 20_000,
+    "bad escapes": "q=" + "%zz%" * 20_000,
+    "separators": "&" * 50_000 + "a=1",
+    "equal signs": "q=" + "=" * 50_000,
+}
+
+# parser and whether it gets query as bytes
+PARSERS: dict[str, tuple[Callable[[Any], Any], bool]] = {
+    "example": (example_parse_qs.parse_qs, False),
+    "urllib": (partial(urllib_parse_qs, keep_blank_values=True), False),
+    "query_string": (query_string.parse_qs, False),
+    "query_string bytes": (query_string.parse_qs, True),
+    # what request handler reading one parameter pays
+    "lazy, one name": (lambda query: query_string.QueryParams(query).get("q"), True),
+}
+
+
+def run(parse: Callable[[Any], Any], query: Any, repeat: int) -> float | None:
+    try:
+        parse(query)
+    except ValueError:
+        return None
+
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        parse(query)
+
+    return (time.perf_counter() - started_at) / repeat * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'':>12}" + "".join(f"{name:>20}" for name in PARSERS))
+
+    for name, query in QUERIES.items():
+        times = [
+            run(parse, query.encode() if as_bytes else query, args.repeat)
+            for parse, as_bytes in PARSERS.values()
+        ]
+        print(
+            f"{name:>12}"
+            + "".join(
+                f"{'-':>20}" if elapsed is None else f"{elapsed:17.1f} us"
+                for elapsed in times
+            )
+        )
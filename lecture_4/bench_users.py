@@ -0,0 +1,82 @@
+"""Memory per user of `UserService` storage layouts.
+
+Users get realistic values: scrypt hash as password, distinct usernames and
+birthdates. Memory is what tracemalloc sees allocated while users are added.
+
+    python -m lecture_4.bench_users --users 1000000
+"""
+
+import argparse
+import base64
+import gc
+import secrets
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from lecture_4.demo_service.core.users import (
+    ColumnarStorage,
+    ModelStorage,
+    UserEntity,
+    UserInfo,
+    UserStorage,
+)
+
+
+def fake_hash() -> str:
+    salt = base64.b64encode(secrets.token_bytes(16)).decode()
+    digest = base64.b64encode(secrets.token_bytes(32)).decode()
+    return f"scrypt$16384$8$1${salt}${digest}"
+
+
+def generate(count: int):
+    born = datetime(1970, 1, 1)
+
+    for uid in range(1, count + 1):
+        yield UserEntity(
+            uid=uid,
+            info=UserInfo(
+                username=f"user{uid}",
+                name=f"User Number {uid}",
+                birthdate=born + timedelta(days=uid % 20_000),
+                password=fake_hash(),
+            ),
+        )
+
+
+def measure(storage: UserStorage, count: int) -> tuple[float, float]:
+    gc.collect()
+    tracemalloc.start()
+    started_at = time.perf_counter()
+
+    for entity in generate(count):
+        storage.add(entity)
+
+    elapsed = time.perf_counter() - started_at
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return size / count, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for name, layout in [("models", ModelStorage), ("columnar", ColumnarStorage)]:
+        storage = layout()
+        per_user, elapsed = measure(storage, args.users)
+
+        uids = range(1, args.users + 1, 97)
+        started_at = time.perf_counter()
+        for uid in uids:
+            storage.get(uid)
+        get_us = (time.perf_counter() - started_at) / len(uids) * 1e6
+
+        print(
+            f"{name:>10}: {per_user:7.1f} B/user,"
+            f" add {elapsed:.1f}s, get {get_us:.2f} us"
+        )
+        del storage
@@ -32,3 +32,26 @@ class UserResponse(BaseModel):
 class UserAuthRequest(BaseModel):
     username: str
     password: SecretStr
+
+
+class SessionResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: float
+
+
+class UserSearchResponse(BaseModel):
+    users: list[UserResponse]
+    # pass as `cursor` to get next page, None on last page
+    next_cursor: str | None
+
+
+class UserImportError(BaseModel):
+    # line number in imported NDJSON, starting from 1
+    row: int
+    detail: str
+
+
+class UserImportResponse(BaseModel):
+    imported: int
+    errors: list[UserImportError]
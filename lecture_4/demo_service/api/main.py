@@ -1,6 +1,8 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 
+from lecture_4 import profiling
 from lecture_4.demo_service.api import users, utils
+from lecture_4.metrics import setup_metrics
 
 
 def create_app():
@@ -11,5 +13,9 @@ def create_app():
 
     app.add_exception_handler(ValueError, utils.value_error_handler)
     app.include_router(users.router)
+    app.include_router(
+        profiling.create_router(dependencies=[Depends(utils.requires_admin)])
+    )
+    setup_metrics(app)
 
     return app
@@ -1,19 +1,27 @@
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import PlainTextResponse
+from pydantic import ValidationError
 
 from lecture_4.demo_service.api.contracts import (
     RegisterUserRequest,
+    SessionResponse,
+    UserImportError,
+    UserImportResponse,
     UserResponse,
+    UserSearchResponse,
 )
 from lecture_4.demo_service.api.utils import (
     AdminDep,
     AuthorDep,
+    PasswordAuthorDep,
+    SessionSignerDep,
     UserServiceDep,
 )
-from lecture_4.demo_service.core.users import UserInfo, UserRole
+from lecture_4.demo_service.core.users import UserInfo, UserRole, UserService
 
 router = APIRouter()
 
@@ -23,10 +31,19 @@ async def register_user(
     body: RegisterUserRequest,
     user_service: UserServiceDep,
 ) -> UserResponse:
-    entity = user_service.register(UserInfo(**body.model_dump()))
+    # validators run on event loop, password is hashed in worker thread
+    entity = await user_service.register_async(UserInfo(**body.model_dump()))
     return UserResponse.from_user_entity(entity)
 
 
+@router.post("/user-login")
+async def login(author: PasswordAuthorDep, signer: SessionSignerDep) -> SessionResponse:
+    if signer is None:
+        raise HTTPException(HTTPStatus.NOT_FOUND)
+
+    return SessionResponse(access_token=signer.issue(author), expires_in=signer.ttl)
+
+
 @router.post("/user-get")
 async def get_user(
     user_service: UserServiceDep,
@@ -40,10 +57,11 @@ async def get_user(
     if id is None and username is None:
         raise ValueError("neither id nor username are provided")
 
+    # storage may read from database, keep it off event loop
     if id is not None and (author.uid == id or author.info.role == UserRole.ADMIN):
-        entity = user_service.get_by_id(id)
+        entity = await run_in_threadpool(user_service.get_by_id, id)
     elif author.info.username == username or author.info.role == UserRole.ADMIN:
-        entity = user_service.get_by_username(username)
+        entity = await run_in_threadpool(user_service.get_by_username, username)
 
     if entity is None:
         raise HTTPException(HTTPStatus.NOT_FOUND)
@@ -55,5 +73,99 @@ async def get_user(
 async def promote_user(
     id: Annotated[int, Query()], _: AdminDep, user_service: UserServiceDep
 ):
-    user_service.grant_admin(id)
+    # waits for commit of storage writer
+    await run_in_threadpool(user_service.grant_admin, id)
     return PlainTextResponse()
+
+
+@router.post("/user-search")
+async def search_users(
+    _: AdminDep,
+    user_service: UserServiceDep,
+    prefix: Annotated[str, Query()] = "",
+    limit: Annotated[int, Query(gt=0, le=1000)] = 100,
+    cursor: Annotated[str | None, Query()] = None,
+    ignore_case: Annotated[bool, Query()] = False,
+) -> UserSearchResponse:
+    entities = await run_in_threadpool(
+        user_service.search, prefix, limit, cursor, ignore_case
+    )
+
+    return UserSearchResponse(
+        users=[UserResponse.from_user_entity(entity) for entity in entities],
+        next_cursor=entities[-1].info.username if len(entities) == limit else None,
+    )
+
+
+async def _ndjson_rows(
+    stream: AsyncIterator[bytes],
+) -> AsyncIterator[tuple[int, bytes]]:
+    buffer = b""
+    row = 0
+
+    async for data in stream:
+        *lines, buffer = (buffer + data).split(b"\n")
+
+        for line in lines:
+            row += 1
+            if line.strip():
+                yield row, line
+
+    if buffer.strip():
+        yield row + 1, buffer
+
+
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, item['loc'])) or 'row'}: {item['msg']}"
+        for item in error.errors(include_url=False)
+    )
+
+
+async def _import_chunk(
+    user_service: UserService,
+    chunk: list[tuple[int, UserInfo]],
+    report: UserImportResponse,
+) -> None:
+    results = await user_service.register_many([info for _, info in chunk])
+
+    for (row, _), result in zip(chunk, results):
+        if isinstance(result, ValueError):
+            report.errors.append(UserImportError(row=row, detail=str(result)))
+        else:
+            report.imported += 1
+
+
+@router.post("/user-import")
+async def import_users(
+    _: AdminDep,
+    user_service: UserServiceDep,
+    request: Request,
+    chunk_size: Annotated[int, Query(gt=0, le=10_000)] = 1000,
+) -> UserImportResponse:
+    """Registers users from NDJSON body, one `RegisterUserRequest` per line.
+
+    Body is read as stream and imported in chunks of `chunk_size` users, each
+    chunk is stored at once. Rows that failed are listed in response.
+    """
+    report = UserImportResponse(imported=0, errors=[])
+    chunk: list[tuple[int, UserInfo]] = []
+
+    async for row, line in _ndjson_rows(request.stream()):
+        try:
+            body = RegisterUserRequest.model_validate_json(line)
+        except ValidationError as e:
+            report.errors.append(UserImportError(row=row, detail=_validation_detail(e)))
+            continue
+
+        # already validated as request
+        chunk.append((row, UserInfo.model_construct(**body.model_dump())))
+
+        if len(chunk) == chunk_size:
+            await _import_chunk(user_service, chunk, report)
+            chunk = []
+
+    if chunk:
+        await _import_chunk(user_service, chunk, report)
+
+    return report
@@ -1,3 +1,4 @@
+import os
 from contextlib import asynccontextmanager
 from datetime import datetime
 from http import HTTPStatus
@@ -5,39 +6,73 @@ from typing import Annotated
 
 from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.security import (
+    HTTPAuthorizationCredentials,
+    HTTPBasic,
+    HTTPBasicCredentials,
+    HTTPBearer,
+)
 
+from lecture_4.demo_service.core.breached import BreachedPasswords
+from lecture_4.demo_service.core.credentials import CredentialsCache
+from lecture_4.demo_service.core.sessions import Session, SessionSigner
+from lecture_4.demo_service.core.sqlite_storage import SqliteStorage
 from lecture_4.demo_service.core.users import (
+    ColumnarStorage,
+    PasswordHasher,
     UserEntity,
     UserInfo,
     UserRole,
     UserService,
     password_is_longer_than_8,
+    verify_password,
 )
 
 
 @asynccontextmanager
 async def initialize(app: FastAPI):
+    credentials_cache = CredentialsCache()
+    session_signer = SessionSigner()
+    password_validators = [
+        password_is_longer_than_8,
+        lambda pwd: any(char.isdigit() for char in pwd),
+    ]
+
+    if breached_path := os.environ.get("BREACHED_PASSWORDS_PATH"):
+        password_validators.append(BreachedPasswords(breached_path))
+
+    storage_path = os.environ.get("USER_STORAGE_PATH")
+    storage = SqliteStorage(storage_path) if storage_path else ColumnarStorage()
+
     user_service = UserService(
-        password_validators=[
-            password_is_longer_than_8,
-            lambda pwd: any(char.isdigit() for char in pwd),
-        ]
+        password_validators=password_validators,
+        password_hasher=PasswordHasher(),
+        change_listeners=[credentials_cache.invalidate, session_signer.revoke],
+        storage=storage,
+        # registrations run in threadpool
+        thread_safe=True,
     )
-    user_service.register(
-        UserInfo(
-            username="admin",
-            name="admin",
-            birthdate=datetime.fromtimestamp(0.0),
-            role=UserRole.ADMIN,
-            password="superSecretAdminPassword123",
+
+    if user_service.get_by_username("admin") is None:
+        await user_service.register_async(
+            UserInfo(
+                username="admin",
+                name="admin",
+                birthdate=datetime.fromtimestamp(0.0),
+                role=UserRole.ADMIN,
+                password="superSecretAdminPassword123",
+            )
         )
-    )
 
     app.state.user_service = user_service
+    app.state.credentials_cache = credentials_cache
+    app.state.session_signer = session_signer
 
     yield
 
+    if isinstance(storage, SqliteStorage):
+        storage.close()
+
 
 def user_service(request: Request) -> UserService:
     return request.app.state.user_service
@@ -45,32 +80,107 @@ def user_service(request: Request) -> UserService:
 
 UserServiceDep = Annotated[UserService, Depends(user_service)]
 
-security = HTTPBasic()
-CredentialsDep = Annotated[HTTPBasicCredentials, Depends(security)]
+
+def credentials_cache(request: Request) -> CredentialsCache | None:
+    return getattr(request.app.state, "credentials_cache", None)
+
+
+CredentialsCacheDep = Annotated[CredentialsCache | None, Depends(credentials_cache)]
+
+
+def session_signer(request: Request) -> SessionSigner | None:
+    return getattr(request.app.state, "session_signer", None)
+
+
+SessionSignerDep = Annotated[SessionSigner | None, Depends(session_signer)]
+
+# both are optional: author is authenticated by either of them
+security = HTTPBasic(auto_error=False)
+CredentialsDep = Annotated[HTTPBasicCredentials | None, Depends(security)]
+bearer = HTTPBearer(auto_error=False)
+BearerDep = Annotated[HTTPAuthorizationCredentials | None, Depends(bearer)]
+
+
+def requires_session(bearer: BearerDep, signer: SessionSignerDep) -> Session | None:
+    if bearer is None or signer is None:
+        return None
+
+    session = signer.verify(bearer.credentials)
+
+    if session is None:
+        raise HTTPException(
+            HTTPStatus.UNAUTHORIZED, headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    return session
+
+
+SessionDep = Annotated[Session | None, Depends(requires_session)]
 
 
+# sync on purpose: FastAPI runs it in worker thread, password check waits
+# for password pool there and does not block event loop
 def requires_author(
-    credentials: CredentialsDep, user_service: UserServiceDep
-) -> UserEntity:
+    credentials: CredentialsDep,
+    user_service: UserServiceDep,
+    credentials_cache: CredentialsCacheDep = None,
+    session: SessionDep = None,
+) -> UserEntity | Session:
+    if session is not None:
+        return session
+
+    if credentials is None:
+        raise HTTPException(
+            HTTPStatus.UNAUTHORIZED, headers={"WWW-Authenticate": "Basic"}
+        )
+
+    if credentials_cache is not None:
+        uid = credentials_cache.get(credentials.username, credentials.password)
+
+        if uid is not None and (entity := user_service.get_by_id(uid)) is not None:
+            return entity
+
     entity = user_service.get_by_username(credentials.username)
 
-    if not entity or entity.info.password.get_secret_value() != credentials.password:
+    # services without hasher keep passwords as is
+    plaintext = not isinstance(
+        getattr(user_service, "password_hasher", None), PasswordHasher
+    )
+
+    if not entity or not verify_password(
+        credentials.password, entity.info.password.get_secret_value(), plaintext
+    ):
         raise HTTPException(HTTPStatus.UNAUTHORIZED)
 
+    if credentials_cache is not None:
+        credentials_cache.put(credentials.username, credentials.password, entity.uid)
+
     return entity
 
 
-AuthorDep = Annotated[UserEntity, Depends(requires_author)]
+AuthorDep = Annotated[UserEntity | Session, Depends(requires_author)]
+
+
+def requires_password(
+    credentials: CredentialsDep,
+    user_service: UserServiceDep,
+    credentials_cache: CredentialsCacheDep = None,
+) -> UserEntity:
+    """Basic credentials only, so that session can not be renewed by itself."""
+    return requires_author(credentials, user_service, credentials_cache)
+
+
+PasswordAuthorDep = Annotated[UserEntity, Depends(requires_password)]
 
 
-def requires_admin(author: AuthorDep) -> UserEntity:
+def requires_admin(author: AuthorDep) -> UserEntity | Session:
     if author.info.role != UserRole.ADMIN:
         raise HTTPException(HTTPStatus.FORBIDDEN)
 
     return author
 
 
-AdminDep = Annotated[UserEntity, Depends(requires_admin)]
+AdminDep = Annotated[UserEntity | Session, Depends(requires_admin)]
 
 
 async def value_error_handler(request: Request, exc: ValueError) -> JSONResponse:
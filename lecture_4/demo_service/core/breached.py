@@ -0,0 +1,111 @@
+"""Offline check of passwords against known breaches.
+
+Breach corpora (e.g. Have I Been Pwned "SHA-1 ordered by hash" dump) are
+tens of GB of text, so they are compiled once into a file of sorted raw
+20-byte SHA-1 digests:
+
+    python -m lecture_4.demo_service.core.breached pwned-passwords.txt breached.bin
+
+`BreachedPasswords` maps that file into memory and binary searches it: a
+lookup touches ~30 records, the OS page cache keeps hot pages shared between
+worker processes and nothing is loaded on startup.
+"""
+
+import hashlib
+import mmap
+import sys
+from dataclasses import dataclass, field
+from typing import BinaryIO, Iterable
+
+RECORD_SIZE = hashlib.sha1().digest_size
+
+
+def compile_hashes(lines: Iterable[str], path: str) -> int:
+    """Writes digests from `HEXSHA1[:count]` lines to `path`, returns count.
+
+    Lines have to be sorted by hash, as in HIBP "ordered by hash" dump.
+    """
+    count = 0
+    previous = b""
+
+    with open(path, "wb") as file:
+        for line in lines:
+            digest = bytes.fromhex(line.split(":", 1)[0].strip())
+
+            if len(digest) != RECORD_SIZE:
+                raise ValueError(f"not a sha1 digest: {line!r}")
+            if digest <= previous:
+                raise ValueError("hashes are not sorted or not unique")
+
+            file.write(digest)
+            previous = digest
+            count += 1
+
+    return count
+
+
+@dataclass(slots=True)
+class BreachedPasswords:
+    """Password validator, fails passwords present in compiled breach file.
+
+    Lookups may wait for disk on cold pages, so it is `cpu_bound` - run in
+    password pool rather than on event loop.
+    """
+
+    path: str
+
+    _file: BinaryIO = field(init=False, repr=False)
+    _map: mmap.mmap | bytes = field(init=False, repr=False)
+    _count: int = field(init=False)
+
+    __cpu_bound__ = True
+
+    def __post_init__(self) -> None:
+        self._file = open(self.path, "rb")
+        size = self._file.seek(0, 2)
+
+        if size % RECORD_SIZE:
+            raise ValueError(f"{self.path} is not a compiled breach file")
+
+        # empty files can not be mapped
+        self._map = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        )
+        self._count = size // RECORD_SIZE
+
+    def contains(self, password: str) -> bool:
+        digest = hashlib.sha1(password.encode()).digest()
+        records = self._map
+        low, high = 0, self._count
+
+        while low < high:
+            middle = (low + high) // 2
+            offset = middle * RECORD_SIZE
+            record = records[offset : offset + RECORD_SIZE]
+
+            if record < digest:
+                low = middle + 1
+            elif record > digest:
+                high = middle
+            else:
+                return True
+
+        return False
+
+    def __call__(self, password: str) -> bool:
+        return not self.contains(password)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+
+if __name__ == "__main__":
+    source, target = sys.argv[1:3]
+
+    with open(source) as lines:
+        print(f"{compile_hashes(lines, target)} hashes written to {target}")
@@ -0,0 +1,80 @@
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class CredentialsCache:
+    """Remembers recently verified (username, password) pairs.
+
+    Pairs are stored as HMAC digests under a random per-process key, so the
+    cache never holds passwords and its content is useless outside of the
+    process. Entries live `ttl` seconds, least recently used are evicted
+    beyond `max_size`. `invalidate(uid)` drops all entries of user, it is
+    subscribed to `UserService` changes (role, password).
+    """
+
+    ttl: float = 30.0
+    max_size: int = 10_000
+
+    _key: bytes = field(init=False, default_factory=lambda: secrets.token_bytes(32))
+    _entries: OrderedDict[bytes, tuple[int, float]] = field(
+        init=False, default_factory=OrderedDict
+    )
+    _digests_by_uid: dict[int, set[bytes]] = field(init=False, default_factory=dict)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def _digest(self, username: str, password: str) -> bytes:
+        return hmac.digest(
+            self._key, f"{username}\0{password}".encode(), hashlib.sha256
+        )
+
+    def get(self, username: str, password: str) -> int | None:
+        digest = self._digest(username, password)
+
+        with self._lock:
+            entry = self._entries.get(digest)
+
+            if entry is None:
+                return None
+
+            uid, expires_at = entry
+
+            if expires_at <= time.monotonic():
+                self._remove(digest, uid)
+                return None
+
+            self._entries.move_to_end(digest)
+            return uid
+
+    def put(self, username: str, password: str, uid: int) -> None:
+        digest = self._digest(username, password)
+
+        with self._lock:
+            self._entries[digest] = (uid, time.monotonic() + self.ttl)
+            self._entries.move_to_end(digest)
+            self._digests_by_uid.setdefault(uid, set()).add(digest)
+
+            while len(self._entries) > self.max_size:
+                oldest, (oldest_uid, _) = next(iter(self._entries.items()))
+                self._remove(oldest, oldest_uid)
+
+    def invalidate(self, uid: int) -> None:
+        with self._lock:
+            for digest in self._digests_by_uid.pop(uid, ()):
+                self._entries.pop(digest, None)
+
+    def _remove(self, digest: bytes, uid: int) -> None:
+        del self._entries[digest]
+
+        digests = self._digests_by_uid[uid]
+        digests.discard(digest)
+        if not digests:
+            del self._digests_by_uid[uid]
+
+    def __len__(self) -> int:
+        return len(self._entries)
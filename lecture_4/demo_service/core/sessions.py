@@ -0,0 +1,114 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+
+from lecture_4.demo_service.core.users import UserEntity, UserRole
+
+
+@dataclass(frozen=True, slots=True)
+class SessionInfo:
+    username: str
+    role: UserRole
+
+
+@dataclass(frozen=True, slots=True)
+class Session:
+    """Verified token claims, shaped like `UserEntity` (`uid`, `info.username`,
+    `info.role`) so handlers accept either of them as author.
+    """
+
+    uid: int
+    info: SessionInfo
+    issued_at_ns: int
+    expires_at: float
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _default_secret() -> bytes:
+    secret = os.environ.get("SESSION_SECRET")
+    # without shared secret tokens are valid only in issuing process
+    return secret.encode() if secret else secrets.token_bytes(32)
+
+
+@dataclass(slots=True)
+class SessionSigner:
+    """Issues and verifies stateless `payload.signature` tokens.
+
+    Payload carries uid, username and role, signature is HMAC-SHA256 of it.
+    `revoke(uid)` rejects tokens of user issued before now - it is subscribed
+    to `UserService` changes, so promoted users have to log in again to get
+    new role. Revocations are kept for `ttl`, longer than any token lives.
+    """
+
+    ttl: float = 900.0
+    secret: bytes = field(default_factory=_default_secret, repr=False)
+
+    _revoked_before: dict[int, int] = field(init=False, default_factory=dict)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def _sign(self, payload: str) -> str:
+        return _b64encode(
+            hmac.digest(self.secret, payload.encode("ascii"), hashlib.sha256)
+        )
+
+    def issue(self, entity: UserEntity) -> str:
+        payload = _b64encode(
+            json.dumps(
+                [
+                    entity.uid,
+                    entity.info.username,
+                    entity.info.role.value,
+                    time.time_ns(),
+                    time.time() + self.ttl,
+                ],
+                separators=(",", ":"),
+            ).encode()
+        )
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token: str) -> Session | None:
+        if not token.isascii():
+            return None
+
+        payload, _, signature = token.rpartition(".")
+
+        if not hmac.compare_digest(self._sign(payload), signature):
+            return None
+
+        uid, username, role, issued_at_ns, expires_at = json.loads(_b64decode(payload))
+
+        if expires_at <= time.time():
+            return None
+
+        revoked_before = self._revoked_before.get(uid)
+        if revoked_before is not None and issued_at_ns <= revoked_before:
+            return None
+
+        return Session(
+            uid, SessionInfo(username, UserRole(role)), issued_at_ns, expires_at
+        )
+
+    def revoke(self, uid: int) -> None:
+        now = time.time_ns()
+        expired_before = now - int(self.ttl * 1e9)
+
+        with self._lock:
+            self._revoked_before = {
+                revoked_uid: revoked_at
+                for revoked_uid, revoked_at in self._revoked_before.items()
+                if revoked_at > expired_before
+            }
+            self._revoked_before[uid] = now
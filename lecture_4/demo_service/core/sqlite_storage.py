@@ -0,0 +1,431 @@
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Sequence
+
+from pydantic import SecretStr
+
+from lecture_4.demo_service.core.users import (
+    UserEntity,
+    UserInfo,
+    UserRole,
+    birthdate_from_micros,
+    birthdate_to_micros,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    uid INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    birthdate INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    password TEXT NOT NULL,
+    username_folded TEXT NOT NULL,
+    utc_offset INTEGER
+)
+"""
+_SEQUENCE_SCHEMA = "CREATE TABLE IF NOT EXISTS uid_sequence (next INTEGER NOT NULL)"
+_FOLDED_INDEX = (
+    "CREATE INDEX IF NOT EXISTS users_username_folded"
+    " ON users (username_folded, username)"
+)
+
+# constant statements are prepared once per connection and reused from
+# sqlite3 statement cache
+_COLUMNS = "uid, username, name, birthdate, utc_offset, role, password"
+_INSERT = (
+    f"INSERT INTO users ({_COLUMNS}, username_folded)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_SET_ROLE = "UPDATE users SET role = ? WHERE uid = ?"
+_RESERVE_UIDS = "UPDATE uid_sequence SET next = next + ? RETURNING next - ?"
+_SKIP_UIDS = "UPDATE uid_sequence SET next = MAX(next, ?)"
+_SELECT_BY_UID = f"SELECT {_COLUMNS} FROM users WHERE uid = ?"
+_SELECT_BY_USERNAME = f"SELECT {_COLUMNS} FROM users WHERE username = ?"
+_LAST_UID = "SELECT COALESCE(MAX(uid), 0) FROM users"
+_COUNT = "SELECT COUNT(*) FROM users"
+
+# operation is run by writer thread, its result is set to future
+type _Write = tuple[Callable[[sqlite3.Connection], Any], Future[Any]]
+
+
+def _execute(
+    connection: sqlite3.Connection, operation: Callable[[sqlite3.Connection], Any]
+) -> tuple[Any, sqlite3.IntegrityError | None]:
+    """Runs one write of group commit, undoes only it if it fails."""
+    connection.execute("SAVEPOINT write")
+    try:
+        return operation(connection), None
+    except sqlite3.IntegrityError as e:
+        connection.execute("ROLLBACK TO write")
+        return None, e
+    finally:
+        connection.execute("RELEASE write")
+
+
+def _add(connection: sqlite3.Connection, rows: list[tuple]) -> None:
+    connection.executemany(_INSERT, rows)
+    # uids given by caller are never allocated again
+    connection.execute(_SKIP_UIDS, (max(row[0] for row in rows) + 1,))
+
+
+def _add_new(
+    connection: sqlite3.Connection, infos: Sequence[UserInfo]
+) -> list[UserEntity]:
+    # counter stays locked until commit, so processes sharing file never get
+    # same uids
+    [(first,)] = connection.execute(_RESERVE_UIDS, (len(infos), len(infos))).fetchall()
+    entities = [UserEntity(uid=first + i, info=info) for i, info in enumerate(infos)]
+    connection.executemany(_INSERT, [_row(entity) for entity in entities])
+    return entities
+
+
+def _set_role(connection: sqlite3.Connection, uid: int, role: UserRole) -> None:
+    connection.execute(_SET_ROLE, (role.value, uid))
+
+
+def _prefix_end(prefix: str) -> str | None:
+    """Smallest string greater than all strings starting with prefix."""
+    if not prefix or prefix[-1] == chr(sys.maxunicode):
+        return None
+
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _migrate(connection: sqlite3.Connection) -> None:
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(users)")}
+
+    if "username_folded" not in columns:
+        # databases created before search had no folded usernames
+        connection.create_function("casefold", 1, str.casefold, deterministic=True)
+        connection.execute(
+            "ALTER TABLE users ADD COLUMN username_folded TEXT NOT NULL DEFAULT ''"
+        )
+        connection.execute("UPDATE users SET username_folded = casefold(username)")
+
+    connection.execute(_FOLDED_INDEX)
+
+    if "utc_offset" not in columns:
+        # offsets of aware birthdates were dropped before, they are read as
+        # naive UTC as they were
+        connection.execute("ALTER TABLE users ADD COLUMN utc_offset INTEGER")
+
+    connection.execute(_SEQUENCE_SCHEMA)
+    # databases created before sequence continue after their last uid
+    connection.execute(
+        "INSERT INTO uid_sequence"
+        " SELECT (SELECT COALESCE(MAX(uid), 0) + 1 FROM users)"
+        " WHERE NOT EXISTS (SELECT 1 FROM uid_sequence)"
+    )
+
+
+def _row(entity: UserEntity) -> tuple:
+    info = entity.info
+    return (
+        entity.uid,
+        info.username,
+        info.name,
+        *birthdate_to_micros(info.birthdate),
+        info.role.value,
+        info.password.get_secret_value(),
+        info.username.casefold(),
+    )
+
+
+def _entity(row: tuple) -> UserEntity:
+    uid, username, name, birthdate, utc_offset, role, password = row
+
+    # values were validated before they were written
+    return UserEntity.model_construct(
+        uid=uid,
+        info=UserInfo.model_construct(
+            username=username,
+            name=name,
+            birthdate=birthdate_from_micros(birthdate, utc_offset),
+            role=UserRole(role),
+            password=SecretStr(password),
+        ),
+    )
+
+
+@dataclass(slots=True)
+class SqliteStorage:
+    """`UserStorage` in SQLite database in WAL mode.
+
+    - writes go to single writer thread, which commits everything queued
+      since previous commit in one transaction (group commit) - callers
+      still return only after their write is committed;
+    - reads use connection per thread, WAL lets them run during writes;
+    - recently used users are kept in read-through LRU cache, so hot reads
+      do not touch database. Entities from cache are shared - change users
+      through storage only. Changes made by other processes sharing file
+      are not seen by cache, they show up once cached user is older than
+      `cache_ttl` seconds;
+    - uids of new users are taken from `uid_sequence` table in transaction
+      that inserts them, so processes sharing file never hand out same uid.
+
+    Nothing is loaded on start, so restart takes as long as opening file.
+    """
+
+    path: str
+    cache_size: int = 100_000
+    cache_ttl: float = 5.0
+    max_batch: int = 512
+
+    _local: threading.local = field(init=False, default_factory=threading.local)
+    _writes: queue.SimpleQueue[_Write | None] = field(
+        init=False, default_factory=queue.SimpleQueue
+    )
+    _writer: threading.Thread = field(init=False)
+    # user and monotonic time it expires at
+    _cache: OrderedDict[int, tuple[UserEntity, float]] = field(
+        init=False, default_factory=OrderedDict
+    )
+    _cached_uids: dict[str, int] = field(init=False, default_factory=dict)
+    _cache_lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+    # bumped on every change, rows read before it are not cached
+    _version: int = field(init=False, default=0)
+
+    def __post_init__(self) -> None:
+        with self._connection() as connection:
+            # processes opening same file migrate it one at a time
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(_SCHEMA)
+            _migrate(connection)
+
+        self._writer = threading.Thread(
+            target=self._write_loop, name="user-storage-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # with WAL commits survive process crash, only power loss may
+        # roll back last transactions
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = self._local.connection = self._connect()
+
+        return connection
+
+    def _write_loop(self) -> None:
+        connection = self._connect()
+
+        while True:
+            batch = [self._writes.get()]
+
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            writes = [write for write in batch if write is not None]
+            outcomes: list[tuple[Any, BaseException | None]] = []
+
+            try:
+                with connection:
+                    # savepoints of writes must not commit on release
+                    connection.execute("BEGIN IMMEDIATE")
+
+                    for operation, _ in writes:
+                        outcomes.append(_execute(connection, operation))
+            except BaseException as e:
+                # transaction is rolled back, writer stays alive for next ones
+                outcomes = [(None, e)] * len(writes)
+
+            for (_, future), (result, error) in zip(writes, outcomes):
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+            if len(writes) < len(batch):
+                connection.close()
+                return
+
+    def _write[T](self, operation: Callable[[sqlite3.Connection], T]) -> T:
+        future: Future[T] = Future()
+        self._writes.put((operation, future))
+        return future.result()
+
+    def _remember(self, entity: UserEntity, version: int | None = None) -> None:
+        with self._cache_lock:
+            if version is not None and version != self._version:
+                # user could be changed after row was read
+                return
+
+            self._cache[entity.uid] = (entity, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(entity.uid)
+            self._cached_uids[entity.info.username] = entity.uid
+
+            while len(self._cache) > self.cache_size:
+                _, (evicted, _) = self._cache.popitem(last=False)
+                self._cached_uids.pop(evicted.info.username, None)
+
+    def _forget(self, uid: int) -> None:
+        with self._cache_lock:
+            self._version += 1
+            cached = self._cache.pop(uid, None)
+
+            if cached is not None:
+                self._cached_uids.pop(cached[0].info.username, None)
+
+    def add(self, entity: UserEntity) -> None:
+        self._insert(partial(_add, rows=[_row(entity)]))
+        self._remember(entity)
+
+    def add_new(self, infos: Sequence[UserInfo]) -> list[UserEntity]:
+        """Adds users under next free uids, all of them or none."""
+        if not infos:
+            return []
+
+        entities = self._insert(partial(_add_new, infos=infos))
+
+        if len(entities) == 1:
+            # batches would push hot users out of cache
+            self._remember(entities[0])
+
+        return entities
+
+    def add_many(self, entities: Sequence[UserEntity]) -> None:
+        """Adds all users or none of them."""
+        if entities:
+            self._insert(partial(_add, rows=[_row(entity) for entity in entities]))
+
+    def _insert[T](self, operation: Callable[[sqlite3.Connection], T]) -> T:
+        try:
+            return self._write(operation)
+        except sqlite3.IntegrityError as e:
+            # other violations, like taken uid, are not caller's fault
+            if "users.username" not in str(e):
+                raise
+
+            raise ValueError("username is already taken") from e
+
+    def existing_usernames(self, usernames: Sequence[str]) -> set[str]:
+        connection = self._connection()
+        existing = set()
+
+        # stay below default limit of 999 variables of old SQLite versions
+        for start in range(0, len(usernames), 900):
+            chunk = usernames[start : start + 900]
+            placeholders = ", ".join("?" * len(chunk))
+            existing.update(
+                username
+                for (username,) in connection.execute(
+                    f"SELECT username FROM users WHERE username IN ({placeholders})",
+                    chunk,
+                )
+            )
+
+        return existing
+
+    def _cached(self, uid: int) -> tuple[UserEntity | None, int]:
+        """Cached user and cache version to read it from database with."""
+        with self._cache_lock:
+            cached = self._cache.get(uid)
+
+            if cached is None:
+                return None, self._version
+
+            entity, expires = cached
+
+            if expires <= time.monotonic():
+                # may be changed by other process meanwhile
+                del self._cache[uid]
+                self._cached_uids.pop(entity.info.username, None)
+                return None, self._version
+
+            self._cache.move_to_end(uid)
+            return entity, self._version
+
+    def get(self, uid: int) -> UserEntity | None:
+        entity, version = self._cached(uid)
+
+        if entity is None:
+            row = self._connection().execute(_SELECT_BY_UID, (uid,)).fetchone()
+
+            if row is None:
+                return None
+
+            entity = _entity(row)
+            self._remember(entity, version)
+
+        return entity
+
+    def get_by_username(self, username: str) -> UserEntity | None:
+        uid = self._cached_uids.get(username, -1)
+        entity, version = self._cached(uid)
+
+        if entity is not None:
+            return entity
+
+        row = self._connection().execute(_SELECT_BY_USERNAME, (username,)).fetchone()
+
+        if row is None:
+            return None
+
+        entity = _entity(row)
+        self._remember(entity, version)
+        return entity
+
+    def contains_username(self, username: str) -> bool:
+        return self.get_by_username(username) is not None
+
+    def set_role(self, uid: int, role: UserRole) -> None:
+        self._write(partial(_set_role, uid=uid, role=role))
+        self._forget(uid)
+
+    def search(
+        self, prefix: str, limit: int, after: str | None, ignore_case: bool
+    ) -> list[UserEntity]:
+        if ignore_case:
+            prefix = prefix.casefold()
+            column, order = "username_folded", "username_folded, username"
+        else:
+            column, order = "username", "username"
+
+        conditions, params = [f"{column} >= ?"], [prefix]
+
+        if (end := _prefix_end(prefix)) is not None:
+            conditions.append(f"{column} < ?")
+            params.append(end)
+
+        if after is not None:
+            if ignore_case:
+                conditions.append("(username_folded, username) > (?, ?)")
+                params += [after.casefold(), after]
+            else:
+                conditions.append("username > ?")
+                params.append(after)
+
+        rows = self._connection().execute(
+            f"SELECT {_COLUMNS} FROM users WHERE {' AND '.join(conditions)}"
+            f" ORDER BY {order} LIMIT ?",
+            (*params, limit),
+        )
+        return [_entity(row) for row in rows]
+
+    def last_uid(self) -> int:
+        return self._connection().execute(_LAST_UID).fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._connection().execute(_COUNT).fetchone()[0]
+
+    def close(self) -> None:
+        self._writes.put(None)
+        self._writer.join()
@@ -0,0 +1,131 @@
+import bisect
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+
+@dataclass(slots=True)
+class _SortedKeys:
+    """Sorted list split into blocks of `load`..`2 * load` keys.
+
+    Insert and delete move at most one block instead of whole list, lookup is
+    bisect over block maxima and then inside one block.
+    """
+
+    load: int = 1000
+
+    _blocks: list[list[Any]] = field(init=False, default_factory=list)
+    _maxes: list[Any] = field(init=False, default_factory=list)
+
+    def add(self, key: Any) -> None:
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            return
+
+        i = min(bisect.bisect_left(self._maxes, key), len(self._maxes) - 1)
+        block = self._blocks[i]
+        bisect.insort(block, key)
+        self._maxes[i] = block[-1]
+
+        if len(block) > 2 * self.load:
+            self._blocks[i : i + 1] = [block[: self.load], block[self.load :]]
+            self._maxes[i : i + 1] = [block[self.load - 1], block[-1]]
+
+    def discard(self, key: Any) -> None:
+        i = bisect.bisect_left(self._maxes, key)
+
+        if i == len(self._maxes):
+            return
+
+        block = self._blocks[i]
+        j = bisect.bisect_left(block, key)
+
+        if j == len(block) or block[j] != key:
+            return
+
+        del block[j]
+
+        if block:
+            self._maxes[i] = block[-1]
+        else:
+            del self._blocks[i]
+            del self._maxes[i]
+
+    def iter_from(self, key: Any, inclusive: bool = True) -> Iterator[Any]:
+        search = bisect.bisect_left if inclusive else bisect.bisect_right
+        i = search(self._maxes, key)
+
+        if i == len(self._maxes):
+            return
+
+        start = search(self._blocks[i], key)
+
+        for block in self._blocks[i:]:
+            yield from block[start:]
+            start = 0
+
+    def __len__(self) -> int:
+        return sum(len(block) for block in self._blocks)
+
+
+@dataclass(slots=True)
+class UsernameIndex:
+    """Usernames sorted as is and case-folded for prefix search.
+
+    `search` finds first match with bisect and reads following keys, so it
+    takes O(log N + limit). Pages continue `after` last username of previous
+    page.
+    """
+
+    _exact: _SortedKeys = field(init=False, default_factory=_SortedKeys)
+    _folded: _SortedKeys = field(init=False, default_factory=_SortedKeys)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def add(self, username: str) -> None:
+        with self._lock:
+            self._exact.add(username)
+            self._folded.add((username.casefold(), username))
+
+    def discard(self, username: str) -> None:
+        with self._lock:
+            self._exact.discard(username)
+            self._folded.discard((username.casefold(), username))
+
+    def search(
+        self,
+        prefix: str,
+        limit: int,
+        after: str | None = None,
+        ignore_case: bool = False,
+    ) -> list[str]:
+        if ignore_case:
+            prefix = prefix.casefold()
+            keys = self._folded
+            start = (prefix, "")
+            after_key = None if after is None else (after.casefold(), after)
+        else:
+            keys = self._exact
+            start = prefix
+            after_key = after
+
+        result = []
+
+        with self._lock:
+            if after_key is not None and after_key >= start:
+                candidates = keys.iter_from(after_key, inclusive=False)
+            else:
+                candidates = keys.iter_from(start)
+
+            for key in candidates:
+                folded, username = key if ignore_case else (key, key)
+
+                if len(result) == limit or not folded.startswith(prefix):
+                    break
+
+                result.append(username)
+
+        return result
+
+    def __len__(self) -> int:
+        return len(self._exact)
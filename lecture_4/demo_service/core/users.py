@@ -1,10 +1,24 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import inspect
+import os
+import secrets
+import sys
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import UTC, datetime, timedelta, timezone
 from enum import Enum
-from typing import Callable
+from typing import Awaitable, Callable, Iterable, Protocol, Sequence
 
 from pydantic import BaseModel, SecretStr
 
+from lecture_4.demo_service.core.username_index import UsernameIndex
+
 
 class UserRole(str, Enum):
     USER: str = "user"
@@ -25,29 +39,87 @@ class UserEntity(BaseModel):
 
 
 @dataclass(slots=True)
-class UserService:
-    password_validators: list[Callable[[str], bool]] = field(default_factory=list)
+class IdSequence:
+    """User ids, `next` and `reserve` may be called from many threads."""
+
+    last: int = 0
+
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def next(self) -> int:
+        with self._lock:
+            self.last += 1
+            return self.last
+
+    def reserve(self, count: int) -> range:
+        with self._lock:
+            first = self.last + 1
+            self.last += count
+            return range(first, self.last + 1)
+
+    def advance(self, uid: int) -> None:
+        """Skips ids up to `uid`, for users added with ids of their own."""
+        with self._lock:
+            self.last = max(self.last, uid)
+
+
+class UserStorage(Protocol):
+    def add(self, entity: UserEntity) -> None: ...
+    def add_new(self, infos: Sequence[UserInfo]) -> list[UserEntity]: ...
+    def get(self, uid: int) -> UserEntity | None: ...
+    def get_by_username(self, username: str) -> UserEntity | None: ...
+    def contains_username(self, username: str) -> bool: ...
+    def existing_usernames(self, usernames: Sequence[str]) -> set[str]: ...
+    def add_many(self, entities: Sequence[UserEntity]) -> None: ...
+    def set_role(self, uid: int, role: UserRole) -> None: ...
+    def search(
+        self, prefix: str, limit: int, after: str | None, ignore_case: bool
+    ) -> list[UserEntity]: ...
+    def last_uid(self) -> int: ...
+    def __len__(self) -> int: ...
+
+
+@dataclass(slots=True)
+class ModelStorage:
+    """Keeps `UserEntity` models as they are: simple, but every user costs two
+    models with their `__dict__`s, `SecretStr` and `datetime`.
+    """
 
     _data: dict[int, UserEntity] = field(init=False, default_factory=dict)
     _username_index: dict[str, int] = field(init=False, default_factory=dict)
-    _last_id: int = field(init=False, default=0)
+    _search_index: UsernameIndex = field(init=False, default_factory=UsernameIndex)
+    _ids: IdSequence = field(init=False, default_factory=IdSequence)
 
-    def register(self, user_info: UserInfo) -> UserEntity:
-        if user_info.username in self._username_index:
+    def add(self, entity: UserEntity) -> None:
+        self._ids.advance(entity.uid)
+        self._data[entity.uid] = entity
+        self._username_index[entity.info.username] = entity.uid
+        self._search_index.add(entity.info.username)
+
+    def add_new(self, infos: Sequence[UserInfo]) -> list[UserEntity]:
+        """Adds users under next free uids, all of them or none."""
+        if self.existing_usernames([info.username for info in infos]):
             raise ValueError("username is already taken")
 
-        for password_validator in self.password_validators:
-            if not password_validator(user_info.password.get_secret_value()):
-                raise ValueError("invalid password")
+        entities = [
+            UserEntity(uid=uid, info=info)
+            for uid, info in zip(self._ids.reserve(len(infos)), infos)
+        ]
 
-        self._last_id += 1
+        for entity in entities:
+            self.add(entity)
 
-        entity = UserEntity(uid=self._last_id, info=user_info)
+        return entities
 
-        self._data[entity.uid] = entity
-        self._username_index[entity.info.username] = entity.uid
+    def add_many(self, entities: Sequence[UserEntity]) -> None:
+        if self.existing_usernames([entity.info.username for entity in entities]):
+            raise ValueError("username is already taken")
 
-        return entity
+        for entity in entities:
+            self.add(entity)
+
+    def get(self, uid: int) -> UserEntity | None:
+        return self._data.get(uid)
 
     def get_by_username(self, username: str) -> UserEntity | None:
         if username not in self._username_index:
@@ -55,8 +127,585 @@ class UserService:
 
         return self._data[self._username_index[username]]
 
+    def contains_username(self, username: str) -> bool:
+        return username in self._username_index
+
+    def existing_usernames(self, usernames: Sequence[str]) -> set[str]:
+        return {username for username in usernames if username in self._username_index}
+
+    def set_role(self, uid: int, role: UserRole) -> None:
+        self._data[uid].info.role = role
+
+    def search(
+        self, prefix: str, limit: int, after: str | None, ignore_case: bool
+    ) -> list[UserEntity]:
+        return [
+            self.get_by_username(username)
+            for username in self._search_index.search(prefix, limit, after, ignore_case)
+        ]
+
+    def last_uid(self) -> int:
+        return max(self._data, default=0)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_ROLES = list(UserRole)
+_ROLE_CODES = {role: code for code, role in enumerate(_ROLES)}
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# offsets are within a day, so it is not offset of any aware datetime
+_NAIVE = -(2**31)
+
+
+def birthdate_to_micros(birthdate: datetime) -> tuple[int, int | None]:
+    """Microseconds since epoch and UTC offset in seconds, `None` for naive
+    datetimes. Aware datetimes are counted from epoch in UTC.
+    """
+    offset = birthdate.utcoffset()
+
+    if offset is None:
+        return (birthdate - _EPOCH) // _MICROSECOND, None
+
+    birthdate = birthdate.astimezone(UTC).replace(tzinfo=None)
+    return (birthdate - _EPOCH) // _MICROSECOND, int(offset.total_seconds())
+
+
+def birthdate_from_micros(micros: int, offset: int | None = None) -> datetime:
+    birthdate = _EPOCH + micros * _MICROSECOND
+
+    if offset is None:
+        return birthdate
+
+    return birthdate.replace(tzinfo=UTC).astimezone(timezone(timedelta(seconds=offset)))
+
+
+@dataclass(slots=True)
+class ColumnarStorage:
+    """Keeps users in columns - one array per field instead of objects per user.
+
+    uids, roles and birthdates (microseconds since epoch and UTC offsets of
+    aware datetimes) are machine words in arrays, usernames are interned,
+    passwords (hashes) are concatenated into one blob with end offsets.
+    `UserEntity` is built only when user is read, so changes to it are not
+    stored - use `set_role`.
+
+    Rows are found by uid in array indexed by uid, so uids are expected to be
+    sequence numbers, as assigned by `add_new`, but may come in any
+    order.
+    """
+
+    _uids: array = field(init=False, default_factory=lambda: array("q"))
+    # row of uid or -1
+    _rows: array = field(init=False, default_factory=lambda: array("i"))
+    _roles: bytearray = field(init=False, default_factory=bytearray)
+    _birthdates: array = field(init=False, default_factory=lambda: array("q"))
+    # offset in seconds or `_NAIVE`
+    _offsets: array = field(init=False, default_factory=lambda: array("i"))
+    _usernames: list[str] = field(init=False, default_factory=list)
+    _names: list[str] = field(init=False, default_factory=list)
+    _passwords: bytearray = field(init=False, default_factory=bytearray)
+    _password_ends: array = field(init=False, default_factory=lambda: array("Q"))
+    _username_index: dict[str, int] = field(init=False, default_factory=dict)
+    _search_index: UsernameIndex = field(init=False, default_factory=UsernameIndex)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def add(self, entity: UserEntity) -> None:
+        self.add_many([entity])
+
+    def add_new(self, infos: Sequence[UserInfo]) -> list[UserEntity]:
+        """Adds users under next free uids, all of them or none."""
+        with self._lock:
+            first = self.last_uid() + 1
+            entities = [
+                UserEntity(uid=first + i, info=info) for i, info in enumerate(infos)
+            ]
+            self._add_many(entities)
+
+        return entities
+
+    def add_many(self, entities: Sequence[UserEntity]) -> None:
+        """Adds all users or none of them."""
+        # columns have to stay aligned even if threads add concurrently
+        with self._lock:
+            self._add_many(entities)
+
+    def _add_many(self, entities: Sequence[UserEntity]) -> None:
+        uids, usernames = set(), set()
+
+        for entity in entities:
+            if entity.uid in uids or self._row(entity.uid) is not None:
+                raise ValueError("uid is already taken")
+            if (
+                entity.info.username in usernames
+                or entity.info.username in self._username_index
+            ):
+                raise ValueError("username is already taken")
+
+            uids.add(entity.uid)
+            usernames.add(entity.info.username)
+
+        for entity in entities:
+            self._append(entity)
+
+    def _append(self, entity: UserEntity) -> None:
+        info = entity.info
+        username = sys.intern(info.username)
+
+        row = len(self._uids)
+        self._uids.append(entity.uid)
+
+        if entity.uid >= len(self._rows):
+            self._rows.extend([-1] * (entity.uid + 1 - len(self._rows)))
+        self._roles.append(_ROLE_CODES[info.role])
+        micros, offset = birthdate_to_micros(info.birthdate)
+        self._birthdates.append(micros)
+        self._offsets.append(_NAIVE if offset is None else offset)
+        self._usernames.append(username)
+        self._names.append(info.name)
+        self._passwords += info.password.get_secret_value().encode()
+        self._password_ends.append(len(self._passwords))
+        # readers take no lock, row is published once all columns have it
+        self._rows[entity.uid] = row
+        self._username_index[username] = row
+        self._search_index.add(username)
+
+    def _row(self, uid: int) -> int | None:
+        if not 0 <= uid < len(self._rows) or self._rows[uid] < 0:
+            return None
+
+        return self._rows[uid]
+
+    def _view(self, row: int) -> UserEntity:
+        start = self._password_ends[row - 1] if row else 0
+        password = self._passwords[start : self._password_ends[row]].decode()
+
+        # values were validated on registration
+        return UserEntity.model_construct(
+            uid=self._uids[row],
+            info=UserInfo.model_construct(
+                username=self._usernames[row],
+                name=self._names[row],
+                birthdate=birthdate_from_micros(
+                    self._birthdates[row],
+                    None if self._offsets[row] == _NAIVE else self._offsets[row],
+                ),
+                role=_ROLES[self._roles[row]],
+                password=SecretStr(password),
+            ),
+        )
+
+    def get(self, uid: int) -> UserEntity | None:
+        row = self._row(uid)
+        return None if row is None else self._view(row)
+
+    def get_by_username(self, username: str) -> UserEntity | None:
+        row = self._username_index.get(username)
+        return None if row is None else self._view(row)
+
+    def contains_username(self, username: str) -> bool:
+        return username in self._username_index
+
+    def existing_usernames(self, usernames: Sequence[str]) -> set[str]:
+        return {username for username in usernames if username in self._username_index}
+
+    def set_role(self, uid: int, role: UserRole) -> None:
+        self._roles[self._row(uid)] = _ROLE_CODES[role]
+
+    def search(
+        self, prefix: str, limit: int, after: str | None, ignore_case: bool
+    ) -> list[UserEntity]:
+        return [
+            self._view(self._username_index[username])
+            for username in self._search_index.search(prefix, limit, after, ignore_case)
+        ]
+
+    def last_uid(self) -> int:
+        return max(len(self._rows) - 1, 0)
+
+    def __len__(self) -> int:
+        return len(self._uids)
+
+
+# Key derivation releases the GIL, so threads hash in parallel. Pool is shared
+# by all hashers and `cpu_bound` validators to bound CPU (and scrypt memory)
+# spent on passwords.
+PASSWORD_HASH_WORKERS = int(
+    os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))
+)
+_password_executor = ThreadPoolExecutor(
+    PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+
+SCRYPT = "scrypt"
+PBKDF2 = "pbkdf2_sha256"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _derive(algorithm: str, password: str, salt: bytes, params: list[int]) -> bytes:
+    if algorithm == SCRYPT:
+        n, r, p = params
+        return hashlib.scrypt(
+            password.encode(),
+            salt=salt,
+            n=n,
+            r=r,
+            p=p,
+            maxmem=256 * n * r * p,
+            dklen=32,
+        )
+
+    (iterations,) = params
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+
+def _derive_in_pool(
+    algorithm: str, password: str, salt: bytes, params: list[int]
+) -> bytes:
+    """Blocks current thread until key is derived in password pool.
+
+    Call it from worker threads (sync dependencies, `run_in_threadpool`),
+    never from event loop thread.
+    """
+    return _password_executor.submit(
+        _derive, algorithm, password, salt, params
+    ).result()
+
+
+@dataclass(slots=True)
+class PasswordHasher:
+    """Hashes passwords to `scrypt$n$r$p$salt$hash` or
+    `pbkdf2_sha256$iterations$salt$hash`.
+
+    Cost parameters are stored in the hash, so they can be tuned without
+    invalidating already stored passwords.
+    """
+
+    algorithm: str = SCRYPT
+    scrypt_n: int = 2**14
+    scrypt_r: int = 8
+    scrypt_p: int = 1
+    pbkdf2_iterations: int = 600_000
+    salt_size: int = 16
+
+    def __post_init__(self) -> None:
+        if self.algorithm not in (SCRYPT, PBKDF2):
+            raise ValueError(f"unknown password hash algorithm {self.algorithm}")
+
+    def _params(self) -> list[int]:
+        if self.algorithm == SCRYPT:
+            return [self.scrypt_n, self.scrypt_r, self.scrypt_p]
+
+        return [self.pbkdf2_iterations]
+
+    def _encode(self, params: list[int], salt: bytes, digest: bytes) -> str:
+        return "$".join(
+            [self.algorithm, *map(str, params), _b64encode(salt), _b64encode(digest)]
+        )
+
+    def hash(self, password: str) -> str:
+        """Blocks until hash is ready, see `_derive_in_pool`."""
+        salt, params = secrets.token_bytes(self.salt_size), self._params()
+        digest = _derive_in_pool(self.algorithm, password, salt, params)
+
+        return self._encode(params, salt, digest)
+
+    async def hash_async(self, password: str) -> str:
+        salt, params = secrets.token_bytes(self.salt_size), self._params()
+        digest = await asyncio.wrap_future(
+            _password_executor.submit(_derive, self.algorithm, password, salt, params)
+        )
+
+        return self._encode(params, salt, digest)
+
+
+def is_password_hash(stored: str) -> bool:
+    algorithm, _, _ = stored.partition("$")
+    return algorithm in (SCRYPT, PBKDF2)
+
+
+def verify_password(password: str, stored: str, plaintext: bool = False) -> bool:
+    """Checks password against value produced by `PasswordHasher.hash`.
+
+    Services without hasher store plaintext, pass `plaintext` to compare
+    other values with password as is. Otherwise values of unknown or broken
+    format never match, so they can not be used as passwords themselves.
+    Comparison is constant time in both cases.
+    """
+    if not is_password_hash(stored):
+        return plaintext and hmac.compare_digest(password.encode(), stored.encode())
+
+    try:
+        algorithm, *params, salt, encoded = stored.split("$")
+        expected = base64.b64decode(encoded, validate=True)
+        # wrong number of cost parameters fails in `_derive`
+        digest = _derive_in_pool(
+            algorithm,
+            password,
+            base64.b64decode(salt, validate=True),
+            [int(value) for value in params],
+        )
+    except ValueError:
+        return False
+
+    return hmac.compare_digest(digest, expected)
+
+
+type PasswordValidator = Callable[[str], bool | Awaitable[bool]]
+
+
+def cpu_bound[_TValidator: PasswordValidator](validator: _TValidator) -> _TValidator:
+    """Marks sync validator to be run in password pool instead of event loop."""
+    validator.__cpu_bound__ = True
+    return validator
+
+
+def _needs_loop(validator: PasswordValidator) -> bool:
+    return (
+        getattr(validator, "__cpu_bound__", False)
+        or inspect.iscoroutinefunction(validator)
+        or inspect.iscoroutinefunction(getattr(validator, "__call__", None))
+    )
+
+
+async def validate_password(
+    password: str, validators: Sequence[PasswordValidator]
+) -> bool:
+    """Runs validators concurrently, returns False as soon as any of them fails
+    and cancels the rest.
+
+    Async validators run on event loop, `cpu_bound` ones in password pool,
+    plain sync ones are called right away - they are expected to be cheap.
+    """
+    loop = asyncio.get_running_loop()
+    pending: set[asyncio.Future[bool]] = set()
+
+    try:
+        for validator in validators:
+            if getattr(validator, "__cpu_bound__", False):
+                pending.add(
+                    loop.run_in_executor(_password_executor, validator, password)
+                )
+                continue
+
+            result = validator(password)
+
+            if inspect.isawaitable(result):
+                pending.add(asyncio.ensure_future(result))
+            elif not result:
+                return False
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            if not all(future.result() for future in done):
+                return False
+
+        return True
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+@dataclass(slots=True)
+class UserService:
+    """Users may be registered from many threads at once, API registers them
+    in threadpool.
+
+    Check that username is free and insert of user are done under lock, one
+    of `lock_stripes` picked by username hash, so registrations of different
+    usernames rarely wait for each other. Validation and hashing of password
+    run without locks. Without `thread_safe` no locks are taken, for services
+    used from one thread only.
+    """
+
+    password_validators: list[PasswordValidator] = field(default_factory=list)
+    password_hasher: PasswordHasher | None = None
+    # called with uid after role or password of user changes
+    change_listeners: list[Callable[[int], None]] = field(default_factory=list)
+
+    # returned entities stay live with `ModelStorage` only
+    storage: UserStorage = field(default_factory=ModelStorage)
+    thread_safe: bool = True
+    lock_stripes: int = 64
+
+    _username_locks: list[threading.Lock] = field(init=False, default_factory=list)
+
+    def __post_init__(self) -> None:
+        if self.thread_safe:
+            self._username_locks = [threading.Lock() for _ in range(self.lock_stripes)]
+
+    def _locked(self, usernames: Iterable[str]) -> ExitStack:
+        """Holds locks of all `usernames`, taken in one order to not deadlock."""
+        stack = ExitStack()
+
+        if self._username_locks:
+            stripes = {
+                hash(username) % len(self._username_locks) for username in usernames
+            }
+
+            for stripe in sorted(stripes):
+                stack.enter_context(self._username_locks[stripe])
+
+        return stack
+
+    def register(self, user_info: UserInfo) -> UserEntity:
+        """Blocking registration, use `register_async` from event loop thread."""
+        self._check_username(user_info)
+        password = user_info.password.get_secret_value()
+
+        if any(_needs_loop(validator) for validator in self.password_validators):
+            is_valid = asyncio.run(
+                validate_password(password, self.password_validators)
+            )
+        else:
+            is_valid = all(
+                validator(password) for validator in self.password_validators
+            )
+
+        if not is_valid:
+            raise ValueError("invalid password")
+
+        return self._insert(user_info)
+
+    async def register_async(self, user_info: UserInfo) -> UserEntity:
+        # storage may query database, which must not block event loop
+        await asyncio.to_thread(self._check_username, user_info)
+
+        if not await validate_password(
+            user_info.password.get_secret_value(), self.password_validators
+        ):
+            raise ValueError("invalid password")
+
+        return await asyncio.to_thread(self._insert, user_info)
+
+    def _check_username(self, user_info: UserInfo) -> None:
+        if self.storage.contains_username(user_info.username):
+            raise ValueError("username is already taken")
+
+    async def register_many(
+        self, user_infos: Sequence[UserInfo]
+    ) -> list[UserEntity | ValueError]:
+        """Registers batch of users, returns entity or error for each of them.
+
+        Usernames are checked in one storage query, passwords of all users are
+        validated and hashed concurrently, then valid users are stored at
+        once. If storage rejects batch because some username was taken in the
+        meantime, users are stored one by one and only those that conflict
+        fail.
+        """
+        results: list[UserEntity | ValueError | None] = [None] * len(user_infos)
+        taken = await asyncio.to_thread(
+            self.storage.existing_usernames, [info.username for info in user_infos]
+        )
+
+        for i, info in enumerate(user_infos):
+            if info.username in taken:
+                results[i] = ValueError("username is already taken")
+            taken.add(info.username)
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        validations = await asyncio.gather(
+            *(
+                validate_password(
+                    user_infos[i].password.get_secret_value(), self.password_validators
+                )
+                for i in pending
+            )
+        )
+
+        for i, is_valid in zip(pending, validations):
+            if not is_valid:
+                results[i] = ValueError("invalid password")
+
+        pending = [i for i in pending if results[i] is None]
+        hashed = await asyncio.gather(
+            *(self._with_password_hash_async(user_infos[i]) for i in pending)
+        )
+
+        stored: list[UserEntity | ValueError]
+
+        try:
+            stored = list(await asyncio.to_thread(self._add_new, hashed))
+        except ValueError:
+            stored = await asyncio.to_thread(self._add_each, hashed)
+
+        for i, entity in zip(pending, stored):
+            results[i] = entity
+
+        return results
+
+    def _add_new(self, user_infos: Sequence[UserInfo]) -> list[UserEntity]:
+        with self._locked(info.username for info in user_infos):
+            return self.storage.add_new(user_infos)
+
+    def _add_each(
+        self, user_infos: Sequence[UserInfo]
+    ) -> list[UserEntity | ValueError]:
+        results: list[UserEntity | ValueError] = []
+
+        for info in user_infos:
+            with self._locked([info.username]):
+                try:
+                    self._check_username(info)
+                    (entity,) = self.storage.add_new([info])
+                except ValueError as e:
+                    results.append(e)
+                    continue
+
+            results.append(entity)
+
+        return results
+
+    def _with_password_hash(self, user_info: UserInfo) -> UserInfo:
+        if self.password_hasher is None:
+            return user_info
+
+        password = self.password_hasher.hash(user_info.password.get_secret_value())
+        return user_info.model_copy(update={"password": SecretStr(password)})
+
+    async def _with_password_hash_async(self, user_info: UserInfo) -> UserInfo:
+        if self.password_hasher is None:
+            return user_info
+
+        password = await self.password_hasher.hash_async(
+            user_info.password.get_secret_value()
+        )
+        return user_info.model_copy(update={"password": SecretStr(password)})
+
+    def _insert(self, user_info: UserInfo) -> UserEntity:
+        user_info = self._with_password_hash(user_info)
+
+        with self._locked([user_info.username]):
+            # username could be taken while password was validated and hashed
+            self._check_username(user_info)
+            (entity,) = self.storage.add_new([user_info])
+
+        return entity
+
+    def get_by_username(self, username: str) -> UserEntity | None:
+        return self.storage.get_by_username(username)
+
     def get_by_id(self, uid: int) -> UserEntity | None:
-        return self._data.get(uid)
+        return self.storage.get(uid)
+
+    def search(
+        self,
+        prefix: str,
+        limit: int,
+        after: str | None = None,
+        ignore_case: bool = False,
+    ) -> list[UserEntity]:
+        """Users with username starting with `prefix`, sorted by username
+        (case-folded one with `ignore_case`), continuing `after` username.
+        """
+        return self.storage.search(prefix, limit, after, ignore_case)
 
     def grant_admin(self, user_id: int) -> None:
         user = self.get_by_id(user_id)
@@ -64,8 +713,10 @@ class UserService:
         if user is None:
             raise ValueError("user not found")
 
-        user.info.role = UserRole.ADMIN
-        self._data[user.uid] = user
+        self.storage.set_role(user.uid, UserRole.ADMIN)
+
+        for listener in self.change_listeners:
+            listener(user.uid)
 
 
 def password_is_longer_than_8(password: str) -> bool:
@@ -1,12 +1,149 @@
 import asyncio
-from typing import Awaitable, Callable, Iterable
+import math
+import random
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+)
+
+type _Values[_TVal] = Iterable[_TVal] | AsyncIterable[_TVal]
 
 
 async def map_async[_TVal, _TRes](
     func: Callable[[_TVal], Awaitable[_TRes]],
-    values: Iterable[_TVal],
+    values: _Values[_TVal],
+    *,
+    max_concurrency: int | None = None,
+    timeout: float | None = None,
+    return_exceptions: bool = False,
 ) -> Iterable[_TRes]:
-    return await asyncio.gather(*(func(value) for value in values))
+    """Results of `func` for all `values` in their order.
+
+    Without `max_concurrency` all calls are started at once. With it at most
+    `max_concurrency` calls run at a time and values are read only when there
+    is room for them, see `imap_async`.
+    """
+    if max_concurrency is not None:
+        return [
+            result
+            async for result in imap_async(
+                func,
+                values,
+                max_concurrency=max_concurrency,
+                timeout=timeout,
+                return_exceptions=return_exceptions,
+            )
+        ]
+
+    if isinstance(values, AsyncIterable):
+        values = [value async for value in values]
+
+    func = _with_timeout(func, timeout)
+    return await asyncio.gather(
+        *(func(value) for value in values),
+        return_exceptions=return_exceptions,
+    )
+
+
+async def imap_async[_TVal, _TRes](
+    func: Callable[[_TVal], Awaitable[_TRes]],
+    values: _Values[_TVal],
+    *,
+    max_concurrency: int = 100,
+    ordered: bool = True,
+    timeout: float | None = None,
+    return_exceptions: bool = False,
+) -> AsyncIterator[_TRes]:
+    """Yields results of `func` for `values` as soon as they are ready.
+
+    At most `max_concurrency` values are taken from `values` ahead of what was
+    yielded, so memory stays bounded for inputs of any size and async
+    iterables are consumed lazily. With `ordered` results come in order of
+    `values` - one slow call holds back following results, without it they
+    come in order of completion.
+
+    `timeout` limits every call separately and makes it raise `TimeoutError`.
+    Errors are raised from iterator and cancel calls still running, unless
+    `return_exceptions` - then they are yielded in place of results.
+
+    Calls are also cancelled when iterator is closed, so stop iteration early
+    inside `contextlib.aclosing`.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be positive")
+
+    func = _with_timeout(func, timeout)
+    items = aiter(values) if isinstance(values, AsyncIterable) else _aiter(values)
+    # calls started and not yielded yet, in order of values
+    window: deque[asyncio.Future[_TRes]] = deque()
+    exhausted = False
+
+    try:
+        while True:
+            while not exhausted and len(window) < max_concurrency:
+                try:
+                    value = await anext(items)
+                except StopAsyncIteration:
+                    exhausted = True
+                else:
+                    window.append(asyncio.ensure_future(func(value)))
+
+            if not window:
+                return
+
+            if ordered:
+                if not window[0].done():
+                    await asyncio.wait([window[0]])
+                done = [window.popleft()]
+            else:
+                finished, _ = await asyncio.wait(
+                    window, return_when=asyncio.FIRST_COMPLETED
+                )
+                done = [task for task in window if task in finished]
+                window = deque(task for task in window if task not in finished)
+
+            for task in done:
+                yield _result(task, return_exceptions)
+    finally:
+        for task in window:
+            task.cancel()
+
+        await asyncio.gather(*window, return_exceptions=True)
+
+
+async def _aiter[_TVal](values: Iterable[_TVal]) -> AsyncIterator[_TVal]:
+    for value in values:
+        yield value
+
+
+def _with_timeout[_TVal, _TRes](
+    func: Callable[[_TVal], Awaitable[_TRes]],
+    timeout: float | None,
+) -> Callable[[_TVal], Awaitable[_TRes]]:
+    if timeout is None:
+        return func
+
+    async def call(value: _TVal) -> _TRes:
+        async with asyncio.timeout(timeout):
+            return await func(value)
+
+    return call
+
+
+def _result(task: asyncio.Future[Any], return_exceptions: bool) -> Any:
+    if return_exceptions and not task.cancelled() and task.exception() is not None:
+        return task.exception()
+
+    return task.result()
 
 
 async def slow_map_async[_TVal, _TRes](
@@ -20,3 +157,156 @@ async def slow_map_async[_TVal, _TRes](
         await asyncio.sleep(0.1)
 
     return result
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average and up to `burst` at
+    once after idle time. Waiting callers are served in order of arrival.
+    """
+
+    rate: float
+    burst: int = 1
+
+    _tokens: float = field(init=False)
+    _updated_at: float = field(init=False, default_factory=time.monotonic)
+    _lock: asyncio.Lock = field(init=False, default_factory=asyncio.Lock)
+
+    def __post_init__(self) -> None:
+        if self.rate <= 0 or self.burst < 1:
+            raise ValueError("rate and burst must be positive")
+
+        self._tokens = self.burst
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass(slots=True)
+class LatencyStats:
+    """Latencies of all attempts in seconds, failed ones included."""
+
+    latencies: array = field(default_factory=lambda: array("d"))
+    errors: int = 0
+    retries: int = 0
+
+    def record(self, latency: float, failed: bool = False) -> None:
+        self.latencies.append(latency)
+        self.errors += failed
+
+    @property
+    def calls(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def mean(self) -> float:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Nearest-rank percentile, 0 without calls."""
+        if not self.latencies:
+            return 0.0
+
+        ordered = sorted(self.latencies)
+        rank = max(1, math.ceil(len(ordered) * percent / 100))
+        return ordered[rank - 1]
+
+
+@dataclass(slots=True)
+class RateLimitedMapper:
+    """Maps values with calls to quota-limited service.
+
+    Every attempt takes token from bucket shared by all calls of mapper, so
+    keep one mapper per quota. Up to `max_concurrency` calls run at a time,
+    calls failing with one of `retry_on` are repeated up to `max_attempts`
+    times after random delay up to `base_delay * 2 ** attempt` (full jitter,
+    capped by `max_delay`). `timeout` limits every attempt, add `TimeoutError`
+    to `retry_on` to retry timed out ones.
+    """
+
+    rate: float
+    burst: int = 1
+    max_concurrency: int = 10
+    retry_on: tuple[type[Exception], ...] = ()
+    max_attempts: int = 3
+    base_delay: float = 0.1
+    max_delay: float = 10.0
+    timeout: float | None = None
+    stats: LatencyStats = field(default_factory=LatencyStats)
+
+    _bucket: TokenBucket = field(init=False)
+
+    def __post_init__(self) -> None:
+        if self.max_attempts < 1:
+            raise ValueError("max_attempts must be positive")
+
+        self._bucket = TokenBucket(self.rate, self.burst)
+
+    async def call[_TVal, _TRes](
+        self, func: Callable[[_TVal], Awaitable[_TRes]], value: _TVal
+    ) -> _TRes:
+        attempt = 0
+
+        while True:
+            await self._bucket.acquire()
+            started_at = time.perf_counter()
+
+            try:
+                async with asyncio.timeout(self.timeout):
+                    result = await func(value)
+            except self.retry_on:
+                self.stats.record(time.perf_counter() - started_at, failed=True)
+                attempt += 1
+
+                if attempt == self.max_attempts:
+                    raise
+            except Exception:
+                self.stats.record(time.perf_counter() - started_at, failed=True)
+                raise
+            else:
+                self.stats.record(time.perf_counter() - started_at)
+                return result
+
+            self.stats.retries += 1
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+            await asyncio.sleep(random.uniform(0, delay))
+
+    async def map[_TVal, _TRes](
+        self,
+        func: Callable[[_TVal], Awaitable[_TRes]],
+        values: _Values[_TVal],
+        return_exceptions: bool = False,
+    ) -> Iterable[_TRes]:
+        return await map_async(
+            partial(self.call, func),
+            values,
+            max_concurrency=self.max_concurrency,
+            return_exceptions=return_exceptions,
+        )
+
+    def imap[_TVal, _TRes](
+        self,
+        func: Callable[[_TVal], Awaitable[_TRes]],
+        values: _Values[_TVal],
+        ordered: bool = True,
+        return_exceptions: bool = False,
+    ) -> AsyncIterator[_TRes]:
+        return imap_async(
+            partial(self.call, func),
+            values,
+            max_concurrency=self.max_concurrency,
+            ordered=ordered,
+            return_exceptions=return_exceptions,
+        )
@@ -1,11 +1,17 @@
 from fastapi import FastAPI
 from fastapi.responses import PlainTextResponse
-from prometheus_fastapi_instrumentator import Instrumentator
+
+from lecture_4.metrics import setup_metrics
+from lecture_4.response_cache import ResponseCache, ResponseCacheMiddleware, cached
 
 app = FastAPI()
-Instrumentator().instrument(app).expose(app)
+response_cache = ResponseCache()
+# registered before instrumentation so cached responses still show up in metrics
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+setup_metrics(app)
 
 
 @app.get("/")
+@cached()
 async def get_default():
     return PlainTextResponse(content="Hello, world!")
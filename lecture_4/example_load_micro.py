@@ -0,0 +1,12 @@
+from lecture_1.micro import App, Response
+
+# same endpoint as `example_load.py`, but without FastAPI machinery:
+# `uvicorn lecture_4.example_load_micro:app`
+app = App()
+
+HELLO = Response.text("Hello, world!")
+
+
+@app.get("/")
+async def get_default() -> Response:
+    return HELLO
@@ -1,8 +1,14 @@
-from dataclasses import dataclass
+import asyncio
+import inspect
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from enum import StrEnum
+from http import HTTPStatus
 from logging import getLogger
-from typing import Protocol
+from typing import Any, ClassVar, Protocol
 
+import httpx
 import requests
 from requests.exceptions import HTTPError
 
@@ -15,6 +21,7 @@ class Errors(StrEnum):
     DISCONNECTED = "DISCONNECTED"
     API_ERROR = "API_ERROR"
     PROVIDER_NOT_FOUND = "PROVIDER_NOT_FOUND"
+    PROVIDER_UNAVAILABLE = "PROVIDER_UNAVAILABLE"
 
     def as_exc(self) -> Exception:
         return Exception(self.value)
@@ -76,6 +83,28 @@ class ExternalAuthAPI(Protocol):
     def get_user(self, uid: str) -> User: ...
 
 
+class AsyncExternalAuthAPI(Protocol):
+    async def get_user(self, uid: str) -> User: ...
+
+
+def _google_user(uid: str, response_data: dict[str, Any]) -> User:
+    return User(
+        name=response_data["name"],
+        age=response_data["age"],
+        identities=[ExternalIdentity(uid=uid, provider=GoogleAuthAPI.provider)],
+    )
+
+
+def _vk_user(uid: str, response_data: dict[str, Any]) -> User:
+    return User(
+        name=response_data["info"]["firstName"]
+        + " "
+        + response_data["info"]["lastName"],
+        age=response_data["info"]["age"],
+        identities=[ExternalIdentity(uid=uid, provider=VKAuthAPI.provider)],
+    )
+
+
 class GoogleAuthAPI(ExternalAuthAPI):
     provider = "google"
 
@@ -83,12 +112,7 @@ class GoogleAuthAPI(ExternalAuthAPI):
         response = requests.get("http://google/auth", params={"id": uid})
         response.raise_for_status()
 
-        response_data = response.json()
-        return User(
-            name=response_data["name"],
-            age=response_data["age"],
-            identities=[ExternalIdentity(uid=uid, provider=self.provider)],
-        )
+        return _google_user(uid, response.json())
 
 
 class VKAuthAPI(ExternalAuthAPI):
@@ -98,14 +122,244 @@ class VKAuthAPI(ExternalAuthAPI):
         response = requests.get(f"http://vk/auth/{uid}")
         response.raise_for_status()
 
-        response_data = response.json()
-        return User(
-            name=response_data["info"]["firstName"]
-            + " "
-            + response_data["info"]["lastName"],
-            age=response_data["info"]["age"],
-            identities=[ExternalIdentity(uid=uid, provider=self.provider)],
+        return _vk_user(uid, response.json())
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class CircuitBreaker:
+    """Stops calls to provider after `failure_threshold` failures in a row.
+
+    After `reset_timeout` seconds one call is let through: its success closes
+    circuit, its failure opens it for another `reset_timeout`.
+    """
+
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+
+    _failures: int = field(init=False, default=0)
+    _opened_at: float | None = field(init=False, default=None)
+    _probing: bool = field(init=False, default=False)
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+
+        if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+            return False
+
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+
+        if self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+def make_auth_client(
+    max_connections: int = 100, max_keepalive_connections: int = 20
+) -> httpx.AsyncClient:
+    """Client to share between async providers - every host gets pool of
+    keep-alive connections from common limit.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
         )
+    )
+
+
+@dataclass(slots=True)
+class _AsyncAuthAPI:
+    """Provider over shared `client` with own `timeout` for every request,
+    at most `max_concurrency` requests in flight and circuit breaker, which
+    counts every request without usable answer as failure - connection
+    errors, timeouts, 5xx responses, broken bodies and cancelled requests.
+    """
+
+    provider: ClassVar[str]
+
+    client: httpx.AsyncClient
+    base_url: str
+    timeout: float = 5.0
+    max_concurrency: int = 20
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+
+    _semaphore: asyncio.Semaphore = field(init=False)
+
+    def __post_init__(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _get_json(self, path: str, params: dict[str, str] | None = None) -> Any:
+        async with self._semaphore:
+            # state could change while request waited for its turn
+            if not self.breaker.allow():
+                raise CircuitOpenError(self.provider)
+
+            # anything but an answer - error, cancellation, broken body -
+            # is failure, so that probe never stays unfinished
+            healthy = False
+
+            try:
+                response = await self.client.get(
+                    self.base_url + path, params=params, timeout=self.timeout
+                )
+                # client errors say nothing about health of provider
+                healthy = response.is_client_error
+                data = response.raise_for_status().json()
+                healthy = True
+                return data
+            finally:
+                if healthy:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+
+
+@dataclass(slots=True)
+class AsyncGoogleAuthAPI(_AsyncAuthAPI):
+    provider: ClassVar[str] = GoogleAuthAPI.provider
+    base_url: str = "http://google"
+
+    async def get_user(self, uid: str) -> User:
+        return _google_user(uid, await self._get_json("/auth", params={"id": uid}))
+
+
+@dataclass(slots=True)
+class AsyncVKAuthAPI(_AsyncAuthAPI):
+    provider: ClassVar[str] = VKAuthAPI.provider
+    base_url: str = "http://vk"
+
+    async def get_user(self, uid: str) -> User:
+        return _vk_user(uid, await self._get_json(f"/auth/{uid}"))
+
+
+async def _get_user(provider: ExternalAuthAPI | AsyncExternalAuthAPI, uid: str) -> User:
+    if inspect.iscoroutinefunction(provider.get_user):
+        return await provider.get_user(uid)
+
+    # blocking provider does not hold other registrations
+    return await asyncio.to_thread(provider.get_user, uid)
+
+
+def _is_not_found(error: Exception) -> bool:
+    # both requests and httpx errors keep response
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code == HTTPStatus.NOT_FOUND
+
+
+class SharedLookupError(Exception):
+    """Lookup failed with error shared with other callers - it is
+    `__cause__`, so every caller gets own exception and traceback.
+    """
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    # nobody may be left to await shared call
+    if not task.cancelled():
+        task.exception()
+
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    # lookups which waited for call already made for the same uid
+    coalesced: int = 0
+
+
+@dataclass(slots=True)
+class CachedAuthAPI:
+    """Async provider in front of `provider` of either kind.
+
+    Users are kept for `ttl` seconds, at most `max_size` of them, least
+    recently used are evicted first. "Not found" errors are kept for
+    `negative_ttl`, other errors are not cached. Concurrent lookups of the
+    same uid share one call to `provider`. Errors of cached and shared calls
+    are raised as `SharedLookupError` from them.
+
+    Cached users are shared between callers - do not change them.
+    """
+
+    provider: ExternalAuthAPI | AsyncExternalAuthAPI
+    ttl: float = 300.0
+    negative_ttl: float = 30.0
+    max_size: int = 10_000
+    stats: CacheStats = field(default_factory=CacheStats)
+
+    # uid to expiration time and user or error
+    _cache: OrderedDict[str, tuple[float, User | Exception]] = field(
+        init=False, default_factory=OrderedDict
+    )
+    _in_flight: dict[str, asyncio.Task[User]] = field(init=False, default_factory=dict)
+
+    async def get_user(self, uid: str) -> User:
+        cached = self._cache.get(uid)
+
+        if cached is not None:
+            expires_at, result = cached
+
+            if time.monotonic() < expires_at:
+                self._cache.move_to_end(uid)
+                self.stats.hits += 1
+
+                if isinstance(result, Exception):
+                    raise SharedLookupError(uid) from result
+
+                return result
+
+            del self._cache[uid]
+
+        task = self._in_flight.get(uid)
+
+        if task is None:
+            self.stats.misses += 1
+            task = self._in_flight[uid] = asyncio.ensure_future(self._fetch(uid))
+            task.add_done_callback(_retrieve_exception)
+        else:
+            self.stats.coalesced += 1
+
+        try:
+            # cancelled caller must not cancel call awaited by others
+            return await asyncio.shield(task)
+        except Exception as e:
+            raise SharedLookupError(uid) from e
+
+    async def _fetch(self, uid: str) -> User:
+        try:
+            user = await _get_user(self.provider, uid)
+        except Exception as e:
+            if _is_not_found(e):
+                self._put(uid, e, self.negative_ttl)
+
+            raise
+        else:
+            self._put(uid, user, self.ttl)
+            return user
+        finally:
+            del self._in_flight[uid]
+
+    def _put(self, uid: str, result: User | Exception, ttl: float) -> None:
+        self._cache[uid] = (time.monotonic() + ttl, result)
+        self._cache.move_to_end(uid)
+
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, uid: str) -> None:
+        self._cache.pop(uid, None)
 
 
 class PasswordManager(Protocol):
@@ -120,7 +374,8 @@ class PasswordManager(Protocol):
 class UserService:
     _repository: Repository[int, User]
     _password_manager: PasswordManager
-    _external_providers: dict[str, ExternalAuthAPI]
+    # async providers are used by `register_user_async` only
+    _external_providers: dict[str, ExternalAuthAPI | AsyncExternalAuthAPI]
 
     def register_user(self, message: RegisterUser) -> Entity[int, User]:
         match message:
@@ -129,6 +384,13 @@ class UserService:
             case RegisterUserExternal():
                 return self._register_user_external(message)
 
+    async def register_user_async(self, message: RegisterUser) -> Entity[int, User]:
+        match message:
+            case RegisterUserInternal():
+                return self._register_user_internal(message)
+            case RegisterUserExternal():
+                return await self._register_user_external_async(message)
+
     def _register_user_internal(
         self, message: RegisterUserInternal
     ) -> Entity[int, User]:
@@ -169,3 +431,41 @@ class UserService:
             raise Errors.API_ERROR.as_exc() from e
 
         return self._repository.insert(user)
+
+    async def _register_user_external_async(
+        self, message: RegisterUserExternal
+    ) -> Entity[int, User]:
+        logger.info("Register external")
+
+        if message.provider not in self._external_providers:
+            logger.info("Provider %s not found", message.provider)
+            raise Errors.PROVIDER_NOT_FOUND.as_exc()
+
+        provider = self._external_providers[message.provider]
+
+        try:
+            user = await _get_user(provider, message.uid)
+        except Exception as e:
+            error = _provider_error(e)
+
+            if error is None:
+                raise
+
+            raise error from e
+
+        return self._repository.insert(user)
+
+
+def _provider_error(error: BaseException) -> Exception | None:
+    if isinstance(error, SharedLookupError):
+        error = error.__cause__
+
+    match error:
+        case HTTPError() | httpx.HTTPStatusError():
+            return Errors.API_ERROR.as_exc()
+        case httpx.TransportError():
+            return Errors.DISCONNECTED.as_exc()
+        case CircuitOpenError():
+            return Errors.PROVIDER_UNAVAILABLE.as_exc()
+
+    return None
@@ -0,0 +1,428 @@
+"""Low-overhead replacement for `prometheus_fastapi_instrumentator`.
+
+Exposes the same `http_requests_total` and `http_request_duration_seconds`
+series, but per request does only a dict lookup and a few integer additions:
+
+- request path is resolved to route template once and cached, together with
+  its label tuple;
+- every thread writes to its own set of counters, so no locks are taken on
+  the hot path - shards are summed only when `/metrics` is scraped;
+- with `--workers N` set `PROMETHEUS_MULTIPROC_DIR` - background thread of
+  each worker dumps its counters there every `flush_interval` seconds and on
+  scrape the files of all live workers are merged, files of exited ones are
+  removed.
+
+With `trace_phases` (or `METRICS_TRACE_PHASES=1`) it also records
+`http_request_phase_duration_seconds` - time spent in body parsing,
+dependencies, handler, response validation and rendering, see `tracing`.
+
+```python
+FastMetrics().instrument(app).expose(app)
+```
+"""
+
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Iterable
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from prometheus_fastapi_instrumentator import Instrumentator
+from starlette.routing import Match
+
+from lecture_4 import tracing
+
+type Scope = dict[str, Any]
+type Receive = Callable[[], Awaitable[dict[str, Any]]]
+type Send = Callable[[dict[str, Any]], Awaitable[None]]
+type ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0,
+)  # fmt: skip
+
+DEFAULT_PHASE_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 1.0,
+)  # fmt: skip
+
+_MAX_RESOLVED_PATHS = 10_000
+
+
+@dataclass(slots=True)
+class _Histogram:
+    buckets: list[int]
+    sum: float = 0.0
+    count: int = 0
+
+
+def _observe(
+    histograms: dict[tuple, _Histogram],
+    key: tuple,
+    bounds: tuple[float, ...],
+    value: float,
+) -> None:
+    histogram = histograms.get(key)
+
+    if histogram is None:
+        histogram = histograms[key] = _Histogram([0] * (len(bounds) + 1))
+
+    histogram.buckets[bisect.bisect_left(bounds, value)] += 1
+    histogram.sum += value
+    histogram.count += 1
+
+
+def _merge(histograms: dict[tuple, _Histogram], items: Iterable) -> None:
+    for key, histogram in items:
+        total = histograms.get(key)
+
+        if total is None:
+            total = histograms[key] = _Histogram([0] * len(histogram.buckets))
+
+        for i, count in enumerate(histogram.buckets):
+            total.buckets[i] += count
+        total.sum += histogram.sum
+        total.count += histogram.count
+
+
+@dataclass(slots=True)
+class _Shard:
+    requests: dict[tuple[str, str, str], int] = field(default_factory=dict)
+    durations: dict[tuple[str, str], _Histogram] = field(default_factory=dict)
+    phases: dict[tuple[str, str, str], _Histogram] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class Snapshot:
+    requests: dict[tuple[str, str, str], int] = field(default_factory=dict)
+    durations: dict[tuple[str, str], _Histogram] = field(default_factory=dict)
+    phases: dict[tuple[str, str, str], _Histogram] = field(default_factory=dict)
+
+    def add(self, other: "Snapshot | _Shard") -> None:
+        for key, count in list(other.requests.items()):
+            self.requests[key] = self.requests.get(key, 0) + count
+
+        _merge(self.durations, list(other.durations.items()))
+        _merge(self.phases, list(other.phases.items()))
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "requests": [[*key, count] for key, count in self.requests.items()],
+                "durations": [
+                    [*key, histogram.buckets, histogram.sum, histogram.count]
+                    for key, histogram in self.durations.items()
+                ],
+                "phases": [
+                    [*key, histogram.buckets, histogram.sum, histogram.count]
+                    for key, histogram in self.phases.items()
+                ],
+            }
+        )
+
+    @staticmethod
+    def from_json(data: str) -> "Snapshot":
+        raw = json.loads(data)
+        return Snapshot(
+            {tuple(row[:3]): row[3] for row in raw["requests"]},
+            {tuple(row[:2]): _Histogram(*row[2:]) for row in raw["durations"]},
+            {tuple(row[:3]): _Histogram(*row[3:]) for row in raw.get("phases", [])},
+        )
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # process of other user
+        return True
+
+    return True
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+@dataclass(slots=True)
+class FastMetrics:
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    multiprocess_dir: str | None = field(
+        default_factory=lambda: os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    )
+    flush_interval: float = 5.0
+    excluded_handlers: tuple[str, ...] = ("/metrics",)
+    trace_phases: bool = field(
+        default_factory=lambda: os.environ.get("METRICS_TRACE_PHASES") == "1"
+    )
+    phase_buckets: tuple[float, ...] = DEFAULT_PHASE_BUCKETS
+
+    _local: threading.local = field(init=False, default_factory=threading.local)
+    _shards: list[_Shard] = field(init=False, default_factory=list)
+    _shards_lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+    _resolved: dict[tuple[str, str], tuple[str, str] | None] = field(
+        init=False, default_factory=dict
+    )
+    # process which started flusher thread, it does not survive fork
+    _flusher_pid: int | None = field(init=False, default=None)
+    _flusher_lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def instrument(self, app: FastAPI) -> "FastMetrics":
+        if self.trace_phases:
+            tracing.install()
+
+        app.add_middleware(FastMetricsMiddleware, metrics=self)
+        return self
+
+    def expose(self, app: FastAPI, endpoint: str = "/metrics") -> "FastMetrics":
+        async def metrics() -> PlainTextResponse:
+            # reads files of workers in multiprocess mode
+            return PlainTextResponse(
+                await run_in_threadpool(self.render),
+                media_type="text/plain; version=0.0.4; charset=utf-8",
+            )
+
+        app.add_api_route(endpoint, metrics, include_in_schema=False)
+        return self
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+
+        return shard
+
+    def resolve(self, scope: Scope) -> tuple[str, str] | None:
+        """Returns `(handler, method)` labels of request or None if excluded."""
+        path_key = (scope["method"], scope["path"])
+        labels = self._resolved.get(path_key, False)
+
+        if labels is not False:
+            return labels
+
+        handler = "none"
+        for route in getattr(scope.get("app"), "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                handler = route.path
+                break
+
+        labels = None if handler in self.excluded_handlers else (handler, path_key[0])
+
+        if len(self._resolved) < _MAX_RESOLVED_PATHS:
+            self._resolved[path_key] = labels
+
+        return labels
+
+    def observe(self, labels: tuple[str, str], status: int, seconds: float) -> None:
+        shard = self._shard()
+
+        request_key = (*labels, f"{status // 100}xx")
+        shard.requests[request_key] = shard.requests.get(request_key, 0) + 1
+
+        _observe(shard.durations, labels, self.buckets, seconds)
+
+        if self.multiprocess_dir is not None and self._flusher_pid != os.getpid():
+            self._start_flusher()
+
+    def _start_flusher(self) -> None:
+        with self._flusher_lock:
+            if self._flusher_pid == os.getpid():
+                return
+
+            self._flusher_pid = os.getpid()
+
+        threading.Thread(
+            target=self._flush_loop, name="metrics-flusher", daemon=True
+        ).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+
+            # directory may be unavailable for a while, next flush retries
+            with contextlib.suppress(OSError):
+                self.flush()
+
+    def observe_phases(
+        self, labels: tuple[str, str], trace: tracing.PhaseTrace
+    ) -> None:
+        shard = self._shard()
+
+        for phase, seconds in trace.phases().items():
+            _observe(shard.phases, (*labels, phase), self.phase_buckets, seconds)
+
+    def snapshot(self) -> Snapshot:
+        """Sums counters of all threads of current process."""
+        snapshot = Snapshot()
+
+        with self._shards_lock:
+            shards = list(self._shards)
+
+        for shard in shards:
+            snapshot.add(shard)
+
+        return snapshot
+
+    def _worker_file(self, pid: int) -> str:
+        return os.path.join(self.multiprocess_dir, f"fast_metrics_{pid}.json")
+
+    def flush(self) -> None:
+        path = self._worker_file(os.getpid())
+        with open(path + ".tmp", "w") as file:
+            file.write(self.snapshot().to_json())
+        os.replace(path + ".tmp", path)
+
+    def collect(self) -> Snapshot:
+        """Sums counters of all live workers and removes files of exited
+        ones, like counters of restarted worker they start from zero.
+        """
+        if self.multiprocess_dir is None:
+            return self.snapshot()
+
+        self.flush()
+        total = Snapshot()
+
+        for name in os.listdir(self.multiprocess_dir):
+            if not (name.startswith("fast_metrics_") and name.endswith(".json")):
+                continue
+
+            path = os.path.join(self.multiprocess_dir, name)
+            pid = name.removeprefix("fast_metrics_").removesuffix(".json")
+
+            # other workers may remove the same files at once
+            with contextlib.suppress(FileNotFoundError):
+                if pid.isdigit() and not _is_alive(int(pid)):
+                    os.remove(path)
+                    continue
+
+                with open(path) as file:
+                    total.add(Snapshot.from_json(file.read()))
+
+        return total
+
+    def render(self) -> str:
+        snapshot = self.collect()
+        lines = [
+            "# HELP http_requests_total Total number of requests by method, status"
+            " and handler.",
+            "# TYPE http_requests_total counter",
+        ]
+
+        for (handler, method, status), count in sorted(snapshot.requests.items()):
+            lines.append(
+                f'http_requests_total{{handler="{_escape(handler)}",'
+                f'method="{method}",status="{status}"}} {float(count)}'
+            )
+
+        _render_histograms(
+            lines,
+            "http_request_duration_seconds",
+            "Latency with only few buckets by handler.",
+            ("handler", "method"),
+            self.buckets,
+            snapshot.durations,
+        )
+
+        if snapshot.phases:
+            _render_histograms(
+                lines,
+                "http_request_phase_duration_seconds",
+                "Time spent in each phase of request handling by handler.",
+                ("handler", "method", "phase"),
+                self.phase_buckets,
+                snapshot.phases,
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+def _render_histograms(
+    lines: list[str],
+    name: str,
+    description: str,
+    label_names: tuple[str, ...],
+    buckets: tuple[float, ...],
+    histograms: dict[tuple, _Histogram],
+) -> None:
+    lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+    bounds = [*(repr(float(bound)) for bound in buckets), "+Inf"]
+
+    for key, histogram in sorted(histograms.items()):
+        labels = ",".join(
+            f'{label}="{_escape(value)}"' for label, value in zip(label_names, key)
+        )
+        cumulative = 0
+
+        for bound, count in zip(bounds, histogram.buckets):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {float(cumulative)}')
+
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{labels}}} {float(histogram.count)}")
+
+
+@dataclass(slots=True)
+class FastMetricsMiddleware:
+    app: ASGIApp
+    metrics: FastMetrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        labels = self.metrics.resolve(scope)
+
+        if labels is None:
+            return await self.app(scope, receive, send)
+
+        status = HTTPStatus.INTERNAL_SERVER_ERROR
+        trace = None
+
+        if self.metrics.trace_phases:
+            trace = tracing.PhaseTrace()
+            token = tracing.current_trace.set(trace)
+
+        started_at = time.perf_counter()
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            nonlocal status
+
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+                if trace is not None:
+                    trace.mark("response_start")
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.observe(labels, status, time.perf_counter() - started_at)
+
+            if trace is not None:
+                tracing.current_trace.reset(token)
+                self.metrics.observe_phases(labels, trace)
+
+
+def setup_metrics(app: FastAPI) -> None:
+    """Instruments app and exposes `/metrics`.
+
+    `METRICS_MODE=instrumentator` switches back to
+    `prometheus_fastapi_instrumentator`.
+    """
+    if os.environ.get("METRICS_MODE") == "instrumentator":
+        Instrumentator().instrument(app).expose(app)
+    else:
+        FastMetrics().instrument(app).expose(app)
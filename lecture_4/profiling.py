@@ -0,0 +1,206 @@
+"""On-demand profiling of running service.
+
+- `sample_stacks` - statistical sampler: background thread takes stacks of
+  all threads (`sys._current_frames`) and of suspended event loop tasks every
+  `interval` seconds and returns them in collapsed format, ready for
+  `flamegraph.pl` or speedscope;
+- `top_allocations` - tracemalloc snapshot diff over a period of time.
+
+`create_router` exposes both under `/admin/profile` and `/admin/allocations`,
+callers decide how router is protected.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from types import FrameType
+from typing import Annotated, Any, Sequence
+
+from fastapi import APIRouter, Query
+from fastapi.params import Depends
+from fastapi.responses import PlainTextResponse
+
+MAX_SECONDS = 60.0
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({code.co_filename}:{frame.f_lineno})"
+
+
+def _collapse(root: str, frame: FrameType | None) -> str:
+    names = []
+
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+
+    return ";".join([root, *reversed(names)])
+
+
+def _sample_once(
+    stacks: Counter[str],
+    loop: asyncio.AbstractEventLoop | None,
+    thread_names: dict[int, str],
+) -> None:
+    own_id = threading.get_ident()
+
+    for thread_id, frame in sys._current_frames().items():
+        if thread_id != own_id:
+            stacks[
+                _collapse(f"thread:{thread_names.get(thread_id, thread_id)}", frame)
+            ] += 1
+
+    if loop is None:
+        return
+
+    try:
+        tasks = asyncio.all_tasks(loop)
+    except RuntimeError:  # loop mutated task set too many times in a row
+        return
+
+    for task in tasks:
+        # running task is already visible in loop thread stack above
+        stack = task.get_stack()
+        if stack:
+            stacks[_collapse(f"task:{task.get_name()}", stack[-1])] += 1
+
+
+def sample_stacks(
+    duration: float,
+    interval: float = 0.005,
+    loop: asyncio.AbstractEventLoop | None = None,
+) -> dict[str, int]:
+    """Blocks for `duration` seconds collecting stacks, call it from a thread."""
+    stacks: Counter[str] = Counter()
+    deadline = time.monotonic() + duration
+
+    while time.monotonic() < deadline:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        _sample_once(stacks, loop, thread_names)
+        time.sleep(interval)
+
+    return dict(stacks)
+
+
+def render_collapsed(stacks: dict[str, int]) -> str:
+    return "".join(
+        f"{stack} {count}\n"
+        for stack, count in sorted(stacks.items(), key=lambda item: -item[1])
+    )
+
+
+async def profile(duration: float, interval: float = 0.005) -> dict[str, int]:
+    loop = asyncio.get_running_loop()
+    return await asyncio.to_thread(sample_stacks, duration, interval, loop)
+
+
+@dataclass(slots=True)
+class _Tracing:
+    """Shares tracemalloc between overlapping callers: first of them starts
+    tracing, last one stops it, unless it was traced before them.
+    """
+
+    _users: int = 0
+    _started: bool = False
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def acquire(self, frames: int) -> None:
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                self._started = True
+
+            self._users += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+
+            if self._users == 0 and self._started:
+                tracemalloc.stop()
+                self._started = False
+
+
+_tracing = _Tracing()
+
+
+def _compare(
+    before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int
+) -> list[tracemalloc.StatisticDiff]:
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ]
+    return after.filter_traces(filters).compare_to(
+        before.filter_traces(filters), "traceback"
+    )[:limit]
+
+
+async def top_allocations(
+    duration: float, limit: int = 25, frames: int = 10
+) -> list[tracemalloc.StatisticDiff]:
+    """Traces allocations for `duration` seconds and returns top growing
+    call sites. Tracing is stopped afterwards if it was started here.
+
+    Snapshots walk all traced blocks, so they are taken and compared in a
+    thread.
+    """
+    _tracing.acquire(frames)
+
+    try:
+        before = await asyncio.to_thread(tracemalloc.take_snapshot)
+        await asyncio.sleep(duration)
+        after = await asyncio.to_thread(tracemalloc.take_snapshot)
+    finally:
+        _tracing.release()
+
+    return await asyncio.to_thread(_compare, before, after, limit)
+
+
+def render_allocations(stats: list[tracemalloc.StatisticDiff]) -> str:
+    lines = []
+
+    for stat in stats:
+        lines.append(
+            f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+d} blocks),"
+            f" total {stat.size / 1024:.1f} KiB"
+        )
+        lines.extend(f"    {line}" for line in stat.traceback.format())
+
+    return "\n".join(lines) + "\n"
+
+
+def create_router(dependencies: Sequence[Depends] | None = None) -> APIRouter:
+    router = APIRouter(prefix="/admin", dependencies=dependencies)
+
+    @router.post(
+        "/profile",
+        response_class=PlainTextResponse,
+        responses={HTTPStatus.OK: {"description": "Collapsed stacks"}},
+    )
+    async def get_profile(
+        seconds: Annotated[float, Query(gt=0, le=MAX_SECONDS)] = 5.0,
+        interval: Annotated[float, Query(ge=0.001, le=1.0)] = 0.005,
+    ) -> Any:
+        return PlainTextResponse(render_collapsed(await profile(seconds, interval)))
+
+    @router.post(
+        "/allocations",
+        response_class=PlainTextResponse,
+        responses={HTTPStatus.OK: {"description": "Top allocation sites"}},
+    )
+    async def get_allocations(
+        seconds: Annotated[float, Query(gt=0, le=MAX_SECONDS)] = 5.0,
+        limit: Annotated[int, Query(gt=0, le=1000)] = 25,
+    ) -> Any:
+        return PlainTextResponse(
+            render_allocations(await top_allocations(seconds, limit))
+        )
+
+    return router
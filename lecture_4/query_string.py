@@ -0,0 +1,157 @@
+"""Query string parser following application/x-www-form-urlencoded parsing of
+WHATWG URL standard: fields are split on `&` only, empty fields are skipped,
+name and value are split on first `=`, `+` is space, `%XX` is byte and `%`
+not followed by two hex digits is kept as is, bytes are decoded as UTF-8 with
+replacement of invalid sequences.
+"""
+
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass, field
+
+_HEXDIGITS = "0123456789abcdefABCDEF"
+# every two-digit escape in any case to its byte
+_PERCENT_DECODE = {
+    (high + low).encode(): bytes.fromhex(high + low)
+    for high in _HEXDIGITS
+    for low in _HEXDIGITS
+}
+
+
+def decode_component(raw: bytes) -> str:
+    if b"+" in raw:
+        raw = raw.replace(b"+", b" ")
+
+    if b"%" in raw:
+        raw = _percent_decode(raw)
+
+    return raw.decode("utf-8", "replace")
+
+
+def decode_components(raws: list[bytes]) -> list[str]:
+    """Decodes many components in one pass: they are joined with `&`, which
+    can not be in them before decoding, so it splits result back unless some
+    component had `%26`.
+    """
+    if len(raws) < 2:
+        return [decode_component(raw) for raw in raws]
+
+    decoded = decode_component(b"&".join(raws)).split("&")
+
+    if len(decoded) == len(raws):
+        return decoded
+
+    return [decode_component(raw) for raw in raws]
+
+
+def _percent_decode(raw: bytes) -> bytes:
+    # split and dict lookups run in C, only loop over escapes is in Python
+    first, *chunks = raw.split(b"%")
+    parts = [first]
+
+    for chunk in chunks:
+        byte = _PERCENT_DECODE.get(chunk[:2])
+
+        if byte is None:
+            parts += (b"%", chunk)
+        else:
+            parts += (byte, chunk[2:])
+
+    return b"".join(parts)
+
+
+@dataclass(slots=True, eq=False)
+class QueryParams(Mapping[str, str]):
+    """Parameters of query string, multi-valued.
+
+    Query is split into fields on first access, values of a name are decoded
+    when it is read for the first time. `params[name]` is last value of name,
+    `getlist(name)` is all of them in order of query.
+
+    `max_fields` limits number of fields, more of them make `ValueError`.
+    """
+
+    query: bytes | str
+    max_fields: int | None = None
+
+    _fields: dict[str, list[bytes]] | None = field(init=False, default=None)
+    _values: dict[str, list[str]] = field(init=False, default_factory=dict)
+
+    def _parse(self) -> dict[str, list[bytes]]:
+        if self._fields is not None:
+            return self._fields
+
+        query = self.query
+        if isinstance(query, str):
+            query = query.encode()
+
+        # like in urllib empty fields are counted too, so that limit is checked
+        # before anything is allocated
+        if self.max_fields is not None and query.count(b"&") >= self.max_fields:
+            raise ValueError("too many fields in query string")
+
+        fields = [item.partition(b"=") for item in query.split(b"&") if item]
+        # names are looked up by, so they are decoded right away
+        names = decode_components([raw_name for raw_name, _, _ in fields])
+        parsed: dict[str, list[bytes]] = {}
+
+        for name, (_, _, value) in zip(names, fields):
+            values = parsed.get(name)
+
+            if values is None:
+                parsed[name] = [value]
+            else:
+                values.append(value)
+
+        self._fields = parsed
+        return parsed
+
+    def _decoded(self, name: str) -> list[str] | None:
+        values = self._values.get(name)
+
+        if values is None:
+            raw = self._parse().get(name)
+
+            if raw is None:
+                return None
+
+            values = self._values[name] = decode_components(raw)
+
+        return values
+
+    def getlist(self, name: str) -> list[str]:
+        return list(self._decoded(name) or ())
+
+    def __getitem__(self, name: str) -> str:
+        values = self._decoded(name)
+
+        if values is None:
+            raise KeyError(name)
+
+        return values[-1]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._parse()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._parse())
+
+    def __len__(self) -> int:
+        return len(self._parse())
+
+    def to_dict(self) -> dict[str, list[str]]:
+        fields = self._parse()
+        names = [name for name in fields if name not in self._values]
+        raws = [value for name in names for value in fields[name]]
+        decoded = iter(decode_components(raws))
+
+        for name in names:
+            self._values[name] = [next(decoded) for _ in fields[name]]
+
+        return {name: list(self._values[name]) for name in fields}
+
+
+def parse_qs(query: bytes | str, max_fields: int | None = None) -> dict[str, list[str]]:
+    """All values of every name, like `urllib.parse.parse_qs` with blank
+    values kept.
+    """
+    return QueryParams(query, max_fields).to_dict()
@@ -0,0 +1,242 @@
+"""ASGI middleware serving precomputed responses for declared routes.
+
+Routes opt in with `cached` decorator. On the first request the real handler
+runs and its messages are captured; every following request (until TTL
+expires or cache is invalidated) is answered with those already encoded
+messages, without touching routing, dependencies or response classes.
+
+```python
+cache = ResponseCache()
+app.add_middleware(ResponseCacheMiddleware, cache=cache)
+
+
+@app.get("/")
+@cached()  # immutable
+async def get_default(): ...
+
+
+@app.get("/news")
+@cached(ttl=5.0, vary=("accept-language",))
+async def get_news(): ...
+```
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Iterable
+
+type Scope = dict[str, Any]
+type Receive = Callable[[], Awaitable[dict[str, Any]]]
+type Send = Callable[[dict[str, Any]], Awaitable[None]]
+type ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+_POLICY_ATTRIBUTE = "__response_cache__"
+
+
+@dataclass(frozen=True, slots=True)
+class CachePolicy:
+    ttl: float | None = None  # None means response never changes
+    vary: tuple[bytes, ...] = ()
+
+
+def cached[_TFunc: Callable](
+    ttl: float | None = None, vary: Iterable[str] = ()
+) -> Callable[[_TFunc], _TFunc]:
+    policy = CachePolicy(ttl, tuple(header.lower().encode() for header in vary))
+
+    def decorator(func: _TFunc) -> _TFunc:
+        setattr(func, _POLICY_ATTRIBUTE, policy)
+        return func
+
+    return decorator
+
+
+@dataclass(slots=True)
+class _Entry:
+    start_message: dict[str, Any]
+    body_message: dict[str, Any]
+    expires_at: float | None
+
+    def is_fresh(self, now: float) -> bool:
+        return self.expires_at is None or self.expires_at > now
+
+
+type _Key = tuple[str, str, bytes, tuple[bytes | None, ...]]
+
+
+@dataclass(slots=True)
+class ResponseCache:
+    """Responses of declared routes, keyed by method, path, query string and
+    values of `vary` headers.
+
+    Clients choose query strings and headers, so at most `max_entries`
+    responses are kept: least recently used ones are dropped when a response
+    is stored, as are expired ones at that end. Other expired responses are
+    dropped when they are read.
+    """
+
+    max_entries: int = 1024
+
+    _policies: dict[tuple[str, str], CachePolicy] = field(
+        init=False, default_factory=dict
+    )
+    _entries: OrderedDict[_Key, _Entry] = field(init=False, default_factory=OrderedDict)
+    _listeners: list[Callable[[str | None], None]] = field(
+        init=False, default_factory=list
+    )
+    _discovered: bool = field(init=False, default=False)
+
+    def __post_init__(self) -> None:
+        if self.max_entries < 1:
+            raise ValueError("max_entries must be positive")
+
+    def declare(self, method: str, path: str, policy: CachePolicy) -> None:
+        self._policies[(method.upper(), path)] = policy
+
+    def discover(self, app: Any) -> None:
+        """Collects policies from `cached` endpoints of starlette-like app."""
+        for route in getattr(app, "routes", []):
+            policy = getattr(getattr(route, "endpoint", None), _POLICY_ATTRIBUTE, None)
+
+            if policy is None or getattr(route, "param_convertors", None):
+                continue
+
+            for method in getattr(route, "methods", None) or ["GET"]:
+                self.declare(method, route.path, policy)
+
+        self._discovered = True
+
+    def policy(self, method: str, path: str, app: Any = None) -> CachePolicy | None:
+        """Policy of route, endpoints of `app` are discovered on first call."""
+        if not self._discovered and app is not None:
+            self.discover(app)
+
+        return self._policies.get((method, path))
+
+    def get(self, key: _Key) -> _Entry | None:
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        if not entry.is_fresh(time.monotonic()):
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(
+        self,
+        key: _Key,
+        start_message: dict[str, Any],
+        body: bytes,
+        ttl: float | None,
+    ) -> None:
+        now = time.monotonic()
+
+        # only the least recently used end is checked, so store does not scan
+        # all entries
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+
+            if oldest.is_fresh(now):
+                break
+
+            self._entries.popitem(last=False)
+
+        self._entries[key] = _Entry(
+            start_message=start_message,
+            body_message={"type": "http.response.body", "body": body},
+            expires_at=None if ttl is None else now + ttl,
+        )
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def on_invalidate(self, listener: Callable[[str | None], None]) -> None:
+        self._listeners.append(listener)
+
+    def invalidate(self, path: str | None = None) -> None:
+        """Drops cached responses for path (or all of them if path is None)."""
+        if path is None:
+            self._entries.clear()
+        else:
+            for key in [key for key in self._entries if key[1] == path]:
+                del self._entries[key]
+
+        for listener in self._listeners:
+            listener(path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _header(scope: Scope, name: bytes) -> bytes | None:
+    for key, value in scope["headers"]:
+        if key.lower() == name:
+            return value
+
+    return None
+
+
+@dataclass(slots=True)
+class ResponseCacheMiddleware:
+    app: ASGIApp
+    cache: ResponseCache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        cache = self.cache
+        policy = cache.policy(scope["method"], scope["path"], scope.get("app"))
+
+        if policy is None:
+            return await self.app(scope, receive, send)
+
+        key = (
+            scope["method"],
+            scope["path"],
+            scope["query_string"],
+            tuple(_header(scope, name) for name in policy.vary),
+        )
+        entry = cache.get(key)
+
+        if entry is not None:
+            await send(entry.start_message)
+            await send(entry.body_message)
+            return
+
+        start_message: dict[str, Any] = {}
+        chunks: list[bytes] = []
+        complete = False
+
+        async def capturing_send(message: dict[str, Any]) -> None:
+            nonlocal complete
+
+            if message["type"] == "http.response.start":
+                if policy.vary:
+                    message = {
+                        **message,
+                        "headers": [
+                            *message.get("headers", []),
+                            (b"vary", b", ".join(policy.vary)),
+                        ],
+                    }
+                start_message.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                complete = not message.get("more_body", False)
+
+            await send(message)
+
+        await self.app(scope, receive, capturing_send)
+
+        if not complete or start_message.get("status") != HTTPStatus.OK:
+            return
+
+        cache.put(key, start_message, b"".join(chunks), policy.ttl)
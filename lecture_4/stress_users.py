@@ -0,0 +1,84 @@
+"""Registration throughput of thread-safe `UserService` by number of threads.
+
+Threads register distinct users, every `--overlap`-th username is shared by all
+of them, so taken usernames are hit too. Passwords are hashed with PBKDF2 with
+`--iterations`, hashing releases GIL, so it is what scales with threads.
+
+    python -m lecture_4.stress_users --users 20000 --threads 1 2 4 8
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from lecture_4.demo_service.core.users import (
+    PBKDF2,
+    ColumnarStorage,
+    ModelStorage,
+    PasswordHasher,
+    UserInfo,
+    UserService,
+)
+
+
+def usernames(thread: int, count: int, overlap: int) -> list[str]:
+    return [
+        f"shared{i}" if i % overlap == 0 else f"user{thread}-{i}" for i in range(count)
+    ]
+
+
+def stress(service: UserService, threads: int, users: int, overlap: int) -> float:
+    barrier = threading.Barrier(threads)
+
+    def register_all(thread: int) -> None:
+        infos = [
+            UserInfo(
+                username=username,
+                name=username,
+                birthdate=datetime(2000, 1, 1),
+                password="SuperSecret123",
+            )
+            for username in usernames(thread, users // threads, overlap)
+        ]
+        barrier.wait()
+
+        for info in infos:
+            try:
+                service.register(info)
+            except ValueError:
+                pass
+
+    started_at = time.perf_counter()
+
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(register_all, range(threads)))
+
+    return users / (time.perf_counter() - started_at)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--overlap", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    hasher = PasswordHasher(PBKDF2, pbkdf2_iterations=args.iterations)
+
+    for name, layout in [("models", ModelStorage), ("columnar", ColumnarStorage)]:
+        baseline = None
+
+        for threads in args.threads:
+            service = UserService(
+                password_hasher=hasher, storage=layout(), thread_safe=True
+            )
+            throughput = stress(service, threads, args.users, args.overlap)
+            baseline = baseline or throughput
+
+            print(
+                f"{name:>10}, {threads} threads: {throughput:9.0f} users/s"
+                f" ({throughput / baseline:.2f}x)"
+            )
@@ -0,0 +1,118 @@
+"""Per-phase timings of FastAPI request handling.
+
+`install()` wraps the functions `fastapi.routing` calls for every request
+(relies on internals of fastapi 0.114), after that each request that runs
+with `PhaseTrace` in `current_trace` gets timestamps of:
+
+- `body_parse` - from route entry until dependencies are solved (reading
+  and decoding body);
+- `dependencies` - `solve_dependencies`, i.e. query/body validation and
+  dependencies like `requires_author`;
+- `handler` - endpoint function itself;
+- `response_validation` - `response_model` validation and serialization;
+- `render` - building response object (JSON encoding) until response start
+  is sent.
+
+Nothing is patched until `install()` is called, so disabled tracing costs
+nothing.
+"""
+
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Callable
+
+import fastapi.routing
+
+PHASES = ("body_parse", "dependencies", "handler", "response_validation", "render")
+
+
+@dataclass(slots=True)
+class PhaseTrace:
+    marks: dict[str, float] = field(default_factory=dict)
+
+    def mark(self, name: str) -> None:
+        self.marks[name] = time.perf_counter()
+
+    def phases(self) -> dict[str, float]:
+        marks = self.marks
+
+        if "route" not in marks or "dependencies_start" not in marks:
+            return {}
+
+        result = {
+            "body_parse": marks["dependencies_start"] - marks["route"],
+        }
+
+        if "dependencies_end" in marks:
+            result["dependencies"] = (
+                marks["dependencies_end"] - marks["dependencies_start"]
+            )
+
+        if "handler_end" in marks:
+            result["handler"] = marks["handler_end"] - marks["handler_start"]
+            render_from = marks["handler_end"]
+
+            if "serialize_end" in marks:
+                result["response_validation"] = (
+                    marks["serialize_end"] - marks["serialize_start"]
+                )
+                render_from = marks["serialize_end"]
+
+            if "response_start" in marks:
+                result["render"] = marks["response_start"] - render_from
+
+        return result
+
+
+current_trace: ContextVar[PhaseTrace | None] = ContextVar("current_trace", default=None)
+
+_installed = False
+
+
+def _traced[_TFunc: Callable[..., Any]](func: _TFunc, start: str, end: str) -> _TFunc:
+    @wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        trace = current_trace.get()
+
+        if trace is None:
+            return await func(*args, **kwargs)
+
+        trace.mark(start)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            trace.mark(end)
+
+    return wrapper
+
+
+def install() -> None:
+    global _installed
+
+    if _installed:
+        return
+
+    original_handle = fastapi.routing.APIRoute.handle
+
+    @wraps(original_handle)
+    async def handle(self: fastapi.routing.APIRoute, scope, receive, send) -> None:
+        trace = current_trace.get()
+        if trace is not None:
+            trace.mark("route")
+
+        await original_handle(self, scope, receive, send)
+
+    fastapi.routing.APIRoute.handle = handle
+    fastapi.routing.solve_dependencies = _traced(
+        fastapi.routing.solve_dependencies, "dependencies_start", "dependencies_end"
+    )
+    fastapi.routing.run_endpoint_function = _traced(
+        fastapi.routing.run_endpoint_function, "handler_start", "handler_end"
+    )
+    fastapi.routing.serialize_response = _traced(
+        fastapi.routing.serialize_response, "serialize_start", "serialize_end"
+    )
+
+    _installed = True
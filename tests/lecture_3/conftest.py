@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# lecture 3 service is run with `--app-dir lecture_3` and imports
+# `demo_service` as top-level package
+sys.path.insert(0, str(Path(__file__).parents[2] / "lecture_3"))
@@ -0,0 +1,64 @@
+from http import HTTPStatus
+
+import pytest
+from fastapi.testclient import TestClient
+
+from demo_service import store
+from demo_service.api import MAX_BATCH_SIZE, app
+from demo_service.store import ShardedMemoryStore, SqliteStore
+
+
+def user(i: int) -> dict:
+    return {"username": f"user{i}", "first_name": "First", "last_name": "Last"}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def client(request, tmp_path, monkeypatch) -> TestClient:
+    if request.param == "memory":
+        monkeypatch.setattr(store, "_store", ShardedMemoryStore())
+    else:
+        monkeypatch.setattr(store, "_store", SqliteStore(str(tmp_path / "users.db")))
+
+    return TestClient(app)
+
+
+def test_create_and_get_users(client: TestClient) -> None:
+    response = client.post("/create-users", json=[user(i) for i in range(3)])
+
+    assert response.status_code == HTTPStatus.CREATED
+    created = response.json()
+    assert [item["username"] for item in created] == ["user0", "user1", "user2"]
+
+    uids = [item["uid"] for item in created]
+    missing = max(uids) + 1
+    response = client.post("/get-users", json=[uids[2], missing, uids[0], uids[2]])
+
+    assert response.status_code == HTTPStatus.OK
+    # results follow requested ids, unknown ones are reported inline
+    assert response.json() == [
+        created[2],
+        {"uid": missing, "detail": "Not Found"},
+        created[0],
+        created[2],
+    ]
+
+
+def test_empty_batches(client: TestClient) -> None:
+    response = client.post("/create-users", json=[])
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json() == []
+
+    response = client.post("/get-users", json=[])
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == []
+
+
+@pytest.mark.parametrize(
+    ("path", "item"),
+    [("/create-users", user(0)), ("/get-users", 0)],
+)
+def test_batch_size_is_limited(client: TestClient, path: str, item) -> None:
+    assert client.post(path, json=[item] * MAX_BATCH_SIZE).is_success
+
+    response = client.post(path, json=[item] * (MAX_BATCH_SIZE + 1))
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
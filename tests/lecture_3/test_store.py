@@ -0,0 +1,76 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from demo_service.contracts import UserRequest
+from demo_service.store import ShardedMemoryStore, SqliteStore, UserStore
+
+THREADS = 8
+PER_THREAD = 50
+
+
+def user(i: int) -> UserRequest:
+    return UserRequest(username=f"user{i}", first_name="First", last_name="Last")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def stores(request, tmp_path) -> list[UserStore]:
+    if request.param == "memory":
+        store = ShardedMemoryStore(shards=4)
+        return [store, store]
+
+    # two stores on one file stand for two worker processes
+    path = str(tmp_path / "users.db")
+    return [SqliteStore(path), SqliteStore(path)]
+
+
+def test_concurrent_inserts(stores: list[UserStore]) -> None:
+    def insert_all(thread: int) -> list[int]:
+        store = stores[thread % len(stores)]
+        first = thread * PER_THREAD
+        ids = []
+
+        for i in range(first, first + PER_THREAD, 5):
+            ids.append(store.insert(user(i)).uid)
+            ids += [
+                record.uid
+                for record in store.insert_many([user(i + j) for j in range(1, 5)])
+            ]
+
+        return ids
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        ids = [
+            id for result in executor.map(insert_all, range(THREADS)) for id in result
+        ]
+
+    assert sorted(ids) == list(range(THREADS * PER_THREAD))
+
+    records = stores[0].select_many(ids)
+    assert sorted(record.username for record in records) == sorted(
+        f"user{i}" for i in range(THREADS * PER_THREAD)
+    )
+
+
+def test_sqlite_ids_continue_after_existing_rows(tmp_path) -> None:
+    path = str(tmp_path / "users.db")
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE users (uid INTEGER PRIMARY KEY, username TEXT NOT NULL,"
+            " first_name TEXT NOT NULL, last_name TEXT NOT NULL, birthdate TEXT)"
+        )
+        connection.execute("INSERT INTO users VALUES (7, 'old', 'Old', 'User', NULL)")
+    connection.close()
+
+    store = SqliteStore(path)
+
+    assert store.insert(user(0)).uid == 8
+    assert [record.uid for record in store.insert_many([user(1), user(2)])] == [9, 10]
+    assert SqliteStore(path).insert(user(3)).uid == 11
+    assert store.select(7).username == "old"
+
+    with sqlite3.connect(path) as connection:
+        # reopened file keeps its one counter
+        assert connection.execute("SELECT * FROM uid_sequence").fetchall() == [(12,)]
+    connection.close()
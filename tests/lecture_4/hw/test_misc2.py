@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 from fastapi import HTTPException
 from datetime import datetime
 from lecture_4.demo_service.api.users import register_user, get_user, promote_user
@@ -26,7 +26,7 @@ async def test_register_user_success():
     # Мокаем `UserInfo` и `UserEntity`
     user_info = UserInfo(**body.model_dump())
     user_entity = UserEntity(uid=1, info=user_info)
-    user_service.register.return_value = user_entity
+    user_service.register_async = AsyncMock(return_value=user_entity)
 
     # Вызываем функцию
     result = await register_user(body, user_service)
@@ -52,7 +52,9 @@ async def test_register_user_duplicate_username():
     )
 
     # Указываем, что мокаем ошибку в UserService
-    user_service.register.side_effect = ValueError("username is already taken")
+    user_service.register_async = AsyncMock(
+        side_effect=ValueError("username is already taken")
+    )
 
     # Ожидаем поднятие исключения ValueError
     with pytest.raises(ValueError, match="username is already taken"):
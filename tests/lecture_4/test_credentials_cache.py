@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+from fastapi.security import HTTPBasicCredentials
+
+from lecture_4.demo_service.api.utils import requires_author
+from lecture_4.demo_service.core.credentials import CredentialsCache
+from lecture_4.demo_service.core.users import (
+    PasswordHasher,
+    UserInfo,
+    UserRole,
+    UserService,
+)
+
+
+def test_get_put() -> None:
+    cache = CredentialsCache()
+    cache.put("user", "password", 1)
+
+    assert cache.get("user", "password") == 1
+    assert cache.get("user", "other") is None
+    assert cache.get("other", "password") is None
+
+
+def test_entries_expire(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 100.0
+    monkeypatch.setattr("time.monotonic", lambda: now)
+
+    cache = CredentialsCache(ttl=10.0)
+    cache.put("user", "password", 1)
+
+    now = 111.0
+    assert cache.get("user", "password") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_are_evicted() -> None:
+    cache = CredentialsCache(max_size=2)
+    cache.put("a", "password", 1)
+    cache.put("b", "password", 2)
+    cache.get("a", "password")
+    cache.put("c", "password", 3)
+
+    assert cache.get("a", "password") == 1
+    assert cache.get("b", "password") is None
+    assert cache.get("c", "password") == 3
+
+
+def test_grant_admin_invalidates() -> None:
+    cache = CredentialsCache()
+    service = UserService(
+        password_hasher=PasswordHasher(scrypt_n=2**4),
+        change_listeners=[cache.invalidate],
+    )
+    entity = service.register(
+        UserInfo(
+            username="user",
+            name="name",
+            birthdate=datetime.fromtimestamp(0.0),
+            password="SuperSecret123",
+        )
+    )
+    credentials = HTTPBasicCredentials(username="user", password="SuperSecret123")
+
+    assert requires_author(credentials, service, cache) == entity
+    assert cache.get("user", "SuperSecret123") == entity.uid
+
+    service.grant_admin(entity.uid)
+
+    assert len(cache) == 0
+    assert requires_author(credentials, service, cache).info.role == UserRole.ADMIN
@@ -1,6 +1,16 @@
+import asyncio
+import time
+from contextlib import aclosing
+
 import pytest
 
-from lecture_4.example_async import map_async, slow_map_async
+from lecture_4.example_async import (
+    RateLimitedMapper,
+    TokenBucket,
+    imap_async,
+    map_async,
+    slow_map_async,
+)
 from tests.lecture_4.conftest import to_str_async
 
 
@@ -33,3 +43,193 @@ async def test_map_async_parametrized(
 async def test_slow_map_async(int_list) -> None:
     result = await slow_map_async(to_str_async, int_list)
     assert result == ["1", "2", "3", "4", "5"]
+
+
+async def sleep_and_return(value: float) -> float:
+    await asyncio.sleep(value)
+    return value
+
+
+@pytest.mark.asyncio
+async def test_map_async_limits_concurrency() -> None:
+    running = peak = 0
+
+    async def track(value: int) -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+        return value
+
+    result = await map_async(track, range(100), max_concurrency=7)
+
+    assert result == list(range(100))
+    assert peak == 7
+
+
+@pytest.mark.asyncio
+async def test_imap_async_orders() -> None:
+    values = ["a", "b", "c", "d"]
+    # calls finish one by one in order of releases, not of timers
+    released = {value: asyncio.Event() for value in values}
+
+    async def wait_for_release(value: str) -> str:
+        await released[value].wait()
+        return value
+
+    async def collect(results) -> list[str]:
+        return [value async for value in results]
+
+    ordered = asyncio.create_task(collect(imap_async(wait_for_release, values)))
+
+    for value in ["d", "c", "b"]:
+        released[value].set()
+        await asyncio.sleep(0.01)
+
+    # first value holds back the ones after it
+    assert not ordered.done()
+    released["a"].set()
+    assert await ordered == values
+
+    for event in released.values():
+        event.clear()
+
+    yielded = []
+
+    async with aclosing(
+        imap_async(wait_for_release, values, ordered=False)
+    ) as unordered:
+        for value in ["c", "a", "d", "b"]:
+            released[value].set()
+            yielded.append(await anext(unordered))
+
+    assert yielded == ["c", "a", "d", "b"]
+
+
+@pytest.mark.asyncio
+async def test_imap_async_reads_async_iterable_lazily() -> None:
+    taken = []
+
+    async def values():
+        for value in range(1000):
+            taken.append(value)
+            yield value
+
+    async with aclosing(
+        imap_async(to_str_async, values(), max_concurrency=3)
+    ) as results:
+        async for result in results:
+            if result == "1":
+                break
+
+    assert taken == [0, 1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_timeout_per_item() -> None:
+    result = await map_async(
+        sleep_and_return, [0, 1, 0], timeout=0.05, return_exceptions=True
+    )
+
+    assert result[0] == 0 and result[2] == 0
+    assert isinstance(result[1], TimeoutError)
+
+    with pytest.raises(TimeoutError):
+        await map_async(sleep_and_return, [0, 1, 0], max_concurrency=2, timeout=0.05)
+
+
+@pytest.mark.asyncio
+async def test_imap_async_error_cancels_running_calls() -> None:
+    cancelled = []
+
+    async def fail_or_wait(value: int) -> int:
+        if value == 0:
+            raise RuntimeError("failed")
+
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(value)
+            raise
+
+        return value
+
+    with pytest.raises(RuntimeError, match="failed"):
+        await map_async(fail_or_wait, range(10), max_concurrency=3)
+
+    assert cancelled == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_allows_burst_then_rate() -> None:
+    bucket = TokenBucket(rate=50, burst=5)
+    started_at = time.monotonic()
+    acquired_at = []
+
+    for _ in range(10):
+        await bucket.acquire()
+        acquired_at.append(time.monotonic() - started_at)
+
+    assert acquired_at[4] < 0.01
+    # other 5 tokens come at 50 per second
+    assert 0.09 <= acquired_at[9] < 0.2
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_mapper_retries() -> None:
+    failures = {2: 2, 4: 1}
+
+    async def flaky(value: int) -> int:
+        if failures.get(value):
+            failures[value] -= 1
+            raise ConnectionError("try again")
+
+        return value * 10
+
+    mapper = RateLimitedMapper(
+        rate=1000, burst=100, retry_on=(ConnectionError,), base_delay=0
+    )
+
+    assert await mapper.map(flaky, range(5)) == [0, 10, 20, 30, 40]
+    assert mapper.stats.calls == 8
+    assert mapper.stats.errors == 3
+    assert mapper.stats.retries == 3
+    assert 0 < mapper.stats.percentile(50) <= mapper.stats.percentile(100)
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_mapper_gives_up() -> None:
+    calls = []
+
+    async def fail(value: int) -> int:
+        calls.append(value)
+        raise (ValueError if value else ConnectionError)("failed")
+
+    mapper = RateLimitedMapper(
+        rate=1000, burst=100, retry_on=(ConnectionError,), base_delay=0
+    )
+
+    results = await mapper.map(fail, [0, 1], return_exceptions=True)
+
+    assert [type(result) for result in results] == [ConnectionError, ValueError]
+    # only chosen exceptions are retried
+    assert sorted(calls) == [0, 0, 0, 1]
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_mapper_limits_concurrency() -> None:
+    running = peak = 0
+
+    async def track(value: int) -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        return value
+
+    mapper = RateLimitedMapper(rate=10_000, burst=100, max_concurrency=4)
+
+    assert [value async for value in mapper.imap(track, range(20))] == list(range(20))
+    assert peak == 4
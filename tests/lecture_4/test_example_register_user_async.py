@@ -0,0 +1,371 @@
+import asyncio
+import gc
+import json
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import pytest
+
+from lecture_4.example_register_user import (
+    AsyncGoogleAuthAPI,
+    AsyncVKAuthAPI,
+    CacheStats,
+    CachedAuthAPI,
+    CircuitBreaker,
+    Entity,
+    Errors,
+    RegisterUserExternal,
+    SharedLookupError,
+    User,
+    UserService,
+    make_auth_client,
+)
+
+
+class StubProviders(ThreadingHTTPServer):
+    """Google and VK auth APIs on one local port."""
+
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.delay = 0.0
+        self.status = HTTPStatus.OK
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.running = 0
+        self.peak = 0
+        self.client_ports: set[int] = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    server: StubProviders
+
+    def do_GET(self) -> None:
+        server = self.server
+
+        with server.lock:
+            server.requests += 1
+            server.running += 1
+            server.peak = max(server.peak, server.running)
+            server.client_ports.add(self.client_address[1])
+
+        time.sleep(server.delay)
+
+        url = urlsplit(self.path)
+        if url.path == "/auth":
+            data = {"name": parse_qs(url.query)["id"][0], "age": 30}
+        else:
+            uid = url.path.removeprefix("/auth/")
+            data = {"info": {"firstName": uid, "lastName": "Doe", "age": 40}}
+
+        body = json.dumps(data).encode()
+        self.send_response(server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        with server.lock:
+            server.running -= 1
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture()
+def stub():
+    server = StubProviders()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class MemoryRepository:
+    def __init__(self) -> None:
+        self.users: list[User] = []
+
+    def insert(self, model: User) -> Entity[int, User]:
+        self.users.append(model)
+        return Entity(len(self.users), model)
+
+
+def service(providers: dict) -> UserService:
+    return UserService(MemoryRepository(), None, providers)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_registrations_share_connections(stub) -> None:
+    stub.delay = 0.05
+
+    async with make_auth_client(max_keepalive_connections=20) as client:
+        user_service = service(
+            {
+                "google": AsyncGoogleAuthAPI(client, stub.url, max_concurrency=10),
+                "vk": AsyncVKAuthAPI(client, stub.url, max_concurrency=10),
+            }
+        )
+        messages = [
+            RegisterUserExternal(f"user{i}", "google" if i % 2 else "vk")
+            for i in range(60)
+        ]
+
+        started_at = time.perf_counter()
+        entities = await asyncio.gather(
+            *(user_service.register_user_async(message) for message in messages)
+        )
+        elapsed = time.perf_counter() - started_at
+
+    assert entities[0].info.name == "user0 Doe"
+    assert entities[0].info.age == 40
+    assert entities[1].info.name == "user1"
+    assert entities[1].info.identities[0].provider == "google"
+    # 60 requests of 50 ms, 20 at a time
+    assert elapsed < 1.0
+    assert stub.peak <= 20
+    assert len(stub.client_ports) <= 20
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_per_provider(stub) -> None:
+    stub.delay = 0.02
+
+    async with make_auth_client() as client:
+        provider = AsyncGoogleAuthAPI(client, stub.url, max_concurrency=3)
+        await asyncio.gather(*(provider.get_user(str(i)) for i in range(15)))
+
+    assert stub.requests == 15
+    assert stub.peak == 3
+
+
+@pytest.mark.asyncio
+async def test_timeout_is_disconnected(stub) -> None:
+    stub.delay = 0.5
+
+    async with make_auth_client() as client:
+        user_service = service({"vk": AsyncVKAuthAPI(client, stub.url, timeout=0.05)})
+
+        with pytest.raises(Exception, match=Errors.DISCONNECTED.value):
+            await user_service.register_user_async(RegisterUserExternal("1", "vk"))
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker(stub) -> None:
+    stub.status = HTTPStatus.INTERNAL_SERVER_ERROR
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+
+    async with make_auth_client() as client:
+        user_service = service(
+            {"google": AsyncGoogleAuthAPI(client, stub.url, breaker=breaker)}
+        )
+        message = RegisterUserExternal("1", "google")
+
+        for _ in range(2):
+            with pytest.raises(Exception, match=Errors.API_ERROR.value):
+                await user_service.register_user_async(message)
+
+        # provider is not called while circuit is open
+        with pytest.raises(Exception, match=Errors.PROVIDER_UNAVAILABLE.value):
+            await user_service.register_user_async(message)
+        assert stub.requests == 2
+
+        await asyncio.sleep(0.1)
+        stub.status = HTTPStatus.OK
+
+        entity = await user_service.register_user_async(message)
+        assert entity.info.name == "1"
+        assert breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_open_circuit(stub) -> None:
+    stub.status = HTTPStatus.NOT_FOUND
+    breaker = CircuitBreaker(failure_threshold=1)
+
+    async with make_auth_client() as client:
+        user_service = service(
+            {"vk": AsyncVKAuthAPI(client, stub.url, breaker=breaker)}
+        )
+
+        for _ in range(3):
+            with pytest.raises(Exception, match=Errors.API_ERROR.value):
+                await user_service.register_user_async(RegisterUserExternal("1", "vk"))
+
+    assert stub.requests == 3
+
+
+class CountingProvider:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    async def get_user(self, uid: str) -> User:
+        self.calls.append(uid)
+        await asyncio.sleep(0.01)
+        return User(name=uid, age=20, identities=[])
+
+
+@pytest.mark.asyncio
+async def test_cache_coalesces_concurrent_lookups() -> None:
+    provider = CountingProvider()
+    cached = CachedAuthAPI(provider)
+
+    users = await asyncio.gather(*(cached.get_user(str(i % 2)) for i in range(10)))
+
+    assert [user.name for user in users] == ["0", "1"] * 5
+    assert sorted(provider.calls) == ["0", "1"]
+    assert cached.stats == CacheStats(hits=0, misses=2, coalesced=8)
+
+    await cached.get_user("0")
+    assert cached.stats.hits == 1
+    assert len(provider.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_ttl_and_lru() -> None:
+    provider = CountingProvider()
+    cached = CachedAuthAPI(provider, ttl=0.05, max_size=2)
+
+    for uid in ["a", "b", "a", "c", "a", "b"]:
+        await cached.get_user(uid)
+
+    # "b" was least recently used when "c" came
+    assert provider.calls == ["a", "b", "c", "b"]
+
+    await asyncio.sleep(0.05)
+    await cached.get_user("a")
+    assert provider.calls[-1] == "a"
+    assert cached.stats.misses == 5
+
+
+@pytest.mark.asyncio
+async def test_cache_cancelled_lookup_does_not_cancel_others() -> None:
+    provider = CountingProvider()
+    cached = CachedAuthAPI(provider)
+
+    first = asyncio.ensure_future(cached.get_user("a"))
+    second = asyncio.ensure_future(cached.get_user("a"))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert (await second).name == "a"
+    assert provider.calls == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_cache_keeps_not_found(stub) -> None:
+    stub.status = HTTPStatus.NOT_FOUND
+
+    async with make_auth_client() as client:
+        cached = CachedAuthAPI(AsyncVKAuthAPI(client, stub.url))
+        user_service = service({"vk": cached})
+
+        for _ in range(3):
+            with pytest.raises(Exception, match=Errors.API_ERROR.value):
+                await user_service.register_user_async(RegisterUserExternal("1", "vk"))
+
+        assert stub.requests == 1
+        assert cached.stats.hits == 2
+
+        # other errors are not cached
+        stub.status = HTTPStatus.INTERNAL_SERVER_ERROR
+        for uid in ["2", "2"]:
+            with pytest.raises(Exception, match=Errors.API_ERROR.value):
+                await user_service.register_user_async(RegisterUserExternal(uid, "vk"))
+
+        assert stub.requests == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "failure",
+    [httpx.DecodingError("broken body"), httpx.TooManyRedirects("loop")],
+)
+async def test_failed_probe_does_not_stick(failure) -> None:
+    fail = True
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if fail:
+            raise failure
+
+        return httpx.Response(HTTPStatus.OK, json={"name": "probe", "age": 1})
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+        provider = AsyncGoogleAuthAPI(client, breaker=breaker)
+
+        with pytest.raises(type(failure)):
+            await provider.get_user("1")
+
+        fail = False
+        assert (await provider.get_user("1")).name == "probe"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_does_not_stick() -> None:
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(10)
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+        provider = AsyncGoogleAuthAPI(client, breaker=breaker)
+        probe = asyncio.ensure_future(provider.get_user("1"))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    assert breaker.allow()
+
+
+class FailingProvider:
+    async def get_user(self, uid: str) -> User:
+        await asyncio.sleep(0.01)
+        raise RuntimeError(uid)
+
+
+@pytest.mark.asyncio
+async def test_cache_raises_fresh_error_per_caller() -> None:
+    cached = CachedAuthAPI(FailingProvider())
+
+    errors = await asyncio.gather(
+        cached.get_user("a"), cached.get_user("a"), return_exceptions=True
+    )
+
+    assert all(isinstance(error, SharedLookupError) for error in errors)
+    assert errors[0] is not errors[1]
+    assert errors[0].__cause__ is errors[1].__cause__
+    assert isinstance(errors[0].__cause__, RuntimeError)
+
+
+@pytest.mark.asyncio
+async def test_cache_retrieves_error_nobody_waits_for() -> None:
+    unhandled = []
+    loop = asyncio.get_running_loop()
+    loop.set_exception_handler(lambda loop, context: unhandled.append(context))
+    cached = CachedAuthAPI(FailingProvider())
+
+    caller = asyncio.ensure_future(cached.get_user("a"))
+    await asyncio.sleep(0)
+    caller.cancel()
+    await asyncio.sleep(0.05)
+    gc.collect()
+
+    assert unhandled == []
+    loop.set_exception_handler(None)
@@ -0,0 +1,141 @@
+import os
+import subprocess
+import sys
+import time
+from http import HTTPStatus
+from typing import Annotated
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from lecture_4.metrics import FastMetrics, Snapshot
+
+
+def create_app(metrics: FastMetrics) -> FastAPI:
+    app = FastAPI()
+    metrics.instrument(app).expose(app)
+
+    @app.get("/items/{id}")
+    async def get_item(id: int) -> dict:
+        if id < 0:
+            raise HTTPException(HTTPStatus.NOT_FOUND)
+
+        return {"id": id}
+
+    return app
+
+
+@pytest.fixture()
+def metrics() -> FastMetrics:
+    return FastMetrics(buckets=(0.1, 1.0), multiprocess_dir=None)
+
+
+def test_requests_are_counted_by_template(metrics: FastMetrics) -> None:
+    client = TestClient(create_app(metrics))
+
+    for id in [1, 2, 3, -1]:
+        client.get(f"/items/{id}")
+    client.get("/unknown")
+
+    snapshot = metrics.snapshot()
+
+    assert snapshot.requests == {
+        ("/items/{id}", "GET", "2xx"): 3,
+        ("/items/{id}", "GET", "4xx"): 1,
+        ("none", "GET", "4xx"): 1,
+    }
+    assert snapshot.durations[("/items/{id}", "GET")].count == 4
+
+
+def test_metrics_endpoint(metrics: FastMetrics) -> None:
+    client = TestClient(create_app(metrics))
+    client.get("/items/1")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == HTTPStatus.OK
+    assert (
+        'http_requests_total{handler="/items/{id}",method="GET",status="2xx"} 1.0'
+        in response.text
+    )
+    assert (
+        'http_request_duration_seconds_bucket{handler="/items/{id}",method="GET",'
+        'le="+Inf"} 1.0' in response.text
+    )
+    # scrapes are not counted
+    assert 'handler="/metrics"' not in response.text
+
+
+def test_multiprocess_aggregation(tmp_path) -> None:
+    other_worker = Snapshot()
+    other_worker.requests[("/items/{id}", "GET", "2xx")] = 5
+    (tmp_path / f"fast_metrics_{os.getppid()}.json").write_text(other_worker.to_json())
+
+    exited = subprocess.Popen([sys.executable, "-c", ""])
+    exited.wait()
+    dead_worker = Snapshot()
+    dead_worker.requests[("/items/{id}", "GET", "2xx")] = 100
+    (tmp_path / f"fast_metrics_{exited.pid}.json").write_text(dead_worker.to_json())
+
+    metrics = FastMetrics(multiprocess_dir=str(tmp_path))
+    client = TestClient(create_app(metrics))
+    client.get("/items/1")
+
+    assert metrics.collect().requests == {("/items/{id}", "GET", "2xx"): 6}
+    assert not (tmp_path / f"fast_metrics_{exited.pid}.json").exists()
+
+
+def test_multiprocess_flush_in_background(tmp_path) -> None:
+    metrics = FastMetrics(multiprocess_dir=str(tmp_path), flush_interval=0.01)
+    client = TestClient(create_app(metrics))
+    client.get("/items/1")
+
+    path = tmp_path / f"fast_metrics_{os.getpid()}.json"
+    deadline = time.monotonic() + 5
+
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert Snapshot.from_json(path.read_text()).requests == {
+        ("/items/{id}", "GET", "2xx"): 1
+    }
+
+
+def test_phase_tracing() -> None:
+    metrics = FastMetrics(multiprocess_dir=None, trace_phases=True)
+    app = FastAPI()
+    metrics.instrument(app).expose(app)
+
+    async def requires_token(token: str) -> str:
+        return token
+
+    @app.post("/echo")
+    async def echo(
+        body: dict, token: Annotated[str, Depends(requires_token)]
+    ) -> dict[str, str]:
+        return {"token": token, **body}
+
+    client = TestClient(app)
+    response = client.post("/echo", params={"token": "t"}, json={"a": "b"})
+    assert response.json() == {"token": "t", "a": "b"}
+
+    client.post("/echo", json={})  # fails on dependencies
+
+    phases = metrics.snapshot().phases
+    assert {phase: histogram.count for (_, _, phase), histogram in phases.items()} == {
+        "body_parse": 2,
+        "dependencies": 2,
+        "handler": 1,
+        "response_validation": 1,
+        "render": 1,
+    }
+    assert "http_request_phase_duration_seconds_bucket" in metrics.render()
+
+
+def test_phase_tracing_disabled(metrics: FastMetrics) -> None:
+    client = TestClient(create_app(metrics))
+    client.get("/items/1")
+
+    assert metrics.snapshot().phases == {}
+    assert "http_request_phase_duration_seconds" not in metrics.render()
@@ -0,0 +1,103 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lecture_4.demo_service.api.main import create_app
+from lecture_4.demo_service.core.users import (
+    PasswordHasher,
+    UserInfo,
+    UserService,
+    verify_password,
+)
+
+FAST_SCRYPT = PasswordHasher(scrypt_n=2**4)
+
+
+@pytest.mark.parametrize(
+    "hasher",
+    [FAST_SCRYPT, PasswordHasher(algorithm="pbkdf2_sha256", pbkdf2_iterations=10)],
+)
+def test_hash_and_verify(hasher: PasswordHasher) -> None:
+    stored = hasher.hash("SuperSecret123")
+
+    assert stored.startswith(hasher.algorithm + "$")
+    assert "SuperSecret123" not in stored
+    assert stored != hasher.hash("SuperSecret123")  # salted
+    assert verify_password("SuperSecret123", stored)
+    assert not verify_password("SuperSecret124", stored)
+
+
+def test_cost_is_read_from_hash() -> None:
+    stored = FAST_SCRYPT.hash("SuperSecret123")
+
+    assert stored.split("$")[1:4] == ["16", "8", "1"]
+    assert verify_password("SuperSecret123", stored)
+
+
+def test_plaintext_is_compared_as_is() -> None:
+    assert verify_password("SuperSecret123", "SuperSecret123", plaintext=True)
+    assert not verify_password("SuperSecret123", "other", plaintext=True)
+
+
+@pytest.mark.parametrize(
+    "stored",
+    [
+        "SuperSecret123",
+        "md5$SuperSecret123",
+        "scrypt$16$8$SuperSecret123",
+        "scrypt$16$8$1$not base64$",
+        "pbkdf2_sha256$ten$c2FsdA==$ZGlnZXN0",
+    ],
+)
+def test_unknown_format_never_matches(stored: str) -> None:
+    assert not verify_password(stored, stored)
+    assert not verify_password("SuperSecret123", stored)
+
+
+def test_unknown_algorithm() -> None:
+    with pytest.raises(ValueError, match="unknown password hash algorithm"):
+        PasswordHasher(algorithm="md5")
+
+
+def test_service_stores_hash() -> None:
+    service = UserService(password_hasher=FAST_SCRYPT)
+    entity = service.register(
+        UserInfo(
+            username="user",
+            name="name",
+            birthdate=datetime.fromtimestamp(0.0),
+            password="SuperSecret123",
+        )
+    )
+
+    stored = entity.info.password.get_secret_value()
+    assert stored.startswith("scrypt$")
+    assert verify_password("SuperSecret123", stored)
+
+
+def test_api_authenticates_with_hashed_passwords() -> None:
+    with TestClient(create_app()) as client:
+        response = client.post(
+            "/user-register",
+            json={
+                "username": "user",
+                "name": "name",
+                "birthdate": "2000-01-01T00:00:00",
+                "password": "SuperSecret123",
+            },
+        )
+        uid = response.json()["uid"]
+
+        assert (
+            client.post(
+                "/user-get", params={"id": uid}, auth=("user", "SuperSecret123")
+            ).json()["username"]
+            == "user"
+        )
+        assert (
+            client.post(
+                "/user-get", params={"id": uid}, auth=("user", "wrong")
+            ).status_code
+            == 401
+        )
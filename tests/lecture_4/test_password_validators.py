@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import threading
+from datetime import datetime
+
+import pytest
+
+from lecture_4.demo_service.core.breached import BreachedPasswords, compile_hashes
+from lecture_4.demo_service.core.users import (
+    UserInfo,
+    UserService,
+    cpu_bound,
+    validate_password,
+)
+
+
+def user_info(password: str = "SuperSecret123") -> UserInfo:
+    return UserInfo(
+        username="user",
+        name="name",
+        birthdate=datetime.fromtimestamp(0.0),
+        password=password,
+    )
+
+
+@pytest.mark.asyncio
+async def test_validators_run_concurrently() -> None:
+    started = 0
+    both_started = asyncio.Event()
+
+    async def validator(password: str) -> bool:
+        nonlocal started
+        started += 1
+        if started == 2:
+            both_started.set()
+        await asyncio.wait_for(both_started.wait(), 1.0)
+        return True
+
+    assert await validate_password("password", [validator, validator])
+
+
+@pytest.mark.asyncio
+async def test_first_failure_cancels_the_rest() -> None:
+    cancelled = asyncio.Event()
+
+    async def slow(password: str) -> bool:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return True
+
+    async def failing(password: str) -> bool:
+        return False
+
+    assert not await asyncio.wait_for(
+        validate_password("password", [slow, failing]), 1.0
+    )
+    await asyncio.wait_for(cancelled.wait(), 1.0)
+
+
+@pytest.mark.asyncio
+async def test_cpu_bound_validators_are_offloaded() -> None:
+    threads = []
+
+    @cpu_bound
+    def validator(password: str) -> bool:
+        threads.append(threading.current_thread())
+        return True
+
+    assert await validate_password("password", [validator])
+    assert threads[0] is not threading.current_thread()
+
+
+def test_sync_register_runs_async_validators() -> None:
+    async def no_secret(password: str) -> bool:
+        return "Secret" not in password
+
+    service = UserService(password_validators=[no_secret])
+
+    with pytest.raises(ValueError, match="invalid password"):
+        service.register(user_info())
+
+    assert service.register(user_info("password123")).uid == 1
+
+
+@pytest.fixture()
+def breached(tmp_path) -> BreachedPasswords:
+    passwords = ["password", "123456", "qwerty", "SuperSecret123"]
+    lines = sorted(
+        f"{hashlib.sha1(password.encode()).hexdigest().upper()}:{count}"
+        for count, password in enumerate(passwords, 1)
+    )
+    path = str(tmp_path / "breached.bin")
+    compile_hashes(lines, path)
+
+    validator = BreachedPasswords(path)
+    yield validator
+    validator.close()
+
+
+def test_breached_lookup(breached: BreachedPasswords) -> None:
+    assert len(breached) == 4
+
+    for password in ["password", "123456", "qwerty", "SuperSecret123"]:
+        assert breached.contains(password)
+
+    for password in ["", "password1", "correct horse battery staple"]:
+        assert not breached.contains(password)
+
+
+def test_compile_requires_sorted_hashes(tmp_path) -> None:
+    with pytest.raises(ValueError, match="not sorted"):
+        compile_hashes(["F" * 40, "0" * 40], str(tmp_path / "breached.bin"))
+
+
+@pytest.mark.asyncio
+async def test_register_rejects_breached_passwords(
+    breached: BreachedPasswords,
+) -> None:
+    service = UserService(password_validators=[breached])
+
+    with pytest.raises(ValueError, match="invalid password"):
+        await service.register_async(user_info())
+
+    entity = await service.register_async(user_info("not-in-breach-42"))
+    assert service.get_by_username("user") == entity
@@ -0,0 +1,88 @@
+import asyncio
+import tracemalloc
+from http import HTTPStatus
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lecture_4.demo_service.api.main import create_app
+from lecture_4.profiling import profile, render_collapsed, top_allocations
+
+ADMIN_AUTH = ("admin", "superSecretAdminPassword123")
+
+
+@pytest.fixture()
+def client():
+    with TestClient(create_app()) as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_profile_collects_threads_and_tasks() -> None:
+    async def sleeper() -> None:
+        await asyncio.sleep(1)
+
+    task = asyncio.create_task(sleeper(), name="sleeper")
+    stacks = await profile(0.05, 0.005)
+    task.cancel()
+
+    assert any(stack.startswith("thread:") for stack in stacks)
+    assert any(
+        stack.startswith("task:sleeper") and "sleeper" in stack.split(";")[-1]
+        for stack in stacks
+    )
+
+    line = render_collapsed(stacks).splitlines()[0]
+    assert int(line.rsplit(" ", 1)[1]) >= 1
+
+
+@pytest.mark.asyncio
+async def test_top_allocations() -> None:
+    async def allocate() -> list[bytes]:
+        await asyncio.sleep(0.01)
+        return [bytes(1024) for _ in range(100)]
+
+    task = asyncio.create_task(allocate())
+    stats = await top_allocations(0.05, limit=5)
+    await task
+
+    assert 0 < len(stats) <= 5
+
+
+@pytest.mark.asyncio
+async def test_overlapping_top_allocations() -> None:
+    # first call starts tracing and ends while second one still needs it
+    first, second = await asyncio.gather(
+        top_allocations(0.01, limit=5), top_allocations(0.05, limit=5)
+    )
+
+    assert first and second
+    assert not tracemalloc.is_tracing()
+
+
+@pytest.mark.parametrize("path", ["/admin/profile", "/admin/allocations"])
+def test_profiler_is_admin_only(client: TestClient, path: str) -> None:
+    response = client.post(path, params={"seconds": 0.01})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    client.post(
+        "/user-register",
+        json={
+            "username": "user",
+            "name": "user",
+            "birthdate": "2000-01-01T00:00:00",
+            "password": "userPassword123",
+        },
+    )
+    response = client.post(
+        path, params={"seconds": 0.01}, auth=("user", "userPassword123")
+    )
+    assert response.status_code == HTTPStatus.FORBIDDEN
+
+    response = client.post(path, params={"seconds": 0.01}, auth=ADMIN_AUTH)
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_profile_limits(client: TestClient) -> None:
+    response = client.post("/admin/profile", params={"seconds": 600}, auth=ADMIN_AUTH)
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
@@ -0,0 +1,77 @@
+from urllib.parse import parse_qs as urllib_parse_qs
+
+import pytest
+
+from lecture_4.query_string import (
+    QueryParams,
+    decode_component,
+    decode_components,
+    parse_qs,
+)
+
+
+@pytest.mark.parametrize(
+    ("query_string", "expected_result"),
+    [
+        ("name=John", {"name": ["John"]}),
+        ("name=John&age=30", {"name": ["John"], "age": ["30"]}),
+        ("city=New%20York&key=", {"city": ["New York"], "key": [""]}),
+        ("name=John&name=Mary", {"name": ["John", "Mary"]}),
+        ("token=a=b==", {"token": ["a=b=="]}),
+        ("flag&&=&x", {"flag": [""], "": [""], "x": [""]}),
+        ("a+b=c+d%2B", {"a b": ["c d+"]}),
+        ("bad=%zz%4&end=%", {"bad": ["%zz%4"], "end": ["%"]}),
+        ("q=%D0%BF%D1%80%d0%b8", {"q": ["при"]}),
+        ("q=%FF", {"q": ["�"]}),
+        ("q=при", {"q": ["при"]}),
+        ("q=%5C\\x41\\%41", {"q": ["\\\\x41\\A"]}),
+        ("a=1;b=2", {"a": ["1;b=2"]}),
+        ("", {}),
+    ],
+)
+def test_parse_qs(query_string: str, expected_result: dict[str, list[str]]) -> None:
+    assert parse_qs(query_string) == expected_result
+    assert parse_qs(query_string.encode()) == expected_result
+
+
+def test_matches_urllib_on_valid_queries() -> None:
+    query = "a=1&b=%E2%82%AC+x&a=2&c=&d=%41%42"
+
+    assert parse_qs(query) == urllib_parse_qs(query, keep_blank_values=True)
+
+
+def test_query_params_mapping() -> None:
+    params = QueryParams(b"name=John&name=Mary&age=30")
+
+    assert params["name"] == "Mary"
+    assert params.getlist("name") == ["John", "Mary"]
+    assert params.getlist("unknown") == []
+    assert params.get("age") == "30"
+    assert "age" in params and "unknown" not in params
+    assert list(params) == ["name", "age"]
+    assert len(params) == 2
+    assert params == {"name": "Mary", "age": "30"}
+
+    with pytest.raises(KeyError):
+        params["unknown"]
+
+
+def test_query_params_are_parsed_lazily() -> None:
+    params = QueryParams(b"a=1&" * 10, max_fields=5)
+
+    # nothing is parsed until params are read
+    with pytest.raises(ValueError, match="too many fields"):
+        params["a"]
+
+    assert QueryParams(b"a=1&b=2", max_fields=2)["b"] == "2"
+
+
+def test_decode_component() -> None:
+    assert decode_component(b"100%25+sure") == "100% sure"
+    assert decode_component(b"%%41") == "%A"
+    assert decode_component(b"plain") == "plain"
+
+
+def test_decode_components_with_encoded_separator() -> None:
+    assert decode_components([b"a%26b", b"c", b"%2"]) == ["a&b", "c", "%2"]
+    assert parse_qs("a%26b=c%26d&a%26b=e") == {"a&b": ["c&d", "e"]}
@@ -0,0 +1,150 @@
+from http import HTTPStatus
+
+import pytest
+from fastapi import FastAPI, Header
+from fastapi.testclient import TestClient
+
+from lecture_4.response_cache import ResponseCache, ResponseCacheMiddleware, cached
+
+
+@pytest.fixture()
+def calls() -> list[str]:
+    return []
+
+
+@pytest.fixture()
+def cache() -> ResponseCache:
+    return ResponseCache()
+
+
+@pytest.fixture()
+def client(calls: list[str], cache: ResponseCache) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(ResponseCacheMiddleware, cache=cache)
+
+    @app.get("/static")
+    @cached()
+    async def get_static() -> str:
+        calls.append("static")
+        return "static"
+
+    @app.get("/expiring")
+    @cached(ttl=0.0)
+    async def get_expiring() -> str:
+        calls.append("expiring")
+        return "expiring"
+
+    @app.get("/localized")
+    @cached(vary=("Accept-Language",))
+    async def get_localized(accept_language: str = Header("en")) -> str:
+        calls.append(accept_language)
+        return accept_language
+
+    @app.get("/plain")
+    async def get_plain() -> str:
+        calls.append("plain")
+        return "plain"
+
+    @app.get("/missing")
+    @cached()
+    async def get_missing() -> str:
+        calls.append("missing")
+        raise ValueError()
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_immutable_response_served_from_cache(client: TestClient, calls: list[str]):
+    for _ in range(3):
+        response = client.get("/static")
+        assert response.status_code == HTTPStatus.OK
+        assert response.json() == "static"
+
+    assert calls == ["static"]
+
+
+def test_uncached_routes_pass_through(client: TestClient, calls: list[str]):
+    client.get("/plain")
+    client.get("/plain")
+
+    assert calls == ["plain", "plain"]
+
+
+def test_expired_response_is_recomputed(client: TestClient, calls: list[str]):
+    client.get("/expiring")
+    client.get("/expiring")
+
+    assert calls == ["expiring", "expiring"]
+
+
+def test_errors_are_not_cached(client: TestClient, calls: list[str]):
+    assert client.get("/missing").status_code == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert client.get("/missing").status_code == HTTPStatus.INTERNAL_SERVER_ERROR
+
+    assert calls == ["missing", "missing"]
+
+
+def test_vary_headers_are_part_of_key(client: TestClient, calls: list[str]):
+    for language in ["en", "ru", "en", "ru"]:
+        response = client.get("/localized", headers={"accept-language": language})
+        assert response.json() == language
+        assert response.headers["vary"] == "accept-language"
+
+    assert calls == ["en", "ru"]
+
+
+def test_invalidate(client: TestClient, calls: list[str], cache: ResponseCache):
+    invalidated = []
+    cache.on_invalidate(invalidated.append)
+
+    client.get("/static")
+    client.get("/localized")
+    cache.invalidate("/static")
+    client.get("/static")
+    client.get("/localized")
+    cache.invalidate()
+
+    assert calls == ["static", "en", "static"]
+    assert invalidated == ["/static", None]
+    assert len(cache) == 0
+
+
+def test_cache_keeps_at_most_max_entries(calls: list[str]):
+    cache = ResponseCache(max_entries=2)
+    app = FastAPI()
+    app.add_middleware(ResponseCacheMiddleware, cache=cache)
+
+    @app.get("/items")
+    @cached()
+    async def get_items() -> str:
+        calls.append("items")
+        return "items"
+
+    client = TestClient(app)
+
+    for query in ["a", "b", "a", "c", "a", "b"]:
+        client.get(f"/items?{query}")
+
+    # "b" was least recently used when "c" came
+    assert calls == ["items"] * 4
+    assert len(cache) == 2
+
+
+def test_expired_entries_are_dropped_on_write(client: TestClient, cache: ResponseCache):
+    client.get("/expiring")
+    client.get("/static")
+
+    assert len(cache) == 1
+
+
+def test_expired_entries_behind_fresh_ones_are_dropped_on_read(
+    client: TestClient, cache: ResponseCache
+):
+    client.get("/static")
+    client.get("/expiring")
+    client.get("/localized")
+
+    # storing checks least recently used end only
+    assert len(cache) == 3
+    assert cache.get(("GET", "/expiring", b"", ())) is None
+    assert len(cache) == 2
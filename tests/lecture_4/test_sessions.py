@@ -0,0 +1,137 @@
+from datetime import datetime
+from http import HTTPStatus
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lecture_4.demo_service.api.main import create_app
+from lecture_4.demo_service.core.sessions import SessionSigner
+from lecture_4.demo_service.core.users import UserEntity, UserInfo, UserRole
+
+ADMIN_AUTH = ("admin", "superSecretAdminPassword123")
+
+
+@pytest.fixture()
+def entity() -> UserEntity:
+    return UserEntity(
+        uid=1,
+        info=UserInfo(
+            username="user",
+            name="name",
+            birthdate=datetime.fromtimestamp(0.0),
+            password="SuperSecret123",
+        ),
+    )
+
+
+def test_issue_and_verify(entity: UserEntity) -> None:
+    signer = SessionSigner(secret=b"secret")
+    session = signer.verify(signer.issue(entity))
+
+    assert session is not None
+    assert (session.uid, session.info.username, session.info.role) == (
+        1,
+        "user",
+        UserRole.USER,
+    )
+
+
+@pytest.mark.parametrize(
+    "tamper",
+    [
+        lambda token: token[:-1] + ("A" if token[-1] != "A" else "B"),
+        lambda token: "e" + token,
+        lambda token: token.split(".")[0],
+        lambda token: token + "ы",
+    ],
+)
+def test_tampered_tokens_are_rejected(entity: UserEntity, tamper) -> None:
+    signer = SessionSigner(secret=b"secret")
+
+    assert signer.verify(tamper(signer.issue(entity))) is None
+
+
+def test_other_secret_and_expired_tokens_are_rejected(entity: UserEntity) -> None:
+    token = SessionSigner(secret=b"secret").issue(entity)
+
+    assert SessionSigner(secret=b"other").verify(token) is None
+
+    expired = SessionSigner(secret=b"secret", ttl=-1.0)
+    assert expired.verify(expired.issue(entity)) is None
+
+
+def test_revoke(entity: UserEntity) -> None:
+    signer = SessionSigner(secret=b"secret")
+    token = signer.issue(entity)
+
+    signer.revoke(entity.uid)
+
+    assert signer.verify(token) is None
+    assert signer.verify(signer.issue(entity)) is not None
+
+
+def test_login_and_promote_flow() -> None:
+    with TestClient(create_app()) as client:
+        uid = client.post(
+            "/user-register",
+            json={
+                "username": "user",
+                "name": "name",
+                "birthdate": "2000-01-01T00:00:00",
+                "password": "SuperSecret123",
+            },
+        ).json()["uid"]
+
+        response = client.post("/user-login", auth=("user", "SuperSecret123"))
+        assert response.status_code == HTTPStatus.OK
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        assert (
+            client.post("/user-get", params={"id": uid}, headers=headers).json()["role"]
+            == "user"
+        )
+        assert (
+            client.post(
+                "/user-promote", params={"id": uid}, headers=headers
+            ).status_code
+            == HTTPStatus.FORBIDDEN
+        )
+
+        client.post("/user-promote", params={"id": uid}, auth=ADMIN_AUTH)
+
+        # role changed, old token is revoked
+        assert (
+            client.post("/user-get", params={"id": uid}, headers=headers).status_code
+            == HTTPStatus.UNAUTHORIZED
+        )
+
+        token = client.post("/user-login", auth=("user", "SuperSecret123")).json()[
+            "access_token"
+        ]
+        assert (
+            client.post(
+                "/user-promote",
+                params={"id": uid},
+                headers={"Authorization": f"Bearer {token}"},
+            ).status_code
+            == HTTPStatus.OK
+        )
+
+
+def test_login_requires_password() -> None:
+    with TestClient(create_app()) as client:
+        token = client.post("/user-login", auth=ADMIN_AUTH).json()["access_token"]
+        response = client.post(
+            "/user-login", headers={"Authorization": f"Bearer {token}"}
+        )
+
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+        assert response.headers["WWW-Authenticate"] == "Basic"
+
+
+def test_missing_credentials() -> None:
+    with TestClient(create_app()) as client:
+        response = client.post("/user-get", params={"id": 1})
+
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+        assert response.headers["WWW-Authenticate"] == "Basic"
@@ -0,0 +1,179 @@
+import json
+from datetime import datetime
+from http import HTTPStatus
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import SecretStr
+
+from lecture_4.demo_service.api.main import create_app
+from lecture_4.demo_service.core.sqlite_storage import SqliteStorage
+from lecture_4.demo_service.core.users import (
+    ColumnarStorage,
+    ModelStorage,
+    UserEntity,
+    UserInfo,
+    UserRole,
+    UserService,
+)
+
+ADMIN_AUTH = ("admin", "superSecretAdminPassword123")
+
+
+def row(username: str, password: str = "SuperSecret123", **extra) -> str:
+    return json.dumps(
+        {
+            "username": username,
+            "name": username,
+            "birthdate": "2000-01-01T00:00:00",
+            "password": password,
+            **extra,
+        }
+    )
+
+
+def test_import_reports_errors_per_row() -> None:
+    body = "\n".join(
+        [
+            row("user1"),
+            "{not json",
+            row("user2", password="short"),
+            "",
+            row("user1"),
+            row("admin"),
+            json.dumps({"username": "user3"}),
+            row("user4", role="admin"),
+        ]
+    )
+
+    with TestClient(create_app()) as client:
+        response = client.post(
+            "/user-import",
+            params={"chunk_size": 2},
+            content=body.encode(),
+            auth=ADMIN_AUTH,
+        )
+
+        assert response.status_code == HTTPStatus.OK
+        report = response.json()
+        assert report["imported"] == 2
+        assert [(error["row"], error["detail"]) for error in report["errors"]] == [
+            (2, "row: Invalid JSON: key must be a string at line 1 column 2"),
+            (3, "invalid password"),
+            (5, "username is already taken"),
+            (6, "username is already taken"),
+            (
+                7,
+                "name: Field required; birthdate: Field required;"
+                " password: Field required",
+            ),
+        ]
+
+        user_service = client.app.state.user_service
+        assert user_service.get_by_username("user1") is not None
+        # role can not be set through import
+        assert user_service.get_by_username("user4").info.role == UserRole.USER
+
+        response = client.post(
+            "/user-get", params={"username": "user4"}, auth=("user4", "SuperSecret123")
+        )
+        assert response.status_code == HTTPStatus.OK
+
+
+def test_import_requires_admin() -> None:
+    with TestClient(create_app()) as client:
+        client.post("/user-register", content=row("user1"))
+
+        response = client.post(
+            "/user-import", content=row("user2"), auth=("user1", "SuperSecret123")
+        )
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+
+def entity(uid: int, username: str) -> UserEntity:
+    return UserEntity(
+        uid=uid,
+        info=UserInfo(
+            username=username,
+            name=username,
+            birthdate=datetime(2000, 1, 1),
+            password="SuperSecret123",
+        ),
+    )
+
+
+@pytest.mark.parametrize("layout", ["models", "columnar", "sqlite"])
+def test_add_many_is_atomic(layout, tmp_path) -> None:
+    storage = {
+        "models": ModelStorage,
+        "columnar": ColumnarStorage,
+        "sqlite": lambda: SqliteStorage(str(tmp_path / "users.db")),
+    }[layout]()
+    storage.add(entity(1, "taken"))
+
+    with pytest.raises(ValueError, match="username is already taken"):
+        storage.add_many([entity(2, "new"), entity(3, "taken")])
+
+    assert storage.get_by_username("new") is None
+    assert len(storage) == 1
+    assert storage.existing_usernames(["new", "taken"]) == {"taken"}
+
+    storage.add_many([entity(2, "new"), entity(3, "other")])
+    assert len(storage) == 3
+
+    if isinstance(storage, SqliteStorage):
+        storage.close()
+
+
+@pytest.mark.asyncio
+async def test_register_many() -> None:
+    service = UserService(password_validators=[lambda password: len(password) > 8])
+    service.register(entity(0, "taken").info)
+
+    results = await service.register_many(
+        [
+            entity(0, "first").info,
+            entity(0, "taken").info,
+            entity(0, "first").info,
+            entity(0, "second").info.model_copy(
+                update={"password": SecretStr("short")}
+            ),
+            entity(0, "third").info,
+        ]
+    )
+
+    assert [
+        result.uid if isinstance(result, UserEntity) else str(result)
+        for result in results
+    ] == [
+        2,
+        "username is already taken",
+        "username is already taken",
+        "invalid password",
+        3,
+    ]
+
+
+class RacyStorage(ModelStorage):
+    """Username is registered by someone else right after batch checked it."""
+
+    def existing_usernames(self, usernames):
+        taken = super().existing_usernames(usernames)
+        self.add(entity(100, "second"))
+        return taken
+
+
+@pytest.mark.asyncio
+async def test_register_many_keeps_rows_without_conflicts() -> None:
+    service = UserService(storage=RacyStorage())
+
+    results = await service.register_many(
+        [entity(0, "first").info, entity(0, "second").info, entity(0, "third").info]
+    )
+
+    assert [
+        result.info.username if isinstance(result, UserEntity) else str(result)
+        for result in results
+    ] == ["first", "username is already taken", "third"]
+    assert service.get_by_username("second").uid == 100
+    assert service.get_by_username("third") == results[2]
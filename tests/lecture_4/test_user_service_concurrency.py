@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from lecture_4.demo_service.core.users import (
+    ColumnarStorage,
+    IdSequence,
+    ModelStorage,
+    UserEntity,
+    UserInfo,
+    UserService,
+)
+
+THREADS = 8
+USERNAMES = [f"user{i}" for i in range(200)]
+
+
+def info(username: str) -> UserInfo:
+    return UserInfo(
+        username=username,
+        name=username,
+        birthdate=datetime(2000, 1, 1),
+        password="SuperSecret123",
+    )
+
+
+def test_id_sequence() -> None:
+    ids = IdSequence(10)
+
+    assert ids.next() == 11
+    assert ids.reserve(3) == range(12, 15)
+    assert ids.next() == 15
+
+
+@pytest.mark.parametrize("layout", [ModelStorage, ColumnarStorage])
+def test_concurrent_registrations(layout) -> None:
+    service = UserService(storage=layout(), lock_stripes=8)
+    barrier = threading.Barrier(THREADS)
+
+    def register_all(offset: int) -> list[UserEntity]:
+        barrier.wait()
+        registered = []
+
+        # every thread tries every username, starting from different ones
+        for username in USERNAMES[offset:] + USERNAMES[:offset]:
+            try:
+                registered.append(service.register(info(username)))
+            except ValueError:
+                pass
+
+        return registered
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        results = executor.map(register_all, range(0, 200, 200 // THREADS))
+        registered = [entity for result in results for entity in result]
+
+    assert sorted(entity.info.username for entity in registered) == sorted(USERNAMES)
+    assert sorted(entity.uid for entity in registered) == list(range(1, 201))
+    assert len(service.storage) == len(USERNAMES)
+
+    for entity in registered:
+        assert service.get_by_id(entity.uid).info.username == entity.info.username
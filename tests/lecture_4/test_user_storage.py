@@ -0,0 +1,252 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lecture_4.demo_service.api.main import create_app
+
+from lecture_4.demo_service.core.sqlite_storage import _INSERT, SqliteStorage, _row
+from lecture_4.demo_service.core.users import (
+    ColumnarStorage,
+    ModelStorage,
+    UserEntity,
+    UserInfo,
+    UserRole,
+    UserService,
+)
+
+
+def entity(uid: int, username: str, **kwargs) -> UserEntity:
+    return UserEntity(
+        uid=uid,
+        info=UserInfo(
+            username=username,
+            name=f"{username} name",
+            birthdate=kwargs.pop("birthdate", datetime(1990, 5, 17, 12, 30)),
+            password=kwargs.pop("password", f"{username}-Пароль123"),
+            **kwargs,
+        ),
+    )
+
+
+@pytest.fixture()
+def sqlite_storage(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "users.db"))
+    yield storage
+    storage.close()
+
+
+@pytest.mark.parametrize("layout", ["models", "columnar", "sqlite"])
+def test_round_trip(layout, request) -> None:
+    storage = {
+        "models": ModelStorage,
+        "columnar": ColumnarStorage,
+        "sqlite": lambda: request.getfixturevalue("sqlite_storage"),
+    }[layout]()
+    entities = [
+        entity(1, "first"),
+        entity(2, "second", role=UserRole.ADMIN),
+        entity(5, "third", birthdate=datetime(1901, 1, 1)),
+    ]
+
+    for item in entities:
+        storage.add(item)
+
+    assert len(storage) == 3
+    for item in entities:
+        assert storage.get(item.uid) == item
+        assert storage.get_by_username(item.info.username) == item
+        assert storage.contains_username(item.info.username)
+
+    assert storage.get(3) is None
+    assert storage.get(6) is None
+    assert storage.get_by_username("unknown") is None
+    assert not storage.contains_username("unknown")
+
+
+def test_columnar_set_role() -> None:
+    storage = ColumnarStorage()
+    storage.add(entity(1, "user"))
+
+    storage.set_role(1, UserRole.ADMIN)
+
+    assert storage.get(1).info.role == UserRole.ADMIN
+
+
+@pytest.mark.parametrize("layout", ["columnar", "sqlite"])
+def test_aware_birthdates_keep_offset(layout, request) -> None:
+    storage = {
+        "columnar": ColumnarStorage,
+        "sqlite": lambda: request.getfixturevalue("sqlite_storage"),
+    }[layout]()
+    birthdate = datetime(1990, 1, 1, 3, tzinfo=timezone(timedelta(hours=3)))
+    storage.add(entity(1, "aware", birthdate=birthdate))
+    storage.add(entity(2, "naive", birthdate=datetime(1990, 1, 1, 3)))
+
+    if layout == "sqlite":
+        # read back from database, not from cache
+        storage._forget(1)
+
+    aware = storage.get(1).info.birthdate
+    assert aware == birthdate
+    assert aware.utcoffset() == timedelta(hours=3)
+    assert storage.get(2).info.birthdate.tzinfo is None
+
+
+def test_columnar_uids_in_any_order() -> None:
+    storage = ColumnarStorage()
+    storage.add(entity(3, "first"))
+    storage.add(entity(1, "second"))
+
+    assert storage.get(1).info.username == "second"
+    assert storage.get(2) is None
+    assert storage.get(3).info.username == "first"
+    assert storage.last_uid() == 3
+
+    with pytest.raises(ValueError, match="uid is already taken"):
+        storage.add(entity(1, "third"))
+
+
+def test_columnar_publishes_row_after_all_columns() -> None:
+    storage = ColumnarStorage()
+    seen = []
+
+    class Ends(list):
+        def append(self, end: int) -> None:
+            # reader without lock, while last column is not written yet
+            seen.append(storage.get(1))
+            super().append(end)
+
+    storage._password_ends = Ends()
+    storage.add(entity(1, "user"))
+
+    assert seen == [None]
+    assert storage.get(1) == entity(1, "user")
+
+
+def test_service_with_columnar_storage() -> None:
+    service = UserService(storage=ColumnarStorage())
+    registered = service.register(entity(0, "user").info)
+
+    service.grant_admin(registered.uid)
+
+    assert service.get_by_id(registered.uid).info.role == UserRole.ADMIN
+    assert service.get_by_username("user").uid == registered.uid
+    with pytest.raises(ValueError, match="username is already taken"):
+        service.register(entity(0, "user").info)
+
+
+def test_sqlite_survives_restart(tmp_path) -> None:
+    path = str(tmp_path / "users.db")
+    storage = SqliteStorage(path)
+    service = UserService(storage=storage)
+    service.register(entity(0, "first").info)
+    registered = service.register(entity(0, "second").info)
+    service.grant_admin(registered.uid)
+    storage.close()
+
+    storage = SqliteStorage(path, cache_size=1)
+    service = UserService(storage=storage)
+
+    assert service.get_by_username("second") == registered.model_copy(
+        update={"info": registered.info.model_copy(update={"role": UserRole.ADMIN})}
+    )
+    assert service.register(entity(0, "third").info).uid == 3
+    assert service.get_by_id(1).info.username == "first"
+    with pytest.raises(ValueError, match="username is already taken"):
+        service.register(entity(0, "first").info)
+    storage.close()
+
+
+def test_sqlite_rejects_duplicate_username(sqlite_storage: SqliteStorage) -> None:
+    sqlite_storage.add(entity(1, "user"))
+
+    with pytest.raises(ValueError, match="username is already taken"):
+        sqlite_storage.add(entity(2, "user"))
+
+    sqlite_storage.add(entity(3, "other"))
+    assert len(sqlite_storage) == 2
+
+
+def test_sqlite_writer_survives_unexpected_errors(
+    sqlite_storage: SqliteStorage,
+) -> None:
+    def broken(connection):
+        connection.execute(_INSERT, _row(entity(1, "user")))
+        raise RuntimeError("broken")
+
+    with pytest.raises(RuntimeError, match="broken"):
+        sqlite_storage._write(broken)
+
+    sqlite_storage.add(entity(1, "user"))
+    assert len(sqlite_storage) == 1
+
+
+def test_sqlite_does_not_cache_rows_read_before_change(
+    sqlite_storage: SqliteStorage,
+) -> None:
+    sqlite_storage.add(entity(1, "user"))
+    sqlite_storage._forget(1)
+    _, version = sqlite_storage._cached(1)
+    # row read by concurrent `get` before role was changed
+    stale = sqlite_storage.get(1)
+    sqlite_storage._forget(1)
+
+    sqlite_storage.set_role(1, UserRole.ADMIN)
+    sqlite_storage._remember(stale, version)
+
+    assert sqlite_storage.get(1).info.role == UserRole.ADMIN
+    assert sqlite_storage.get_by_username("user").info.role == UserRole.ADMIN
+
+
+def test_sqlite_file_shared_by_two_services(tmp_path) -> None:
+    path = str(tmp_path / "users.db")
+    # as two processes serving same `USER_STORAGE_PATH`
+    first, second = SqliteStorage(path), SqliteStorage(path, cache_ttl=0.0)
+    services = [UserService(storage=first), UserService(storage=second)]
+
+    registered = [
+        services[i % 2].register(entity(0, f"user{i}").info) for i in range(6)
+    ]
+
+    assert [user.uid for user in registered] == [1, 2, 3, 4, 5, 6]
+    with pytest.raises(ValueError, match="username is already taken"):
+        services[1].register(entity(0, "user0").info)
+
+    assert second.get(1).info.role == UserRole.USER
+    services[0].grant_admin(1)
+    assert second.get(1).info.role == UserRole.ADMIN
+    first.close()
+    second.close()
+
+
+def test_sqlite_reports_taken_uid_as_is(sqlite_storage: SqliteStorage) -> None:
+    sqlite_storage.add(entity(1, "user"))
+
+    with pytest.raises(sqlite3.IntegrityError, match="users.uid"):
+        sqlite_storage.add(entity(1, "other"))
+
+    assert sqlite_storage.add_new([entity(0, "other").info])[0].uid == 2
+
+
+def test_service_keeps_users_across_restarts(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("USER_STORAGE_PATH", str(tmp_path / "users.db"))
+    body = {
+        "username": "user",
+        "name": "name",
+        "birthdate": "2000-01-01T00:00:00",
+        "password": "SuperSecret123",
+    }
+
+    with TestClient(create_app()) as client:
+        uid = client.post("/user-register", json=body).json()["uid"]
+
+    with TestClient(create_app()) as client:
+        response = client.post(
+            "/user-get", params={"id": uid}, auth=("user", "SuperSecret123")
+        )
+        assert response.json()["username"] == "user"
+        # admin is created on first start only
+        assert len(client.app.state.user_service.storage) == 2
+        assert client.post("/user-register", json=body).status_code == 400
@@ -0,0 +1,164 @@
+import random
+import sqlite3
+from datetime import datetime
+from http import HTTPStatus
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lecture_4.demo_service.api.main import create_app
+from lecture_4.demo_service.core.sqlite_storage import SqliteStorage
+from lecture_4.demo_service.core.username_index import UsernameIndex, _SortedKeys
+from lecture_4.demo_service.core.users import (
+    ColumnarStorage,
+    ModelStorage,
+    UserInfo,
+    UserService,
+)
+
+USERNAMES = ["alice", "Alex", "alexander", "ALINA", "bob", "Straße", "strasse", "al"]
+
+
+def test_sorted_keys_match_sorted_list() -> None:
+    keys = _SortedKeys(load=4)
+    values = random.Random(0).sample(range(1000), 300)
+
+    for value in values:
+        keys.add(value)
+    for value in values[:100]:
+        keys.discard(value)
+
+    expected = sorted(values[100:])
+    assert len(keys) == len(expected)
+    assert list(keys.iter_from(-1)) == expected
+    assert list(keys.iter_from(expected[10])) == expected[10:]
+    assert list(keys.iter_from(expected[10], inclusive=False)) == expected[11:]
+
+
+@pytest.fixture()
+def index() -> UsernameIndex:
+    index = UsernameIndex()
+    for username in USERNAMES:
+        index.add(username)
+    return index
+
+
+def test_exact_prefix(index: UsernameIndex) -> None:
+    assert index.search("al", 10) == ["al", "alexander", "alice"]
+    assert index.search("A", 10) == ["ALINA", "Alex"]
+    assert index.search("", 3) == ["ALINA", "Alex", "Straße"]
+    assert index.search("z", 10) == []
+
+
+def test_case_insensitive_prefix(index: UsernameIndex) -> None:
+    assert index.search("AL", 10, ignore_case=True) == [
+        "al",
+        "Alex",
+        "alexander",
+        "alice",
+        "ALINA",
+    ]
+    assert index.search("STRASS", 10, ignore_case=True) == ["Straße", "strasse"]
+
+
+def test_pagination(index: UsernameIndex) -> None:
+    first = index.search("al", 2, ignore_case=True)
+    second = index.search("al", 2, after=first[-1], ignore_case=True)
+    third = index.search("al", 2, after=second[-1], ignore_case=True)
+
+    assert first + second + third == index.search("al", 10, ignore_case=True)
+
+
+def test_discard(index: UsernameIndex) -> None:
+    index.discard("alice")
+    index.discard("unknown")
+
+    assert index.search("ali", 10, ignore_case=True) == ["ALINA"]
+    assert len(index) == len(USERNAMES) - 1
+
+
+@pytest.mark.parametrize("layout", ["models", "columnar", "sqlite"])
+def test_service_search(layout, tmp_path) -> None:
+    storage = {
+        "models": ModelStorage,
+        "columnar": ColumnarStorage,
+        "sqlite": lambda: SqliteStorage(str(tmp_path / "users.db")),
+    }[layout]()
+    service = UserService(storage=storage)
+
+    for username in USERNAMES:
+        service.register(
+            UserInfo(
+                username=username,
+                name=username,
+                birthdate=datetime(2000, 1, 1),
+                password="SuperSecret123",
+            )
+        )
+
+    def usernames(*args, **kwargs) -> list[str]:
+        return [entity.info.username for entity in service.search(*args, **kwargs)]
+
+    assert usernames("al", 10) == ["al", "alexander", "alice"]
+    assert usernames("al", 2, after="al") == ["alexander", "alice"]
+    assert usernames("aL", 3, ignore_case=True) == ["al", "Alex", "alexander"]
+    assert usernames("al", 3, after="alexander", ignore_case=True) == [
+        "alice",
+        "ALINA",
+    ]
+    assert usernames("STRASS", 10, ignore_case=True) == ["Straße", "strasse"]
+
+    if isinstance(storage, SqliteStorage):
+        storage.close()
+
+
+def test_search_endpoint() -> None:
+    with TestClient(create_app()) as client:
+        for username in ["user1", "User2", "user3"]:
+            client.post(
+                "/user-register",
+                json={
+                    "username": username,
+                    "name": "name",
+                    "birthdate": "2000-01-01T00:00:00",
+                    "password": "SuperSecret123",
+                },
+            )
+
+        admin = ("admin", "superSecretAdminPassword123")
+        params = {"prefix": "user", "limit": 2, "ignore_case": True}
+
+        page = client.post("/user-search", params=params, auth=admin).json()
+        assert [user["username"] for user in page["users"]] == ["user1", "User2"]
+
+        page = client.post(
+            "/user-search", params={**params, "cursor": page["next_cursor"]}, auth=admin
+        ).json()
+        assert [user["username"] for user in page["users"]] == ["user3"]
+        assert page["next_cursor"] is None
+
+        assert (
+            client.post(
+                "/user-search", params=params, auth=("user1", "SuperSecret123")
+            ).status_code
+            == HTTPStatus.FORBIDDEN
+        )
+
+
+def test_sqlite_adds_folded_usernames_to_old_databases(tmp_path) -> None:
+    path = str(tmp_path / "users.db")
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE users (uid INTEGER PRIMARY KEY, username TEXT NOT NULL"
+            " UNIQUE, name TEXT NOT NULL, birthdate INTEGER NOT NULL,"
+            " role TEXT NOT NULL, password TEXT NOT NULL)"
+        )
+        connection.execute(
+            "INSERT INTO users VALUES (1, 'Alice', 'Alice', 0, 'user', 'password')"
+        )
+    connection.close()
+
+    storage = SqliteStorage(path)
+
+    assert [entity.uid for entity in storage.search("ali", 10, None, True)] == [1]
+    storage.close()
@@ -0,0 +1,155 @@
+import asyncio
+import math
+import time
+from http import HTTPStatus
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lecture_1.executor import CpuAwareExecutor
+from lecture_1.math_example import (
+    MAX_N,
+    app,
+    batch_factorial,
+    batch_fibonacci,
+    fibonacci,
+)
+
+client = TestClient(app)
+
+
+def test_batch_factorial() -> None:
+    values = [10, 0, 3, 10, 25, 1]
+    assert batch_factorial(values) == {n: math.factorial(n) for n in values}
+
+
+def test_batch_fibonacci() -> None:
+    values = [10, 0, 3, 10, 25, 1]
+    results = batch_fibonacci(values)
+
+    for n in values:
+        assert results[n] == client.get(f"/fibonacci/{n}").json()["result"]
+
+
+@pytest.mark.parametrize("path", ["/factorial/batch", "/fibonacci/batch"])
+@pytest.mark.parametrize(
+    ("json", "status_code"),
+    [
+        (None, HTTPStatus.UNPROCESSABLE_ENTITY),
+        (["lol"], HTTPStatus.UNPROCESSABLE_ENTITY),
+        ([], HTTPStatus.BAD_REQUEST),
+        ([1, -1], HTTPStatus.BAD_REQUEST),
+        ([5, 1, 5, 0], HTTPStatus.OK),
+    ],
+)
+def test_batch_endpoints(path: str, json: Any, status_code: int) -> None:
+    response = client.post(path, json=json)
+
+    assert response.status_code == status_code
+
+    if status_code == HTTPStatus.OK:
+        single = (
+            [client.get("/factorial", params={"n": n}) for n in json]
+            if path.startswith("/factorial")
+            else [client.get(f"/fibonacci/{n}") for n in json]
+        )
+        assert response.json()["result"] == [r.json()["result"] for r in single]
+
+
+@pytest.mark.asyncio
+async def test_executor_runs_cheap_calls_inline() -> None:
+    executor = CpuAwareExecutor(inline_cost=100, max_workers=1)
+    executor.start()
+
+    try:
+        assert await executor.run("factorial", 5, math.factorial, 5) == 120
+    finally:
+        executor.shutdown()
+
+    assert executor.stats()["factorial"]["inline"] == 1
+    assert executor.stats()["factorial"]["offloaded"] == 0
+
+
+@pytest.mark.asyncio
+async def test_executor_offloads_expensive_calls() -> None:
+    executor = CpuAwareExecutor(
+        inline_cost=0, max_workers=2, endpoint_limits={"fibonacci": 1}
+    )
+    executor.start()
+
+    try:
+        results = await asyncio.gather(
+            *(executor.run("fibonacci", n, fibonacci, n) for n in range(1, 6))
+        )
+    finally:
+        executor.shutdown()
+
+    assert results == [1, 2, 3, 5, 8]
+
+    stats = executor.stats()["fibonacci"]
+    assert stats["offloaded"] == 5
+    assert stats["in_flight"] == 0
+    assert stats["queue_time_max"] >= 0.0
+
+
+@pytest.mark.asyncio
+async def test_executor_queue_time_includes_wait_for_worker() -> None:
+    executor = CpuAwareExecutor(
+        inline_cost=0, max_workers=1, endpoint_limits={"sleep": 2}
+    )
+    executor.start()
+
+    try:
+        # warm up worker process
+        await executor.run("sleep", 1, time.sleep, 0)
+        await asyncio.gather(
+            *(executor.run("sleep", 1, time.sleep, 0.2) for _ in range(2))
+        )
+    finally:
+        executor.shutdown()
+
+    # endpoint limit let both calls in, second one waited for the worker
+    assert executor.stats()["sleep"]["queue_time_max"] >= 0.15
+
+
+def test_executor_works_across_event_loops() -> None:
+    executor = CpuAwareExecutor(
+        inline_cost=0, max_workers=1, endpoint_limits={"fibonacci": 1}
+    )
+    executor.start()
+
+    async def run_many() -> list[int]:
+        return await asyncio.gather(
+            *(executor.run("fibonacci", n, fibonacci, n) for n in range(1, 4))
+        )
+
+    try:
+        assert asyncio.run(run_many()) == [1, 2, 3]
+        assert asyncio.run(run_many()) == [1, 2, 3]
+    finally:
+        executor.shutdown()
+
+
+def test_executor_stats_endpoint() -> None:
+    with TestClient(app) as lifespan_client:
+        lifespan_client.get("/factorial", params={"n": 3})
+        response = lifespan_client.get("/executor-stats")
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["factorial"]["inline"] >= 1
+
+
+def test_offloaded_results_beyond_default_digit_limit() -> None:
+    with TestClient(app) as lifespan_client:
+        single = lifespan_client.get("/factorial", params={"n": 5000})
+        batch = lifespan_client.post("/factorial/batch", json=[3, 1800])
+        too_big = lifespan_client.get(f"/fibonacci/{MAX_N + 1}")
+        stats = lifespan_client.get("/executor-stats").json()
+
+    assert single.status_code == HTTPStatus.OK
+    assert single.json()["result"] == math.factorial(5000)
+    assert batch.status_code == HTTPStatus.OK
+    assert batch.json()["result"] == [6, math.factorial(1800)]
+    assert too_big.status_code == HTTPStatus.BAD_REQUEST
+    assert stats["factorial"]["offloaded"] == 1
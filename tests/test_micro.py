@@ -0,0 +1,150 @@
+import threading
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lecture_1.micro import App, HTTPError, Request, Response, Router, Route
+
+app = App()
+HELLO = Response.text("Hello, world!")
+
+
+@app.get("/")
+async def hello() -> Response:
+    return HELLO
+
+
+@app.get("/users/me")
+def get_me() -> dict:
+    return {"id": "me"}
+
+
+@app.get("/users/{id:int}")
+def get_user(id: int, verbose: bool = False) -> dict:
+    return {"id": id, "verbose": verbose}
+
+
+@app.get("/factorial")
+def get_factorial(n: int) -> dict:
+    if n < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST)
+
+    return {"n": n}
+
+
+@app.post("/echo")
+async def echo(request: Request) -> dict:
+    return {"body": await request.json()}
+
+
+client = TestClient(app)
+
+
+def test_prebuilt_response() -> None:
+    response = client.get("/")
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.text == "Hello, world!"
+    assert response.headers["content-type"].startswith("text/plain")
+
+
+@pytest.mark.parametrize(
+    ("method", "path", "status_code", "json"),
+    [
+        ("GET", "/users/me", HTTPStatus.OK, {"id": "me"}),
+        ("GET", "/users/42", HTTPStatus.OK, {"id": 42, "verbose": False}),
+        ("GET", "/users/42?verbose=true", HTTPStatus.OK, {"id": 42, "verbose": True}),
+        ("GET", "/users/lol", HTTPStatus.UNPROCESSABLE_ENTITY, None),
+        ("GET", "/users/42?verbose=lol", HTTPStatus.UNPROCESSABLE_ENTITY, None),
+        ("GET", "/factorial?n=3", HTTPStatus.OK, {"n": 3}),
+        ("GET", "/factorial", HTTPStatus.UNPROCESSABLE_ENTITY, None),
+        ("GET", "/factorial?n=-1", HTTPStatus.BAD_REQUEST, None),
+        ("GET", "/not_found", HTTPStatus.NOT_FOUND, None),
+        ("GET", "/users/42/posts", HTTPStatus.NOT_FOUND, None),
+        ("POST", "/users/42", HTTPStatus.METHOD_NOT_ALLOWED, None),
+    ],
+)
+def test_routing(method: str, path: str, status_code: int, json: dict | None) -> None:
+    response = client.request(method, path)
+
+    assert response.status_code == status_code
+    if json is not None:
+        assert response.json() == json
+
+
+def test_request_body() -> None:
+    response = client.post("/echo", json=[1, 2, 3])
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {"body": [1, 2, 3]}
+
+    response = client.post("/echo", content=b"{")
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_router_rejects_duplicates() -> None:
+    router = Router()
+    router.add(Route("GET", "/items/{id:int}", lambda id: id))
+
+    with pytest.raises(ValueError):
+        router.add(Route("GET", "/items/{id:int}", lambda id: id))
+
+    with pytest.raises(ValueError):
+        router.add(Route("GET", "/items/{name}", lambda name: name))
+
+
+def test_router_falls_back_to_parameter_child() -> None:
+    router = Router()
+    profile = Route("GET", "/users/me/profile", lambda: None)
+    posts = Route("GET", "/users/{id}/posts", lambda id: id)
+    router.add(profile)
+    router.add(posts)
+
+    assert router.match("/users/me/posts") == ({"GET": posts}, {"id": "me"})
+    assert router.match("/users/42/posts") == ({"GET": posts}, {"id": "42"})
+    assert router.match("/users/me/profile") == ({"GET": profile}, {})
+    assert router.match("/users/me/other") is None
+
+
+def test_sync_handlers_run_off_event_loop() -> None:
+    threads_app = App()
+
+    @threads_app.get("/sync")
+    def sync_handler() -> dict:
+        return {"thread": threading.get_ident()}
+
+    @threads_app.get("/async")
+    async def async_handler() -> dict:
+        return {"thread": threading.get_ident()}
+
+    with TestClient(threads_app) as threads_client:
+        sync_thread = threads_client.get("/sync").json()["thread"]
+        loop_thread = threads_client.get("/async").json()["thread"]
+
+    assert sync_thread != loop_thread
+
+
+def test_lifespan() -> None:
+    events = []
+
+    @asynccontextmanager
+    async def lifespan(app: App):
+        app.state["ready"] = True
+        events.append("startup")
+        yield
+        events.append("shutdown")
+
+    lifespan_app = App(lifespan=lifespan)
+
+    @lifespan_app.get("/")
+    def index() -> str:
+        return "ok"
+
+    with TestClient(lifespan_app) as lifespan_client:
+        assert lifespan_client.get("/").text == "ok"
+
+    assert lifespan_app.state["ready"]
+    assert events == ["startup", "shutdown"]